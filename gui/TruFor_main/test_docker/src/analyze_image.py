@@ -38,6 +38,22 @@ if path not in sys.path:
 from TruFor_main.test_docker.src.config import update_config
 from TruFor_main.test_docker.src.config import _C as config
 from TruFor_main.test_docker.src.data_core import myDataset
+from analysis.models import cached_model
+
+
+def load_model(model_state_file, device):
+    print(f'=> loading model from {model_state_file}')
+    checkpoint = torch.load(model_state_file, map_location=torch.device(device))
+
+    if config.MODEL.NAME == 'detconfcmx':
+        from models.cmx.builder_np_conf import myEncoderDecoder as confcmx
+        model = confcmx(cfg=config)
+    else:
+        raise NotImplementedError('Model not implemented')
+
+    model.load_state_dict(checkpoint['state_dict'])
+    return model.to(device)
+
 
 def process_image(input_path, gpu):
 
@@ -90,17 +106,10 @@ def process_image(input_path, gpu):
     else:
         raise ValueError("Model file is not specified.")
 
-    print(f'=> loading model from {model_state_file}')
-    checkpoint = torch.load(model_state_file, map_location=torch.device(device))
-
-    if config.MODEL.NAME == 'detconfcmx':
-        from models.cmx.builder_np_conf import myEncoderDecoder as confcmx
-        model = confcmx(cfg=config)
-    else:
-        raise NotImplementedError('Model not implemented')
-
-    model.load_state_dict(checkpoint['state_dict'])
-    model = model.to(device)
+    # loaded once per process and device, later images reuse the warm model
+    model = cached_model(
+        f"trufor_{model_state_file}_{device}", lambda: load_model(model_state_file, device)
+    )
 
     # Calculate output
     with torch.no_grad():
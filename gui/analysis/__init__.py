@@ -0,0 +1,62 @@
+"""
+Qt-free compute layer shared by the tool widgets and the batch engine.
+
+Every tool module exposes NAME, TITLE, VERSION, DEFAULTS and an
+analyze(image, filename, params=None) function returning a report dict with
+a "text" summary plus optional "image" (BGR uint8) and "values" (JSON scalars).
+Expensive tools may also declare COST, their expected seconds per megapixel,
+and MAX_WORKERS, the most tasks the batch scheduler may run at once.
+"""
+
+from . import (
+    blocking,
+    cloning,
+    contrast,
+    ela,
+    ghostmaps,
+    histogram,
+    median,
+    minmax,
+    multiple,
+    noise,
+    original,
+    quality,
+    resampling,
+    splicing,
+)
+
+ANALYZERS = {
+    module.NAME: module
+    for module in [
+        original,
+        histogram,
+        noise,
+        minmax,
+        blocking,
+        quality,
+        ela,
+        multiple,
+        ghostmaps,
+        contrast,
+        cloning,
+        splicing,
+        resampling,
+        median,
+    ]
+}
+TITLES = {module.TITLE: name for name, module in ANALYZERS.items()}
+
+
+def get_analyzer(name):
+    if name in ANALYZERS:
+        return ANALYZERS[name]
+    if name in TITLES:
+        return ANALYZERS[TITLES[name]]
+    return None
+
+
+def analyze(name, image, filename, params=None):
+    analyzer = get_analyzer(name)
+    if analyzer is None:
+        raise KeyError(f"No analyzer available for {name}")
+    return analyzer.analyze(image, filename, params)
@@ -0,0 +1,238 @@
+"""
+Persistent cache of analysis results.
+
+Entries are addressed by the SHA-256 of the evidence file (or of the decoded
+pixels when no file is available), the tool name and version and the full
+parameter set, so a changed file, setting or algorithm never hits a stale
+entry. Each entry is a compressed .npz file: arrays are stored natively, the
+remaining JSON-serializable fields in a metadata record. The cache directory
+is kept under a size limit by evicting the least recently used entries.
+
+Only the process owning a cache tracks its size: copies pickled to worker
+processes write their entries and count the bytes in `stored`, which the
+executor hands back to the owner, so a single process enforces the limit.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from . import get_analyzer
+from .context import ImageContext
+
+CACHE_ENV = "LOOK_DGC_CACHE"
+CACHE_SIZE_ENV = "LOOK_DGC_CACHE_SIZE"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+META_KEY = "__meta__"
+CHUNK_SIZE = 1 << 20
+
+# file hashes of this process, revalidated with size and modification time
+_file_hashes = {}
+_default = None
+
+
+def default_directory():
+    if os.environ.get(CACHE_ENV):
+        return os.environ[CACHE_ENV]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "look-dgc")
+
+
+def default_cache():
+    global _default
+    if _default is None or _default.directory != default_directory():
+        size = os.environ.get(CACHE_SIZE_ENV)
+        _default = ResultCache(max_bytes=int(size) * 1024 ** 2 if size else None)
+    return _default
+
+
+def file_hash(filename):
+    stat = os.stat(filename)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(filename)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    _file_hashes[filename] = (stamp, digest.hexdigest())
+    return _file_hashes[filename][1]
+
+
+def image_hash(image):
+    digest = hashlib.sha256(f"{image.shape}{image.dtype.str}".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def source_hash(filename=None, image=None):
+    """Hash of the evidence: file content when possible, pixels otherwise."""
+    if filename is not None and os.path.isfile(filename):
+        return file_hash(filename)
+    if image is not None:
+        return image_hash(image)
+    return None
+
+
+def _json_default(value):
+    # numpy scalars and arrays nested in values
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def make_key(source, name, version, params=None):
+    record = json.dumps([source, name, version, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(record.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self.total = None
+        self.owner = True
+        # bytes written by a worker copy, accounted for by the owner
+        self.stored = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __getstate__(self):
+        return dict(self.__dict__, total=None, owner=False, stored=0)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.npz")
+
+    def result_key(self, source, tool, params=None):
+        analyzer = get_analyzer(tool)
+        params = dict(analyzer.DEFAULTS, **(params or {}))
+        return make_key(source, analyzer.NAME, analyzer.VERSION, params)
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                result = json.loads(str(data[META_KEY]))
+                for name in data.files:
+                    if name != META_KEY:
+                        result[name] = data[name]
+            # touching the entry marks it as recently used
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return result
+
+    def store(self, key, result):
+        arrays = {k: v for k, v in result.items() if isinstance(v, np.ndarray)}
+        meta = {k: v for k, v in result.items() if k not in arrays}
+        path = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, temp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        except OSError:
+            # a read-only or full cache must not break the analysis
+            return
+        try:
+            with os.fdopen(handle, "wb") as file:
+                meta = json.dumps(meta, default=_json_default)
+                np.savez_compressed(file, **{META_KEY: np.array(meta)}, **arrays)
+            # atomic rename, concurrent readers never see partial entries
+            os.replace(temp, path)
+        except OSError:
+            os.remove(temp)
+            return
+        size = os.path.getsize(path)
+        if self.owner:
+            self.add(size)
+        else:
+            self.stored += size
+
+    def add(self, size):
+        """Account for size bytes of new entries, evicting when over the limit."""
+        if self.total is not None:
+            self.total += size
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".npz"):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return entries
+
+    def evict(self):
+        if self.total is not None and self.total <= self.max_bytes:
+            return
+        entries = self.entries()
+        self.total = sum(size for _, size, _ in entries)
+        if self.total <= self.max_bytes:
+            return
+        # drop to 90% so that eviction does not run on every store
+        for _, size, path in sorted(entries):
+            if self.total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.total = 0
+
+    def lookup(self, filename, tools, params=None):
+        """Split tools into cached results and tools still to run on a file.
+
+        Returns ({tool: result}, [missing tools]) without decoding the image.
+        """
+        try:
+            source = source_hash(filename)
+        except OSError:
+            return {}, list(tools)
+        params = params or {}
+        hits = {}
+        missing = []
+        for tool in tools:
+            result = None
+            if source is not None:
+                result = self.load(self.result_key(source, tool, params.get(tool)))
+            if result is None:
+                missing.append(tool)
+            else:
+                hits[tool] = result
+        return hits, missing
+
+    def analyze(self, tool, image, filename, params=None):
+        """Run an analyzer, reusing a cached result when available."""
+        pixels = image.image if isinstance(image, ImageContext) else image
+        key = self.result_key(source_hash(filename, pixels), tool, params)
+        result = self.load(key)
+        if result is None:
+            result = get_analyzer(tool).analyze(image, filename, params)
+            self.store(key, result)
+        return result
+
+    def memoize(self, source, name, version, params, compute):
+        """Cache an intermediate stage of a tool, compute() returns a result dict."""
+        if source is None:
+            return compute()
+        key = make_key(source, name, version, params)
+        result = self.load(key)
+        if result is None:
+            result = compute()
+            if result is not None:
+                self.store(key, result)
+        return result
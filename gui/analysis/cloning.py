@@ -0,0 +1,465 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+
+import cv2 as cv
+import numpy as np
+
+from .context import ImageContext, dct_matrix
+
+NAME = "cloning"
+TITLE = "Copy-Move Forgery"
+VERSION = 1
+COST = 0.5
+DETECTORS = ["BRISK", "ORB", "AKAZE", "Blocks"]
+# detector index of the block engine
+BLOCKS = 3
+MATCHERS = ["Auto", "Exact", "Approximate"]
+# memory allowed for matching, bounding both the keypoints and the distance rows
+# computed at once by exact matching
+MATCH_MEMORY = 2 ** 30
+# approximate matching memory per keypoint: descriptor, hash tables and neighbour lists
+KEYPOINT_MEMORY = 4096
+# tiled detection: tile size and margin around tiles giving keypoints their context,
+# multiples of 32 so that tile pyramids stay aligned with the image's
+DETECT_TILE = 2048
+DETECT_OVERLAP = 96
+ORB_FEATURES = 500
+# auto matching is exact up to this many keypoints
+EXACT_KEYPOINTS = 5000
+# neighbours searched per keypoint by approximate matching
+LSH_NEIGHBORS = 8
+FLANN_INDEX_LSH = 6
+# block engine: overlapping blocks are described by their lowest DCT frequencies,
+# quantized and packed above the block index into a single sortable key
+BLOCK_SIZE = 8
+BLOCK_FEATURES = [(0, 0), (0, 1), (1, 0), (2, 0), (1, 1), (0, 2)]
+FEATURE_BITS = [8, 6, 6, 6, 6, 6]
+# largest DC coefficient of a block, its levels never get finer than its bits allow
+DC_MAXIMUM = 255 * BLOCK_SIZE
+INDEX_BITS = 26
+# key of blocks left out (flat or masked), sorted last
+EXCLUDED = 2 ** sum(FEATURE_BITS) - 1
+# quantization step at 100% matching
+BLOCK_QUANTIZATION = 40
+# following blocks in sorted order compared with each block
+BLOCK_WINDOW = 16
+# block rows described at once and sorted keys compared at once
+BLOCK_STRIP = 256
+BLOCK_CHUNK = 2 ** 22
+DEFAULTS = {
+    "detector": 0,
+    "response": 90,
+    "matching": 20,
+    "tiled": False,
+    "matcher": 0,
+    "tables": 12,
+    "distance": 15,
+    "cluster": 5,
+    "lines": True,
+    "keypoints": False,
+}
+
+
+def create_detector(algorithm, features=ORB_FEATURES):
+    if algorithm == 0:
+        return cv.BRISK_create()
+    if algorithm == 1:
+        return cv.ORB_create(features)
+    if algorithm == 2:
+        return cv.AKAZE_create()
+    return None
+
+
+def orb_level_features(detector):
+    """Features ORB keeps on each pyramid level, a geometric share of its total by scale."""
+    features, levels = detector.getMaxFeatures(), detector.getNLevels()
+    factor = 1 / detector.getScaleFactor()
+    share = features * (1 - factor) / (1 - factor ** levels)
+    quotas = []
+    for _ in range(levels - 1):
+        # rounded half away from zero as in OpenCV
+        quotas.append(int(np.floor(share + 0.5)))
+        share *= factor
+    return quotas + [max(features - sum(quotas), 0)]
+
+
+def detect_tiled(gray, algorithm, mask=None, jobs=None):
+    """Keypoints and descriptors of overlapping tiles, detected on up to jobs threads.
+
+    Each tile keeps the keypoints within its core, so those found twice in the
+    overlaps are kept once. With ORB every tile may find all ORB_FEATURES, then the
+    strongest of all tiles are kept with the quota of each pyramid level, as on the
+    whole image.
+    """
+    from .executor import default_jobs
+
+    height, width = gray.shape[:2]
+    cores = [
+        (x, y, min(x + DETECT_TILE, width), min(y + DETECT_TILE, height))
+        for y in range(0, height, DETECT_TILE)
+        for x in range(0, width, DETECT_TILE)
+    ]
+
+    def detect(core):
+        x0, y0, x1, y1 = core
+        left, top = max(x0 - DETECT_OVERLAP, 0), max(y0 - DETECT_OVERLAP, 0)
+        right, bottom = min(x1 + DETECT_OVERLAP, width), min(y1 + DETECT_OVERLAP, height)
+        detector = create_detector(algorithm)
+        tile_mask = None if mask is None else mask[top:bottom, left:right]
+        kpts, desc = detector.detectAndCompute(gray[top:bottom, left:right], tile_mask)
+        kept = []
+        for i, kpt in enumerate(kpts):
+            x, y = kpt.pt[0] + left, kpt.pt[1] + top
+            if x0 <= x < x1 and y0 <= y < y1:
+                kpt.pt = (x, y)
+                kept.append(i)
+        return [kpts[i] for i in kept], desc[kept] if kept else None
+
+    with ThreadPoolExecutor(min(jobs or default_jobs(), len(cores))) as pool:
+        tiles = list(pool.map(detect, cores))
+    kpts = [kpt for tile_kpts, _ in tiles for kpt in tile_kpts]
+    descs = [desc for _, desc in tiles if desc is not None]
+    desc = np.vstack(descs) if descs else None
+    if algorithm == 1 and kpts:
+        responses = np.array([k.response for k in kpts])
+        octaves = np.array([k.octave for k in kpts])
+        strongest = []
+        for octave, quota in enumerate(orb_level_features(create_detector(algorithm))):
+            level = np.flatnonzero(octaves == octave)
+            strongest.append(level[np.argsort(-responses[level], kind="stable")[:quota]])
+        strongest = np.sort(np.concatenate(strongest))
+        kpts, desc = [kpts[i] for i in strongest], desc[strongest]
+    return kpts, desc
+
+
+def detect_keypoints(gray, algorithm, response, mask=None, tiled=False, jobs=None):
+    if tiled:
+        kpts, desc = detect_tiled(gray, algorithm, mask, jobs)
+    else:
+        detector = create_detector(algorithm)
+        kpts, desc = detector.detectAndCompute(gray, mask)
+    total = len(kpts)
+    responses = np.array([k.response for k in kpts])
+    strongest = (
+        cv.normalize(responses, None, 0, 100, cv.NORM_MINMAX) >= 100 - response
+    ).flatten()
+    kpts = list(compress(kpts, strongest))
+    if len(kpts) * KEYPOINT_MEMORY > MATCH_MEMORY:
+        return total, kpts, None
+    return total, kpts, desc[strongest]
+
+
+def exact_matches(desc, radius):
+    """All pairs of descriptors within radius, comparing blocks of rows to every descriptor."""
+    matcher = cv.BFMatcher_create(cv.NORM_HAMMING, True)
+    rows = max(MATCH_MEMORY // (4 * len(desc)), 1)
+    matches = []
+    for start in range(0, len(desc), rows):
+        for sublist in matcher.radiusMatch(desc[start : start + rows], desc, radius):
+            for m in sublist:
+                m.queryIdx += start
+                matches.append(m)
+    return matches
+
+
+def approximate_matches(desc, radius, tables):
+    """Pairs within radius among the nearest neighbours found by locality sensitive hashing.
+
+    More hash tables find more of the exact pairs, at the cost of speed and memory.
+    """
+    # longer keys keep buckets small as keypoints increase
+    key_size = int(np.clip(np.log2(len(desc)) + 10, 20, 28))
+    index = {
+        "algorithm": FLANN_INDEX_LSH,
+        "table_number": tables,
+        "key_size": key_size,
+        "multi_probe_level": 1,
+    }
+    matcher = cv.FlannBasedMatcher(index, {})
+    neighbors = matcher.knnMatch(desc, desc, k=min(LSH_NEIGHBORS, len(desc)))
+    return [m for sublist in neighbors for m in sublist if m.distance <= radius]
+
+
+def match_keypoints(desc, matching, matcher=0, tables=12):
+    radius = matching / 100 * 255
+    if matcher == 2 or matcher == 0 and len(desc) > EXACT_KEYPOINTS:
+        matches = approximate_matches(desc, radius, tables)
+    else:
+        matches = exact_matches(desc, radius)
+    return [m for m in matches if m.queryIdx != m.trainIdx]
+
+
+def reverse_matches(matches):
+    """Index of the match going the opposite way for every match, -1 if there is none."""
+    index = {(m.queryIdx, m.trainIdx): i for i, m in enumerate(matches)}
+    return np.array([index.get((m.trainIdx, m.queryIdx), -1) for m in matches], dtype=int)
+
+
+def cluster_matches(kpts, matches, shape, distance, cluster, progress=None):
+    """Group every match with the later ones joining nearby points to nearby points.
+
+    Two matches are neighbours when their ends are closer than the minimum distance,
+    in the same or in swapped order, and their lengths differ less than that. Matches
+    shorter than the minimum distance are dropped. Groups of at least cluster
+    matches are returned, along with the matches kept.
+    """
+    from scipy.spatial import cKDTree
+
+    clusters = []
+    min_dist = distance / 100 * np.min(shape[:2]) / 2
+    kpts_a = np.array([p.pt for p in kpts])
+    ds = np.linalg.norm(
+        [kpts_a[m.queryIdx] - kpts_a[m.trainIdx] for m in matches], axis=1
+    )
+    keep = ds > min_dist
+    matches = list(compress(matches, keep))
+    ds = ds[keep]
+    total = len(matches)
+    if total == 0:
+        return matches, clusters
+
+    a = kpts_a[[m.queryIdx for m in matches]]
+    b = kpts_a[[m.trainIdx for m in matches]]
+    reverse = reverse_matches(matches)
+    # both ends within min_dist means within sqrt(2) * min_dist in the space of
+    # (query, train) coordinates, in the same or in swapped order
+    ends = np.hstack([a, b])
+    tree = cKDTree(ends)
+    radius = np.sqrt(2) * min_dist
+    for i in range(total):
+        near = tree.query_ball_point(ends[i], radius)
+        near += tree.query_ball_point(np.hstack([b[i], a[i]]), radius)
+        j = np.unique(near)
+        j = j[(j > i) & (reverse[j] != i) & (np.abs(ds[i] - ds[j]) <= min_dist)]
+        aa = np.linalg.norm(a[i] - a[j], axis=1)
+        bb = np.linalg.norm(b[i] - b[j], axis=1)
+        ab = np.linalg.norm(a[i] - b[j], axis=1)
+        ba = np.linalg.norm(b[i] - a[j], axis=1)
+        j = j[
+            (0 < aa) & (aa < min_dist) & (0 < bb) & (bb < min_dist)
+            | (0 < ab) & (ab < min_dist) & (0 < ba) & (ba < min_dist)
+        ]
+        # a match is left out when its reverse already joined the group
+        j = j[~((reverse[j] >= 0) & (reverse[j] < j) & np.isin(reverse[j], j))]
+
+        if len(j) + 1 >= cluster:
+            clusters.append([matches[i]] + [matches[k] for k in j])
+        if progress is not None and not progress(i):
+            return matches, None
+    return matches, clusters
+
+
+def block_keys(gray, step, mask=None):
+    """Keys of all overlapping blocks, row by row, and the number of blocks in a row.
+
+    Flat blocks, whose frequencies all quantize to zero, and blocks centered outside
+    the mask get the EXCLUDED features. The DC is quantized with a step of at least
+    DC_MAXIMUM over its levels, so that bright blocks stay apart at fine steps.
+    """
+    rows, cols = gray.shape[0] - BLOCK_SIZE + 1, gray.shape[1] - BLOCK_SIZE + 1
+    if rows * cols > 2 ** INDEX_BITS:
+        raise ValueError(f"Too many blocks ({rows * cols}), please reduce image size")
+    basis = dct_matrix(BLOCK_SIZE).astype(np.float32)
+    dc_step = max(step, DC_MAXIMUM / (2 ** FEATURE_BITS[0] - 1))
+    keys = np.empty(max(rows, 0) * max(cols, 0), np.uint64)
+    for top in range(0, rows, BLOCK_STRIP):
+        bottom = min(top + BLOCK_STRIP, rows)
+        strip = gray[top : bottom + BLOCK_SIZE - 1].astype(np.float32)
+        key = np.zeros((bottom - top, cols), np.uint64)
+        flat = np.ones(key.shape, bool)
+        for (u, v), bits in zip(BLOCK_FEATURES, FEATURE_BITS):
+            # coefficient (u, v) of every block, a correlation anchored at the block corner
+            coefficient = cv.sepFilter2D(
+                strip, cv.CV_32F, basis[v], basis[u], anchor=(0, 0), borderType=cv.BORDER_CONSTANT
+            )[: bottom - top, :cols]
+            if u == v == 0:
+                level = coefficient / dc_step
+            else:
+                level = np.rint(coefficient / step) + 2 ** (bits - 1)
+                flat &= level == 2 ** (bits - 1)
+            key <<= np.uint64(bits)
+            key |= np.clip(level, 0, 2 ** bits - 1).astype(np.uint64)
+        if mask is not None:
+            center = BLOCK_SIZE // 2
+            flat |= mask[top + center : bottom + center, center : center + cols] == 0
+        key[flat] = EXCLUDED
+        key <<= np.uint64(INDEX_BITS)
+        key |= np.arange(top * cols, bottom * cols, dtype=np.uint64).reshape(key.shape)
+        keys[top * cols : bottom * cols] = key.ravel()
+    return keys, cols
+
+
+def block_pairs(keys, cols, min_dist):
+    """Blocks with equal features among the next BLOCK_WINDOW of sorted keys, chunk by chunk.
+
+    Yields the source and target block indices and the code of their shift vector,
+    for shifts of at least min_dist. Equal features sort by block index, so shifts
+    point downwards or to the right.
+    """
+    index_mask = np.uint64(2 ** INDEX_BITS - 1)
+    for start in range(0, len(keys), BLOCK_CHUNK):
+        chunk = keys[start : start + BLOCK_CHUNK + BLOCK_WINDOW]
+        features = chunk >> np.uint64(INDEX_BITS)
+        index = (chunk & index_mask).astype(np.int64)
+        owned = min(BLOCK_CHUNK, len(chunk))
+        for k in range(1, BLOCK_WINDOW + 1):
+            n = min(owned, len(chunk) - k)
+            if n <= 0:
+                break
+            same = np.flatnonzero((features[:n] == features[k : k + n]) & (features[:n] != EXCLUDED))
+            source, target = index[same], index[same + k]
+            dy = target // cols - source // cols
+            dx = target % cols - source % cols
+            far = dy ** 2 + dx ** 2 >= min_dist ** 2
+            yield source[far], target[far], dy[far] * 2 * cols + dx[far] + cols
+
+
+def count_votes(codes, votes, shifts):
+    """Add the shifts to the votes of the sorted shift codes."""
+    shifts = np.concatenate([codes] + shifts)
+    codes, inverse = np.unique(shifts, return_inverse=True)
+    weights = np.ones(len(shifts), np.int64)
+    weights[: len(votes)] = votes
+    return codes, np.bincount(inverse, weights, len(codes)).astype(np.int64)
+
+
+def match_blocks(gray, matching, distance, cluster, mask=None):
+    """Copy-move detection on overlapping blocks, finding copies of regions without keypoints.
+
+    Pairs of similar blocks vote for their shift vector, shifts voted by at least the
+    area of cluster blocks are copies. Returns the number of blocks, keypoints at
+    the matched blocks, their matches and a cluster of matches per shift vector.
+    """
+    if matching <= 0:
+        raise ValueError("Matching must be positive!")
+    step = matching / 100 * BLOCK_QUANTIZATION
+    min_dist = distance / 100 * np.min(gray.shape[:2]) / 2
+    keys, cols = block_keys(gray, step, mask)
+    keys.sort()
+    codes = votes = np.empty(0, np.int64)
+    pending = []
+    # shifts are counted once they outnumber the shifts counted so far
+    for _, _, shifts in block_pairs(keys, cols, min_dist):
+        pending.append(shifts)
+        if sum(map(len, pending)) > max(len(codes), BLOCK_CHUNK):
+            codes, votes = count_votes(codes, votes, pending)
+            pending = []
+    codes, votes = count_votes(codes, votes, pending)
+    copies = codes[votes >= cluster * BLOCK_SIZE ** 2]
+    copies = copies[np.argsort(-votes[votes >= cluster * BLOCK_SIZE ** 2], kind="stable")]
+    if not copies.size:
+        return len(keys), [], [], []
+
+    # pairs of the copies, only from sources on the block grid to keep drawings legible
+    sources, targets, shifts = [], [], []
+    for source, target, shift in block_pairs(keys, cols, min_dist):
+        keep = np.isin(shift, copies) & (source // cols % BLOCK_SIZE == 0) & (source % cols % BLOCK_SIZE == 0)
+        sources.append(source[keep])
+        targets.append(target[keep])
+        shifts.append(shift[keep])
+    blocks, pairs = np.unique(np.concatenate(sources + targets), return_inverse=True)
+    pairs = pairs.reshape(2, -1)
+    shifts = np.concatenate(shifts)
+    half = BLOCK_SIZE / 2
+    kpts = [cv.KeyPoint(float(b % cols + half), float(b // cols + half), half) for b in blocks]
+    # full distance, drawn at full brightness
+    radius = matching / 100 * 255
+    clusters = [
+        [cv.DMatch(int(i), int(j), radius) for i, j in pairs[:, shifts == code].T] for code in copies
+    ]
+    clusters = [c for c in clusters if c]
+    return len(keys), kpts, [m for c in clusters for m in c], clusters
+
+
+def count_regions(angles):
+    if not angles:
+        return 0
+    angles = np.reshape(np.array(angles, dtype=np.float32), (len(angles), 1))
+    if np.std(angles) < 0.1:
+        return 1
+    criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    attempts = 10
+    flags = cv.KMEANS_PP_CENTERS
+    compact = [
+        cv.kmeans(angles, k, None, criteria, attempts, flags)[0] for k in range(1, 11)
+    ]
+    compact = cv.normalize(np.array(compact), None, 0, 1, cv.NORM_MINMAX)
+    return np.argmax(compact < 0.005) + 1
+
+
+def render(image, kpts, clusters, matching, lines=True, keypoints=False):
+    output = np.copy(image)
+    matching = matching / 100 * 255
+
+    if keypoints:
+        for kpt in kpts:
+            cv.circle(output, (int(kpt.pt[0]), int(kpt.pt[1])), 2, (250, 227, 72))
+
+    members = [m for c in clusters for m in c]
+    if not members:
+        return output, count_regions([])
+    # match colors are computed at once: hue from the direction, value from the distance
+    pa = np.array([kpts[m.queryIdx].pt for m in members]).astype(int)
+    pb = np.array([kpts[m.trainIdx].pt for m in members]).astype(int)
+    sa = np.round([kpts[m.queryIdx].size for m in members]).astype(int)
+    sb = np.round([kpts[m.trainIdx].size for m in members]).astype(int)
+    angles = np.arctan2(pb[:, 1] - pa[:, 1], pb[:, 0] - pa[:, 0])
+    angles[angles < 0] += np.pi
+    hsv = np.zeros((len(members), 1, 3))
+    hsv[:, 0, 0] = angles / np.pi * 180
+    hsv[:, 0, 1] = 255
+    hsv[:, 0, 2] = np.array([m.distance for m in members]) / matching * 255
+    colors = cv.cvtColor(hsv.astype(np.uint8), cv.COLOR_HSV2BGR)[:, 0].tolist()
+    for a, b, ra, rb, rgb in zip(pa.tolist(), pb.tolist(), sa.tolist(), sb.tolist(), colors):
+        cv.circle(output, a, ra, rgb, 1, cv.LINE_AA)
+        cv.circle(output, b, rb, rgb, 1, cv.LINE_AA)
+        if lines:
+            cv.line(output, a, b, rgb, 1, cv.LINE_AA)
+    return output, count_regions(angles.tolist())
+
+
+def analyze(image, filename, params=None):
+    from .executor import task_threads
+
+    params = dict(DEFAULTS, **(params or {}))
+    context = ImageContext.of(image, filename)
+    image = context.image
+    gray = context.gray()
+    if params["detector"] == BLOCKS:
+        total, kpts, matches, clusters = match_blocks(
+            gray, params["matching"], params["distance"], params["cluster"]
+        )
+    else:
+        total, kpts, desc = detect_keypoints(
+            gray, params["detector"], params["response"], tiled=params["tiled"], jobs=task_threads()
+        )
+        if desc is None:
+            raise ValueError(
+                f"Too many keypoints found ({total}), please reduce response value"
+            )
+        matches = match_keypoints(desc, params["matching"], params["matcher"], params["tables"])
+        if matches:
+            matches, clusters = cluster_matches(
+                kpts, matches, gray.shape, params["distance"], params["cluster"]
+            )
+        else:
+            matches, clusters = [], []
+    output, regions = render(
+        image, kpts, clusters, params["matching"], params["lines"], params["keypoints"]
+    )
+    text = "Copy-Move Forgery Results:\n"
+    text += f"Detector: {DETECTORS[params['detector']]}\n"
+    text += f"Keypoints: {total} --> Filtered: {len(kpts)}\n"
+    text += f"Matches: {len(matches)} --> Clusters: {len(clusters)}\n"
+    text += f"Regions: {regions}"
+    return {
+        "text": text,
+        "image": output,
+        "values": {
+            "keypoints": total,
+            "filtered": len(kpts),
+            "matches": len(matches),
+            "clusters": len(clusters),
+            "regions": int(regions),
+        },
+    }
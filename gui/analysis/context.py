@@ -0,0 +1,93 @@
+"""
+Derived representations of one image, computed once and shared.
+
+Tools running on the same image tend to redo the same conversions: grayscale,
+float copies, padding to their block size, JPEG recompressions. An
+ImageContext owns the decoded image and computes each derivative on first use
+only; since every tool sees the same arrays, they are returned read-only.
+
+Tool functions accept either a plain image or a context, so interactive
+widgets keep passing arrays while the batch executor hands all tools of an
+image the same context.
+"""
+
+import threading
+
+import cv2 as cv
+import numpy as np
+
+from imaging import pad_image
+from jpeg import compress_jpg
+
+DCT_SIZE = 8
+
+
+def dct_matrix(size=DCT_SIZE):
+    """Orthonormal DCT-II basis, the transform computed by cv.dct."""
+    k = np.arange(size)
+    basis = np.cos(np.pi * (2 * k[np.newaxis, :] + 1) * k[:, np.newaxis] / (2 * size))
+    basis[0] *= np.sqrt(1 / size)
+    basis[1:] *= np.sqrt(2 / size)
+    return basis
+
+
+class ImageContext:
+    def __init__(self, image, filename=None):
+        self.image = image
+        self.filename = filename
+        self.derived = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def of(cls, image, filename=None):
+        return image if isinstance(image, cls) else cls(image, filename)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def memo(self, key, compute):
+        """Return the derivative stored under key, computing it only once."""
+        with self.lock:
+            if key in self.derived:
+                return self.derived[key]
+            lock = self.locks.setdefault(key, threading.Lock())
+        # tools needing the same derivative wait for the first to compute it
+        with lock:
+            if key not in self.derived:
+                value = compute()
+                if value is not self.image:
+                    value.flags.writeable = False
+                self.derived[key] = value
+        return self.derived[key]
+
+    def release(self):
+        self.image = None
+        self.derived.clear()
+
+    def gray(self):
+        if self.image.ndim == 2:
+            return self.image
+        return self.memo("gray", lambda: cv.cvtColor(self.image, cv.COLOR_BGR2GRAY))
+
+    def as_float(self, dtype=np.float32, gray=False, normalize=False):
+        """Float copy of the image or its grayscale, optionally scaled to [0, 1]."""
+
+        def compute():
+            result = (self.gray() if gray else self.image).astype(dtype)
+            if normalize:
+                result /= 255
+            return result
+
+        return self.memo(("float", np.dtype(dtype).str, gray, normalize), compute)
+
+    def padded(self, block, gray=False, reflect=False):
+        source = self.gray if gray else lambda: self.image
+        return self.memo(("padded", block, gray, reflect), lambda: pad_image(source(), block, reflect))
+
+    def jpeg(self, quality, gray=False):
+        """Image (or grayscale) recompressed as JPEG at the given quality."""
+        if gray:
+            return self.memo(("jpeg", quality, True), lambda: compress_jpg(self.gray(), quality, color=False))
+        return self.memo(("jpeg", quality, False), lambda: compress_jpg(self.image, quality))
@@ -0,0 +1,110 @@
+import cv2 as cv
+import numpy as np
+
+from imaging import compute_hist, gray_to_bgr
+from .context import ImageContext
+
+NAME = "contrast"
+TITLE = "Contrast Enhancement"
+VERSION = 1
+COST = 1.0
+ALGORITHMS = ["Histogram Error", "Channel Similarity", "Joint probability"]
+DEFAULTS = {"algorithm": 2, "block": 64}
+
+
+def contrast_maps(image, block, progress=None):
+    context = ImageContext.of(image)
+    rows0, cols0, _ = context.shape
+    color = context.padded(block)
+    # zero padding commutes with the color conversion
+    gray = context.padded(block, gray=True)
+    rows, cols = gray.shape
+
+    kx, ky = cv.getDerivKernels(1, 1, 1)
+    bd, gd, rd = [cv.sepFilter2D(c, cv.CV_32F, kx, ky) for c in cv.split(color)]
+    tri = (np.abs(gd - rd) + np.abs(gd - bd) + np.abs(rd - bd)) / 3
+    avg = (np.abs(bd) + np.abs(gd) + np.abs(rd)) / 3
+
+    window = np.arange(256).astype(np.float32)
+    cutoff = 8
+    window[:cutoff] = (1 - np.cos(np.pi * window[:cutoff] / cutoff)) / 2
+    window[-cutoff:] = (1 + np.cos(np.pi * (window[-cutoff:] + cutoff - 255) / cutoff)) / 2
+    window[cutoff:-cutoff] = 1
+    weight = ((np.arange(256) - 128) / 128) ** 2
+
+    chsim_map = np.zeros(((rows // block) + 1, (cols // block) + 1), np.float32)
+    error_map = np.copy(chsim_map)
+    joint_map = np.copy(chsim_map)
+
+    max_err = 0.185
+    max_sim = 0.75
+    p = 0
+    for i in range(0, rows, block):
+        for j in range(0, cols, block):
+            hist = compute_hist(gray[i : i + block, j : j + block]) * window
+            hist = cv.normalize(hist, None, 0, 1, cv.NORM_MINMAX)
+            dft = np.fft.fftshift(cv.dft(hist, flags=cv.DFT_COMPLEX_OUTPUT))
+            mag = cv.magnitude(dft[:, :, 0], dft[:, :, 1])
+            mag = cv.normalize(mag, None, 0, 1, cv.NORM_MINMAX).flatten()
+
+            diff = 0
+            for k in range(2, 254):
+                yl = 2 * hist[k - 1] - hist[k - 2]
+                yr = 2 * hist[k + 1] - hist[k + 2]
+                d = abs(hist[k] - (yl + yr) / 2)
+                if d > diff:
+                    diff = d
+            ed = np.sum(mag)
+            if ed == 0:
+                error = 0
+            else:
+                en = np.sum(mag * weight)
+                error = en / ed
+                if error > max_err:
+                    error = 1
+                else:
+                    error /= max_err
+                error *= np.sqrt(diff)
+            error_map[i // block, j // block] = error
+
+            avg_m = np.mean(avg[i : i + block, j : j + block])
+            if avg_m == 0:
+                chsim = 0
+            else:
+                tri_m = np.mean(tri[i : i + block, j : j + block])
+                chsim = tri_m / avg_m
+                if chsim > max_sim:
+                    chsim = 1
+                else:
+                    chsim /= max_sim
+            chsim_map[i // block, j // block] = chsim
+
+            joint_map[i // block, j // block] = error * chsim
+
+            if progress is not None and not progress(p):
+                return None
+            p += 1
+
+    maps = []
+    for output in [error_map, chsim_map, joint_map]:
+        output = cv.medianBlur(cv.convertScaleAbs(output, None, 255), 3)
+        maps.append(
+            gray_to_bgr(
+                cv.resize(output, None, None, block, block, cv.INTER_NEAREST)[
+                    :rows0, :cols0
+                ]
+            )
+        )
+    return maps
+
+
+def analyze(image, filename, params=None):
+    params = dict(DEFAULTS, **(params or {}))
+    maps = contrast_maps(ImageContext.of(image, filename), params["block"])
+    output = maps[params["algorithm"]]
+    score = float(np.mean(output[:, :, 0])) / 255 * 100
+    text = "Contrast Enhancement Results:\n"
+    text += f"Algorithm: {ALGORITHMS[params['algorithm']]}\n"
+    text += f"Block size: {params['block']}\n"
+    text += f"Average score: {score:.2f}%"
+    return {"text": text, "image": output, "values": {"average_score": score}}
@@ -0,0 +1,54 @@
+import cv2 as cv
+import numpy as np
+
+from imaging import create_lut, desaturate
+from .context import ImageContext
+
+NAME = "ela"
+TITLE = "Error Level Analysis"
+VERSION = 1
+DEFAULTS = {
+    "quality": 75,
+    "scale": 50,
+    "contrast": 20,
+    "linear": False,
+    "grayscale": False,
+}
+
+
+def error_level(image, compressed, scale, contrast, linear=False, grayscale=False):
+    context = ImageContext.of(image)
+    contrast = int(contrast / 100 * 128)
+    if not linear:
+        difference = cv.absdiff(
+            context.as_float(normalize=True), compressed.astype(np.float32) / 255
+        )
+        ela = cv.convertScaleAbs(cv.sqrt(difference) * 255, None, scale / 20)
+    else:
+        ela = cv.convertScaleAbs(cv.subtract(compressed, context.image), None, scale)
+    ela = cv.LUT(ela, create_lut(contrast, contrast))
+    if grayscale:
+        ela = desaturate(ela)
+    return ela
+
+
+def analyze(image, filename, params=None):
+    params = dict(DEFAULTS, **(params or {}))
+    context = ImageContext.of(image, filename)
+    image = context.image
+    compressed = context.jpeg(params["quality"])
+    ela = error_level(
+        context,
+        compressed,
+        params["scale"],
+        params["contrast"],
+        params["linear"],
+        params["grayscale"],
+    )
+    mean_error = float(np.mean(cv.absdiff(image, compressed)))
+    text = "Error Level Analysis Results:\n"
+    text += f"Quality: {params['quality']}%\n"
+    text += f"Scale: {params['scale']}%\n"
+    text += f"Contrast: {params['contrast']}%\n"
+    text += f"Mean error level: {mean_error:.2f}"
+    return {"text": text, "image": ela, "values": {"mean_error": mean_error}}
@@ -0,0 +1,299 @@
+"""
+Batch execution of analyzers over many images.
+
+In process mode every worker runs in its own interpreter, so pure-Python tool
+loops scale with the number of cores. Decoded images are handed to workers
+through shared memory instead of being pickled, and each worker loads the
+models of the selected tools once when it starts. Tools running on the same
+image share its ImageContext: one instance in thread mode, one per worker for
+the image it attached last in process mode, dropped once the image has no
+more tasks to start. Every task may use its share of
+the cores, task_threads(), for the thread pools and libraries it runs, so that
+workers do not oversubscribe the cores between them.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from . import get_analyzer
+from .context import ImageContext
+from .scheduler import CostModel, TaskQueue
+from .telemetry import TaskTimer
+
+
+# threads of the batch task running in this thread, None for interactive calls
+_task_threads = ContextVar("task_threads", default=None)
+
+
+def default_jobs():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def task_threads():
+    """Threads the running batch task may use, None outside batches where all cores are."""
+    return _task_threads.get()
+
+
+@contextmanager
+def thread_budget(threads):
+    token = _task_threads.set(threads)
+    try:
+        yield
+    finally:
+        _task_threads.reset(token)
+
+
+class SharedImage:
+    """Picklable handle to an image stored in a shared memory block."""
+
+    def __init__(self, image):
+        self.shape = image.shape
+        self.dtype = image.dtype.str
+        self.memory = SharedMemory(create=True, size=max(image.nbytes, 1))
+        self.name = self.memory.name
+        np.ndarray(self.shape, self.dtype, self.memory.buf)[...] = image
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.memory = None
+
+    def attach(self):
+        """Return (memory, view); close the memory once the view is no longer used."""
+        memory = SharedMemory(name=self.name)
+        return memory, np.ndarray(self.shape, self.dtype, memory.buf)
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+# context of the image a worker process attached last, so that further tools
+# on the same image reuse its derived data
+_attached = OrderedDict()
+ATTACHED_IMAGES = 1
+
+
+def attach_context(shared, filename):
+    if shared.name in _attached:
+        _attached.move_to_end(shared.name)
+        return _attached[shared.name][1]
+    memory, view = shared.attach()
+    context = ImageContext(view, filename)
+    _attached[shared.name] = (memory, context)
+    del view
+    while len(_attached) > ATTACHED_IMAGES:
+        detach_context(next(iter(_attached)))
+    return context
+
+
+def detach_context(name):
+    """Free the derived data and the mapping of an attached image."""
+    memory, context = _attached.pop(name)
+    context.release()
+    del context
+    try:
+        memory.close()
+    except BufferError:
+        # a result still holds a view, the mapping is freed along with it
+        pass
+
+
+def warmup(tools, threads=None):
+    with thread_budget(threads):
+        for tool in tools:
+            analyzer = get_analyzer(tool)
+            if hasattr(analyzer, "warmup"):
+                try:
+                    analyzer.warmup()
+                except Exception:
+                    # missing models are reported by the tasks that need them
+                    pass
+
+
+def analyze(tool, image, filename, params=None, cache=None):
+    if cache is None:
+        return get_analyzer(tool).analyze(image, filename, params)
+    return cache.analyze(tool, image, filename, params)
+
+
+def run_task(tool, filename, image, params=None, cache=None, submitted=None, threads=None, keep=True):
+    """Run one tool on up to threads threads, returning its report with the task timings under "timing".
+
+    Shared images stay attached for further tools while keep is set.
+    """
+    timer = TaskTimer(submitted)
+    shared = image if isinstance(image, SharedImage) else None
+    try:
+        if shared is not None:
+            image = attach_context(shared, filename)
+        with thread_budget(threads):
+            result = analyze(tool, image, filename, params, cache)
+        if cache is not None and cache.stored:
+            result["stored"] = cache.stored
+    except Exception as e:
+        result = {"text": f"Error: {str(e)}"}
+    finally:
+        if shared is not None and not keep and shared.name in _attached:
+            detach_context(shared.name)
+    result["timing"] = timer.stop()
+    return result
+
+
+class BatchExecutor:
+    """Run (image x tool) tasks on a pool of worker processes or threads.
+
+    Images are given as an iterable of (filename, basename, image) tuples, or
+    (filename, basename, image, tools) to run only some of the tools on that
+    image; results are yielded as (basename, tool, data) in completion order.
+    When a ResultCache is given, workers reuse and store results there while
+    this process keeps the cache under its size limit, and a Telemetry
+    instance receives the timings of every task. At most
+    `inflight` images are held by the pool at any time: the next one is only
+    pulled from the iterable when a previous image has finished all its tools,
+    which keeps lazy sources such as ingest.stream_images bounded in memory.
+
+    Tasks of the images held are started costliest first according to the
+    CostModel, which learns from the timings as the batch runs, and `limits`
+    maps tools to the most tasks of that tool allowed to run at once. Each
+    task may use `threads` threads, by default its share of the cores.
+    """
+
+    def __init__(
+        self,
+        tools,
+        jobs=None,
+        processes=True,
+        params=None,
+        inflight=None,
+        cache=None,
+        telemetry=None,
+        costs=None,
+        limits=None,
+        threads=None,
+    ):
+        self.tools = [t for t in tools if get_analyzer(t) is not None]
+        self.jobs = jobs or default_jobs()
+        self.threads = threads or max(default_jobs() // self.jobs, 1)
+        self.inflight = inflight or self.jobs + 1
+        self.processes = processes
+        self.params = params or {}
+        self.cache = cache
+        self.telemetry = telemetry
+        self.costs = costs or CostModel()
+        self.limits = limits or {}
+        if processes:
+            # spawn avoids forking a process that may be running Qt threads
+            self.pool = ProcessPoolExecutor(
+                self.jobs,
+                mp_context=get_context("spawn"),
+                initializer=warmup,
+                initargs=(self.tools, self.threads),
+            )
+        else:
+            warmup(self.tools, self.threads)
+            self.pool = ThreadPoolExecutor(self.jobs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self, cancel=False):
+        self.pool.shutdown(wait=True, cancel_futures=cancel)
+
+    def submit(self, filename, image, tool, ready=None, keep=True):
+        return self.pool.submit(
+            run_task,
+            tool,
+            filename,
+            image,
+            self.params.get(tool),
+            self.cache,
+            ready or time.time(),
+            self.threads,
+            keep,
+        )
+
+    def run(self, images):
+        images = iter(images)
+        queue = TaskQueue(self.costs, self.limits)
+        pending = {}
+        shared = {}
+        remaining = {}
+        # tasks of each image still waiting in the queue
+        queued = {}
+        index = 0
+        exhausted = not self.tools
+        try:
+            while True:
+                while not exhausted and len(remaining) < self.inflight:
+                    try:
+                        filename, basename, image, *tools = next(images)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    tools = [t for t in tools[0] if t in self.tools] if tools else self.tools
+                    if not tools:
+                        continue
+                    pixels = image.shape[0] * image.shape[1]
+                    if self.processes:
+                        image = shared[index] = SharedImage(image)
+                    else:
+                        # threads share the derived data of the image directly
+                        image = ImageContext(image, filename)
+                    remaining[index] = queued[index] = len(tools)
+                    for tool in tools:
+                        queue.push(tool, pixels, (index, filename, basename, image, pixels, time.time()))
+                    index += 1
+                # tasks wait in the queue rather than the pool, so each free
+                # worker takes the costliest task that is allowed to start
+                while len(pending) < self.jobs:
+                    task = queue.pop()
+                    if task is None:
+                        break
+                    tool, (key, filename, basename, image, pixels, ready) = task
+                    queued[key] -= 1
+                    # the worker of the last task frees the derived data of the image
+                    future = self.submit(filename, image, tool, ready, queued[key] > 0)
+                    pending[future] = (key, basename, tool, pixels)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, basename, tool, pixels = pending.pop(future)
+                    queue.done(tool)
+                    remaining[key] -= 1
+                    if remaining[key] == 0:
+                        del remaining[key], queued[key]
+                        if key in shared:
+                            shared.pop(key).release()
+                    result = future.result()
+                    stored = result.pop("stored", 0)
+                    if stored:
+                        self.cache.add(stored)
+                    timing = result.get("timing")
+                    if timing is not None and not result["text"].startswith("Error:"):
+                        self.costs.update(tool, pixels, timing["wall"])
+                    if self.telemetry is not None:
+                        self.telemetry.add_task(basename, tool, timing)
+                    yield basename, tool, result
+        finally:
+            for future in pending:
+                future.cancel()
+            for image in shared.values():
+                image.release()
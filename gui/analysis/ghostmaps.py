@@ -0,0 +1,203 @@
+# JPEG Ghost maps as explained in the paper: "Exposing Digital Forgeries from JPEG Ghosts" by Hany Farid
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+from .context import ImageContext
+
+NAME = "ghostmaps"
+TITLE = "JPEG Ghost Maps"
+VERSION = 2
+COST = 2.0
+DEFAULTS = {
+    "qmin": 50,
+    "qmax": 90,
+    "qstep": 5,
+    "offset_x": 0,
+    "offset_y": 0,
+    "grayscale": True,
+    "original": False,
+    "auto_align": False,
+}
+AVERAGING_BLOCK = 16
+# pixels compared at once, bounding the memory of each quality computed in parallel
+STRIP_PIXELS = 2 ** 20
+# squared differences of 8 bit values are exact in float32
+SQUARES = np.arange(256, dtype=np.float32) ** 2
+# the JPEG block lattice repeats every GRID pixels, offsets range over GRID x GRID
+GRID = 8
+# subsampled chroma is coded in macroblocks of MCU pixels
+MCU = 16
+# pixels of the central crop compared at every offset by auto-align
+ALIGN_PIXELS = 2 ** 18
+# offsets reported by auto-align
+ALIGN_BEST = 4
+
+
+def qualities(qmin, qmax, qstep):
+    return list(range(qmin, qmax + 1, qstep))
+
+
+def block_errors(image, resaved, block=AVERAGING_BLOCK):
+    """Squared difference averaged over the channels and each block fully inside the image."""
+    rows, cols = image.shape[0] // block, image.shape[1] // block
+    channels = image.shape[2] if image.ndim == 3 else 1
+    errors = np.empty((rows, cols), np.float32)
+    step = max(STRIP_PIXELS // (cols * block * block), 1)
+    for y in range(0, rows, step):
+        strip = slice(y * block, min(y + step, rows) * block)
+        diff = cv.absdiff(image[strip, : cols * block], resaved[strip, : cols * block])
+        # channels are interleaved along each row, one sum covers them and the block
+        squares = cv.LUT(diff, SQUARES).reshape(-1, block, cols, block * channels)
+        errors[y : y + step] = squares.sum(axis=(1, 3)) / (block * block * channels)
+    return errors
+
+
+def recompression_errors(image, quality, block=AVERAGING_BLOCK):
+    # compute difference between original and re-compressed versions of original
+    buffer = cv.imencode(".jpg", image, [int(cv.IMWRITE_JPEG_QUALITY), quality])[1]
+    return block_errors(image, cv.imdecode(buffer, cv.IMREAD_ANYCOLOR), block)
+
+
+def ghost_maps(image, qmin, qmax, qstep, shift_x=0, shift_y=0, block=AVERAGING_BLOCK, jobs=None):
+    """Normalized block errors of every quality, shape (rows // block, cols // block, qualities).
+
+    Qualities are compressed in parallel on up to jobs threads, all cores by default,
+    OpenCV releases the GIL.
+    """
+    from .executor import default_jobs
+
+    levels = qualities(qmin, qmax, qstep)
+
+    # misalignment of JPEG block lattice may destroy the JPEG ghost since new spatial frequencies
+    # will be introduced, by shifting we can search for the correct alignment, if there is one
+    shifted = np.roll(np.asarray(image, np.uint8), (shift_y, shift_x), axis=(0, 1))
+
+    # the average over larger areas counters complicating factors, as explained in paper
+    with ThreadPoolExecutor(max(min(jobs or default_jobs(), len(levels)), 1)) as pool:
+        errors = list(pool.map(lambda quality: recompression_errors(shifted, quality, block), levels))
+    return normalize_maps(np.stack(errors, axis=2))
+
+
+def normalize_maps(blk):
+    # normalize difference, blocks equal at every quality are undefined
+    minval = np.min(blk, axis=2, keepdims=True)
+    maxval = np.max(blk, axis=2, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (blk - minval) / (maxval - minval)
+
+
+def ghost_contrast(maps):
+    """Largest spread among the blocks of the normalized map of any quality.
+
+    A ghost darkens part of the map at one quality only, when the lattice is aligned.
+    """
+    # undefined blocks are so at every quality
+    valid = ~np.isnan(maps[:, :, 0]) if maps.shape[2] else np.zeros(maps.shape[:2], bool)
+    if not valid.any():
+        return 0.0
+    return float(maps[valid].std(axis=0).max())
+
+
+def align_offsets(image, qmin, qmax, qstep, block=AVERAGING_BLOCK, jobs=None):
+    """(contrast, shift_x, shift_y) of every lattice offset, the strongest ghosts first.
+
+    Offsets are compared on a central crop of about ALIGN_PIXELS. The crop of a shift
+    starts (-shift) % MCU pixels further, on the macroblocks of the image rolled by that
+    shift as in ghost_maps, so all of them are views of the same image. Every offset and
+    quality is compressed in parallel on up to jobs threads, all cores by default.
+    """
+    from .executor import default_jobs
+
+    image = np.asarray(image, np.uint8)
+    levels = qualities(qmin, qmax, qstep)
+    height, width = image.shape[0] - MCU + 1, image.shape[1] - MCU + 1
+    if height < block or width < block:
+        raise ValueError("Image too small to align!")
+    scale = min(np.sqrt(ALIGN_PIXELS / (height * width)), 1)
+    rows, cols = max(int(height * scale), block), max(int(width * scale), block)
+    top = (height - rows) // 2 // MCU * MCU
+    left = (width - cols) // 2 // MCU * MCU
+    offsets = [(x, y) for y in range(GRID) for x in range(GRID)]
+
+    def errors(task):
+        (shift_x, shift_y), quality = task
+        y, x = top + (-shift_y) % MCU, left + (-shift_x) % MCU
+        return recompression_errors(image[y : y + rows, x : x + cols], quality, block)
+
+    tasks = [(offset, quality) for offset in offsets for quality in levels]
+    with ThreadPoolExecutor(max(min(jobs or default_jobs(), len(tasks)), 1)) as pool:
+        results = list(pool.map(errors, tasks))
+    ranking = []
+    for i, (shift_x, shift_y) in enumerate(offsets):
+        maps = normalize_maps(np.stack(results[i * len(levels) : (i + 1) * len(levels)], axis=2))
+        ranking.append((ghost_contrast(maps), shift_x, shift_y))
+    # stable, ties keep the offsets in row order
+    return sorted(ranking, key=lambda item: -item[0])
+
+
+def render(image, maps, levels, shift_x=0, shift_y=0, grayscale=True, original=False):
+    # matplotlib is slow to import and only needed for the plot
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 8), dpi=200)
+    canvas = FigureCanvasAgg(figure)
+    nq = len(levels)
+    first = 1
+    if original:
+        sp = math.ceil(math.sqrt(nq + 1))
+        axes = figure.add_subplot(sp, sp, 1)
+        axes.imshow(cv.cvtColor(image, cv.COLOR_BGR2RGB))
+        axes.set_title("Original Image")
+        axes.axis("off")
+        first = 2
+    else:
+        sp = math.ceil(math.sqrt(nq))
+    cmap = "gray" if grayscale else None
+    for c in range(nq):
+        axes = figure.add_subplot(sp, sp, c + first)
+        axes.imshow(maps[:, :, c], cmap=cmap, vmin=0, vmax=1)
+        axes.axis("off")
+        axes.set_title(f"Quality {levels[c]}")
+    figure.suptitle(f"Ghost plots for grid offset X = {shift_x} and Y = {shift_y}")
+    canvas.draw()
+    return cv.cvtColor(np.asarray(canvas.buffer_rgba()), cv.COLOR_RGBA2BGR)
+
+
+def analyze(image, filename, params=None):
+    from .executor import task_threads
+
+    params = dict(DEFAULTS, **(params or {}))
+    jobs = task_threads()
+    image = ImageContext.of(image, filename).image
+    levels = qualities(params["qmin"], params["qmax"], params["qstep"])
+    offset_x, offset_y = params["offset_x"], params["offset_y"]
+    values = {}
+    if params["auto_align"]:
+        ranking = align_offsets(image, params["qmin"], params["qmax"], params["qstep"], jobs=jobs)
+        contrast, offset_x, offset_y = ranking[0]
+        values["ghost_contrast"] = contrast
+    maps = ghost_maps(image, params["qmin"], params["qmax"], params["qstep"], offset_x, offset_y, jobs=jobs)
+    plot = render(
+        image,
+        maps,
+        levels,
+        offset_x,
+        offset_y,
+        params["grayscale"],
+        params["original"],
+    )
+    ghost = levels[int(np.argmin(np.nanmean(maps, axis=(0, 1))))]
+    text = "JPEG Ghost Maps Results:\n"
+    text += f"Qualities: {params['qmin']}-{params['qmax']} (step {params['qstep']})\n"
+    text += f"Grid offset: X = {offset_x}, Y = {offset_y}\n"
+    if params["auto_align"]:
+        best = ", ".join(f"X = {x}, Y = {y} ({c:.3f})" for c, x, y in ranking[:ALIGN_BEST])
+        text += f"Best offsets by ghost contrast: {best}\n"
+    text += f"Strongest ghost at quality: {ghost}"
+    values.update({"ghost_quality": ghost, "offset_x": offset_x, "offset_y": offset_y})
+    return {"text": text, "image": plot, "values": values}
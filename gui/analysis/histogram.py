@@ -0,0 +1,38 @@
+import numpy as np
+
+from imaging import compute_hist
+from .context import ImageContext
+
+NAME = "histogram"
+TITLE = "Channel Histogram"
+VERSION = 1
+DEFAULTS = {}
+
+
+def unique_colors(image):
+    rows, cols, chans = image.shape
+    pixels = rows * cols
+    unique = np.unique(np.reshape(image, (pixels, chans)), axis=0).shape[0]
+    return unique, np.round(unique / pixels * 100, 2)
+
+
+def analyze(image, filename, params=None):
+    context = ImageContext.of(image, filename)
+    image = context.image
+    gray = context.gray()
+    hist = compute_hist(gray)
+    nonzero = np.nonzero(hist)[0]
+    unique, ratio = unique_colors(image)
+    text = "Histogram Analysis Results:\n"
+    text += f"Value range: {nonzero[0]} - {nonzero[-1]}\n"
+    text += f"Mean value: {np.mean(gray):.2f}\n"
+    text += f"Unique colors: {unique}\n"
+    text += f"Unique ratio: {ratio}%"
+    return {
+        "text": text,
+        "values": {
+            "histogram": hist.tolist(),
+            "unique_colors": int(unique),
+            "unique_ratio": float(ratio),
+        },
+    }
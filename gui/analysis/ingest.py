@@ -0,0 +1,96 @@
+"""
+Lazy image ingestion for batch runs.
+
+Files are listed from directories, glob patterns or explicit paths and decoded
+one at a time by a background thread that stays at most `prefetch` images
+ahead of the consumer, so memory does not grow with the size of the case.
+"""
+
+import glob
+import os
+import threading
+import time
+from queue import Full, Queue
+
+from imaging import IMAGE_EXTENSIONS, decode_image
+
+DEFAULT_PREFETCH = 2
+_DONE = object()
+
+
+def is_image(filename):
+    return os.path.splitext(filename)[1][1:].lower() in IMAGE_EXTENSIONS
+
+
+def list_images(sources, recursive=False):
+    """Yield image filenames found in files, directories or glob patterns."""
+    if isinstance(sources, str):
+        sources = [sources]
+    for source in sources:
+        if os.path.isdir(source):
+            if recursive:
+                names = [
+                    os.path.join(root, name)
+                    for root, _, files in os.walk(source)
+                    for name in files
+                ]
+            else:
+                names = [os.path.join(source, name) for name in os.listdir(source)]
+            names = [n for n in names if os.path.isfile(n) and is_image(n)]
+        elif os.path.isfile(source):
+            names = [source]
+        else:
+            names = [n for n in glob.glob(source, recursive=recursive) if is_image(n)]
+        yield from sorted(names)
+
+
+def stream_images(filenames, prefetch=DEFAULT_PREFETCH, on_error=None, on_decode=None):
+    """Decode images lazily, yielding (filename, basename, image) tuples.
+
+    Decoding runs in a background thread that blocks once `prefetch` images are
+    waiting, so a slow consumer throttles reading instead of filling memory.
+    Files that cannot be decoded are reported to on_error(filename, message)
+    and skipped, decoding times of the others to on_decode(filename, seconds).
+    """
+    queue = Queue(maxsize=max(prefetch, 1))
+    stop = threading.Event()
+
+    def reader():
+        try:
+            for filename in filenames:
+                if stop.is_set():
+                    break
+                start = time.perf_counter()
+                try:
+                    image, _ = decode_image(filename)
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(filename, str(e))
+                    continue
+                if on_decode is not None:
+                    on_decode(filename, time.perf_counter() - start)
+                item = (filename, os.path.basename(filename), image)
+                while not stop.is_set():
+                    try:
+                        queue.put(item, timeout=0.1)
+                        break
+                    except Full:
+                        continue
+        finally:
+            queue.put(_DONE)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = queue.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        # drain so a reader blocked on a full queue can see the stop flag
+        while thread.is_alive():
+            while not queue.empty():
+                queue.get_nowait()
+            thread.join(0.1)
@@ -0,0 +1,198 @@
+"""
+Append-only journal of finished batch tasks.
+
+Each finished image x tool result is appended as one JSON line as soon as it
+completes, with its map saved as PNG in a sidecar folder, so a crashed or
+interrupted run can be resumed by skipping the tasks already in the journal.
+The same records make up the output of the headless analyze command.
+
+Batches started from the GUI live in their own folder next to the result
+cache, holding a manifest of the images and tools plus the journal itself.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+import cv2 as cv
+
+from . import get_analyzer
+from .cache import default_directory
+
+BATCHES_DIR = "batches"
+MANIFEST = "batch.json"
+JOURNAL = "journal.jsonl"
+MAPS = "maps"
+KEEP_BATCHES = 5
+SYNC_INTERVAL = 1.0
+
+
+def map_name(filename, tool):
+    # the path digest keeps names unique across folders and stable across resumes
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    digest = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:8]
+    analyzer = get_analyzer(tool)
+    tool = analyzer.NAME if analyzer is not None else re.sub(r"[^\w.-]+", "_", tool)
+    return f"{stem}_{digest}.{tool}.png"
+
+
+def read_records(path):
+    """Yield the records of a journal, skipping a last line cut short by a crash."""
+    try:
+        file = open(path)
+    except FileNotFoundError:
+        return
+    with file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def truncate_partial(path):
+    """Drop an unterminated last line so that appended records stay parsable."""
+    try:
+        with open(path, "rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        pass
+
+
+class Journal:
+    """JSON Lines record of task results, written to path or "-" for stdout.
+
+    With resume, existing records are kept and the successful ones are listed
+    in `completed` by (filename, tool); failed tasks are run again.
+    """
+
+    def __init__(self, path, maps=None, resume=False):
+        self.path = path
+        self.maps = maps
+        self.errors = 0
+        self.completed = {}
+        # decoding errors are reported from the reader thread
+        self.lock = threading.Lock()
+        if path == "-":
+            self.stream = sys.stdout
+        else:
+            if resume:
+                for record in read_records(path):
+                    key = (record["file"], record["tool"])
+                    if "error" in record:
+                        self.completed.pop(key, None)
+                    else:
+                        self.completed[key] = record
+                truncate_partial(path)
+            self.stream = open(path, "a" if resume else "w")
+        if maps is not None:
+            os.makedirs(maps, exist_ok=True)
+        self.synced = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def is_done(self, filename, tool):
+        return (filename, tool) in self.completed
+
+    def map_path(self, record):
+        """Path of the map saved with a record, None when it has none."""
+        if "map" not in record or self.maps is None:
+            return None
+        return os.path.join(self.maps, record["map"])
+
+    def load(self, record, maps=True):
+        """Turn a journal record back into a result dict, with its map unless maps is False."""
+        data = {k: v for k, v in record.items() if k not in ("file", "tool", "map")}
+        path = self.map_path(record)
+        if maps and path is not None:
+            image = cv.imread(path, cv.IMREAD_UNCHANGED)
+            if image is not None:
+                data["image"] = image
+        return data
+
+    def write(self, filename, tool, data=None, error=None):
+        """Append the result of a task, returning its record."""
+        with self.lock:
+            return self._write(filename, tool, data, error)
+
+    def _write(self, filename, tool, data, error):
+        record = {"file": filename, "tool": tool}
+        if error is None:
+            error = data["text"][7:] if data["text"].startswith("Error: ") else None
+        if error is not None:
+            self.errors += 1
+            record["error"] = error
+        else:
+            record.update((k, v) for k, v in data.items() if k != "image")
+            record.setdefault("values", {})
+            if self.maps is not None and data.get("image") is not None:
+                name = map_name(filename, tool)
+                cv.imwrite(os.path.join(self.maps, name), data["image"])
+                record["map"] = name
+        self.stream.write(json.dumps(record, default=str) + "\n")
+        self.stream.flush()
+        # a reboot loses at most the last second of results
+        if time.monotonic() - self.synced > SYNC_INTERVAL:
+            self.sync()
+        return record
+
+    def sync(self):
+        self.synced = time.monotonic()
+        try:
+            os.fsync(self.stream.fileno())
+        except (OSError, ValueError):
+            # pipes and terminals cannot be synced
+            pass
+
+    def close(self):
+        with self.lock:
+            self.stream.flush()
+            self.sync()
+            if self.stream is not sys.stdout:
+                self.stream.close()
+
+
+def batches_directory():
+    return os.path.join(default_directory(), BATCHES_DIR)
+
+
+def create_batch(filenames, tools):
+    """Start a journaled GUI batch, returning its folder."""
+    root = batches_directory()
+    directory = os.path.join(root, time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MANIFEST), "w") as file:
+        json.dump({"filenames": list(filenames), "tools": list(tools), "created": time.time()}, file)
+    # only the most recent batches are kept around for resuming
+    for name in sorted(os.listdir(root))[:-KEEP_BATCHES]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return directory
+
+
+def last_batch():
+    """Return (folder, manifest) of the most recent GUI batch, or None."""
+    root = batches_directory()
+    if not os.path.isdir(root):
+        return None
+    for name in sorted(os.listdir(root), reverse=True):
+        try:
+            with open(os.path.join(root, name, MANIFEST)) as file:
+                return os.path.join(root, name), json.load(file)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def batch_journal(directory, resume=False):
+    return Journal(os.path.join(directory, JOURNAL), os.path.join(directory, MAPS), resume)
@@ -0,0 +1,319 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+from imaging import pad_image
+from .context import ImageContext
+from .models import cached_model, model_path
+
+NAME = "median"
+TITLE = "Median Filtering"
+VERSION = 1
+COST = 5.0
+BLOCK = 64
+DEFAULTS = {"variance": 5, "threshold": 0.4, "probability": False, "speckle": True}
+# model feature count --> (levels, windows)
+MODEL_SHAPES = {8: (1, 1), 24: (3, 1), 96: (3, 4), 128: (4, 4)}
+# blocks predicted per call, bounding the memory of each DMatrix
+PREDICT_ROWS = 2 ** 16
+# pixels of the blocks whose features are computed at once, small enough to stay in cache
+STRIP_PIXELS = 2 ** 15
+# gaussian window of ssim and its radius
+SSIM_WINDOW = (11, 11)
+SSIM_SIGMA = 1.5
+SSIM_BORDER = 5
+
+
+def ssim(a, b, maximum=255):
+    return cv.mean(ssim_map(a, b, maximum))[0]
+
+
+def moments(a):
+    """Local mean, its square and local variance of an image, in the window of ssim."""
+    mu = cv.GaussianBlur(a, SSIM_WINDOW, SSIM_SIGMA)
+    mu2 = mu ** 2
+    return mu, mu2, cv.GaussianBlur(a ** 2, SSIM_WINDOW, SSIM_SIGMA) - mu2
+
+
+def ssim_map(a, b, maximum=255, moments_a=None, moments_b=None):
+    """SSIM of each pixel, the moments of a and b are computed unless given."""
+    c1 = (0.01 * maximum) ** 2
+    c2 = (0.03 * maximum) ** 2
+    mu_a, mu_a2, s_a2 = moments_a or moments(a)
+    mu_b, mu_b2, s_b2 = moments_b or moments(b)
+    # in place where possible, temporaries dominate the time on large images
+    mu_ab = mu_a * mu_b
+    s_ab = cv.GaussianBlur(a * b, SSIM_WINDOW, SSIM_SIGMA)
+    s_ab -= mu_ab
+    t1 = np.multiply(mu_ab, 2, out=mu_ab)
+    t1 += c1
+    t2 = np.multiply(s_ab, 2, out=s_ab)
+    t2 += c2
+    t3 = np.multiply(t1, t2, out=t1)
+    t1 = np.add(mu_a2, mu_b2)
+    t1 += c1
+    t2 = np.add(s_a2, s_b2, out=t2)
+    t2 += c2
+    t1 *= t2
+    return cv.divide(t3, t1, dst=t2)
+
+
+def get_metrics(pristine, distorted):
+    # Matrix precomputation
+    x0 = pristine.astype(np.float64)
+    y0 = distorted.astype(np.float64)
+    x2 = np.sum(np.square(x0))
+    y2 = np.sum(np.square(y0))
+    xs = np.sum(x0)
+    e = x0 - y0
+    maximum = 255
+    # Feature vector initialization
+    m = np.zeros(8)
+    # Mean Square Error (MSE)
+    m[0] = np.mean(np.square(e))
+    # Peak to Signal Noise Ratio (PSNR)
+    m[1] = 20 * np.log10(maximum / np.sqrt(m[0])) if m[0] > 0 else -1
+    # Normalized Cross-Correlation (NCC)
+    m[2] = np.sum(x0 * y0) / x2 if x2 > 0 else -1
+    # Average Difference (AD)
+    m[3] = np.mean(e)
+    # Structural Content (SC)
+    m[4] = x2 / y2 if y2 > 0 else -1
+    # Maximum Difference (MD)
+    m[5] = np.max(e)
+    # Normalized Absolute Error (NAE)
+    m[6] = np.sum(np.abs(e)) / xs if xs > 0 else -1
+    # Structural Similarity (SSIM)
+    m[7] = ssim(x0, y0, maximum)
+    return m
+
+
+def get_features(image, windows, levels):
+    metrics = 8
+    f = np.zeros(windows * levels * metrics)
+    index = 0
+    for w in range(windows):
+        k = 2 * (w + 1) + 1
+        previous = image
+        for _ in range(levels):
+            filtered = cv.medianBlur(previous, k)
+            f[index : index + metrics] = get_metrics(previous, filtered)
+            index += metrics
+            previous = filtered
+    return f
+
+
+def mosaic(blocks, border, mode):
+    """Blocks (rows, cols, h, w) side by side in one image, each padded with its own border."""
+    padded = np.pad(blocks, ((0, 0), (0, 0), (border, border), (border, border)), mode=mode)
+    rows, cols, height, width = padded.shape
+    return padded.transpose(0, 2, 1, 3).reshape(rows * height, cols * width)
+
+
+def unmosaic(image, shape, border):
+    """Blocks of the (rows, cols, h, w) shape cut back from their mosaic."""
+    rows, cols, height, width = shape
+    tiles = image.reshape(rows, height + 2 * border, cols, width + 2 * border).transpose(0, 2, 1, 3)
+    return tiles[:, :, border : border + height, border : border + width]
+
+
+def block_stats(blocks):
+    """Quantities of (rows, cols, h, w) blocks shared by the metrics of each pair they are in."""
+    # the images are integer valued, so block sums are exact in any order
+    x0 = blocks.astype(np.float64)
+    # blurs reflect at the borders of each block, as on a block alone
+    a = mosaic(x0, SSIM_BORDER, "reflect")
+    return {
+        "x0": x0,
+        "x2": np.sum(np.square(x0), axis=(2, 3)),
+        "xs": np.sum(x0, axis=(2, 3)),
+        "mosaic": a,
+        "moments": moments(a),
+    }
+
+
+def get_block_metrics(pristine, distorted):
+    """get_metrics of all blocks at once from their block_stats, shape (rows, cols, 8)."""
+    axes = (2, 3)
+    x0, y0 = pristine["x0"], distorted["x0"]
+    x2, y2 = pristine["x2"], distorted["x2"]
+    xs = pristine["xs"]
+    e = x0 - y0
+    maximum = 255
+    m = np.zeros(x2.shape + (8,))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m[..., 0] = np.mean(np.square(e), axis=axes)
+        m[..., 1] = np.where(m[..., 0] > 0, 20 * np.log10(maximum / np.sqrt(m[..., 0])), -1)
+        m[..., 2] = np.where(x2 > 0, np.sum(x0 * y0, axis=axes) / x2, -1)
+        m[..., 3] = np.mean(e, axis=axes)
+        m[..., 4] = np.where(y2 > 0, x2 / y2, -1)
+        m[..., 5] = np.max(e, axis=axes)
+        m[..., 6] = np.where(xs > 0, np.sum(np.abs(e), axis=axes) / xs, -1)
+    s_map = ssim_map(
+        pristine["mosaic"], distorted["mosaic"], maximum, pristine["moments"], distorted["moments"]
+    )
+    s_map = unmosaic(s_map, x0.shape, SSIM_BORDER)
+    for i, j in np.ndindex(x2.shape):
+        m[i, j, 7] = cv.mean(s_map[i, j])[0]
+    return m
+
+
+def get_block_features(blocks, windows, levels):
+    """get_features of all blocks of a (rows, cols, h, w) array at once.
+
+    Each filtered image is the pristine one of the next level, its stats are computed once.
+    """
+    f = []
+    stats = block_stats(blocks)
+    for w in range(windows):
+        k = 2 * (w + 1) + 1
+        previous, pristine = blocks, stats
+        for _ in range(levels):
+            # the median filter replicates the borders of each block
+            image = cv.medianBlur(mosaic(previous, k // 2, "edge"), k)
+            filtered = unmosaic(image, previous.shape, k // 2)
+            distorted = block_stats(filtered)
+            f.append(get_block_metrics(pristine, distorted))
+            previous, pristine = filtered, distorted
+    return np.concatenate(f, axis=2)
+
+
+def load_booster(modelfile=None, nthread=None):
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(modelfile or model_path(f"median_b{BLOCK}.json"))
+    if nthread is not None:
+        booster.set_param({"nthread": nthread})
+    return booster
+
+
+def shared_booster(nthread=None):
+    """Registry booster predicting on nthread threads, all cores by default.
+
+    Threads are a setting of the booster, so each thread count has its own and
+    the boosters shared by concurrent calls are never changed.
+    """
+    name = "median" if nthread is None else f"median_nthread{nthread}"
+    return cached_model(name, lambda: load_booster(nthread=nthread))
+
+
+def warmup():
+    from .executor import task_threads
+
+    shared_booster(task_threads())
+
+
+def model_shape(booster):
+    columns = booster.num_features()
+    if columns not in MODEL_SHAPES:
+        raise ValueError("Unknown model format!")
+    return MODEL_SHAPES[columns]
+
+
+def block_features(padded, block, levels, windows, progress=None, jobs=None):
+    """Feature rows and variances of all blocks, in row order.
+
+    Filters run once over runs of about STRIP_PIXELS, with the blocks laid side by side
+    and padded with their own borders, so that features equal those of get_features.
+    Runs are computed in parallel on up to jobs threads, all cores by default.
+    """
+    from .executor import default_jobs
+
+    rows, cols = padded.shape
+    blocks = padded.reshape(rows // block, block, cols // block, block).swapaxes(1, 2)
+    blocks = blocks.reshape(-1, block, block)
+    features = np.zeros((len(blocks), levels * windows * 8))
+    var = np.var(blocks, axis=(1, 2))
+    step = max(STRIP_PIXELS // block ** 2, 1)
+
+    def compute(k):
+        strip = blocks[np.newaxis, k : k + step]
+        features[k : k + step] = get_block_features(strip, levels, windows)[0]
+        return k + strip.shape[1] - 1
+
+    with ThreadPoolExecutor(jobs or default_jobs()) as pool:
+        for last in pool.map(compute, range(0, len(blocks), step)):
+            if progress is not None and not progress(last):
+                pool.shutdown(cancel_futures=True)
+                return None, None
+    return features, var
+
+
+def predict(booster, features, nthread=None):
+    """Probabilities of all feature rows, predicted in chunks of PREDICT_ROWS.
+
+    The booster predicts on the threads it was loaded with, nthread builds the chunks.
+    """
+    import xgboost as xgb
+
+    chunks = [
+        booster.predict(xgb.DMatrix(features[i : i + PREDICT_ROWS], nthread=nthread))
+        for i in range(0, len(features), PREDICT_ROWS)
+    ]
+    return np.concatenate(chunks) if chunks else np.zeros(0)
+
+
+def detect(gray, booster, block=BLOCK, progress=None, nthread=None):
+    levels, windows = model_shape(booster)
+    padded = pad_image(gray, block)
+    rows, cols = padded.shape
+    prob = np.zeros(((rows // block) + 1, (cols // block) + 1))
+    var = np.zeros_like(prob)
+    features, variances = block_features(padded, block, levels, windows, progress, nthread)
+    if features is None:
+        return None, None
+    shape = (rows // block, cols // block)
+    var[: shape[0], : shape[1]] = variances.reshape(shape)
+    prob[: shape[0], : shape[1]] = predict(booster, features, nthread).reshape(shape)
+    return prob, var
+
+
+def render(prob, var, shape, variance, threshold, probability=False, speckle=True, block=BLOCK):
+    mask = var < variance
+    if speckle:
+        prob = cv.medianBlur(prob.astype(np.float32), 3)
+    else:
+        prob = prob.astype(np.float32)
+    if probability:
+        output = np.repeat(prob[:, :, np.newaxis], 3, axis=2)
+        output[mask] = 0
+    else:
+        output = np.zeros((prob.shape[0], prob.shape[1], 3))
+        blue, green, red = cv.split(output)
+        blue[mask] = 1
+        green[prob < threshold] = 1
+        green[mask] = 0
+        red[prob >= threshold] = 1
+        red[mask] = 0
+        output = cv.merge((blue, green, red))
+    output = cv.convertScaleAbs(output, None, 255)
+    output = cv.resize(output, None, None, block, block, cv.INTER_LINEAR)
+    average = cv.mean(prob, 1 - mask.astype(np.uint8))[0] * 100
+    return np.copy(output[: shape[0], : shape[1]]), average
+
+
+def analyze(image, filename, params=None):
+    from .executor import task_threads
+
+    params = dict(DEFAULTS, **(params or {}))
+    context = ImageContext.of(image, filename)
+    image = context.image
+    gray = context.gray()
+    nthread = task_threads()
+    prob, var = detect(gray, shared_booster(nthread), nthread=nthread)
+    output, average = render(
+        prob,
+        var,
+        image.shape,
+        params["variance"],
+        params["threshold"],
+        params["probability"],
+        params["speckle"],
+    )
+    text = "Median Filtering Results:\n"
+    text += f"Min variance: {params['variance']}\n"
+    text += f"Threshold: {params['threshold']}\n"
+    text += f"Average probability: {average:.2f}%"
+    return {"text": text, "image": output, "values": {"average_probability": average}}
@@ -0,0 +1,94 @@
+import cv2 as cv
+import numpy as np
+
+from imaging import norm_mat
+from .context import ImageContext
+
+NAME = "minmax"
+TITLE = "Min/Max Deviation"
+VERSION = 1
+CHANNELS = ["Luminance", "Red", "Green", "Blue", "RGB Norm"]
+COLORS = ["Red", "Green", "Blue", "White", "Black"]
+DEFAULTS = {"channel": 0, "minimum": 1, "maximum": 0, "filter": 0}
+
+
+def select_channel(image, channel):
+    context = ImageContext.of(image)
+    if channel == 0:
+        return context.gray()
+    if channel == 4:
+        b, g, r = cv.split(context.as_float(np.float64))
+        return cv.sqrt(cv.pow(b, 2) + cv.pow(g, 2) + cv.pow(r, 2))
+    return np.ascontiguousarray(context.image[:, :, 3 - channel])
+
+
+def minmax_deviation(img):
+    # compare each pixel against the extrema of its 8 neighbours (center excluded)
+    kernel = np.ones((3, 3), np.uint8)
+    kernel[1, 1] = 0
+    minimum = cv.erode(img, kernel)
+    maximum = cv.dilate(img, kernel)
+    low = img < minimum
+    high = img > maximum
+    for mask in [low, high]:
+        mask[[0, -1], :] = False
+        mask[:, [0, -1]] = False
+    return low, high
+
+
+def blk_filter(img, radius):
+    result = np.zeros_like(img, np.float32)
+    rows, cols = result.shape
+    block = 2 * radius + 1
+    for i in range(radius, rows, block):
+        for j in range(radius, cols, block):
+            result[i - radius : i + radius + 1, j - radius : j + radius + 1] = np.std(
+                img[i - radius : i + radius + 1, j - radius : j + radius + 1]
+            )
+    return cv.normalize(result, None, 0, 127, cv.NORM_MINMAX, cv.CV_8UC1)
+
+
+def render(image, low, high, minimum, maximum, radius):
+    minmax = np.zeros_like(image)
+    if radius > 0:
+        radius += 3
+        if minimum < 4:
+            low = blk_filter(low, radius)
+            if minimum <= 2:
+                minmax[:, :, 2 - minimum] = low
+            else:
+                minmax = np.repeat(low[:, :, np.newaxis], 3, axis=2)
+        if maximum < 4:
+            high = blk_filter(high, radius)
+            if maximum <= 2:
+                minmax[:, :, 2 - maximum] += high
+            else:
+                minmax += np.repeat(high[:, :, np.newaxis], 3, axis=2)
+        return norm_mat(minmax)
+    colors = [[0, 0, 255], [0, 255, 0], [255, 0, 0], [255, 255, 255]]
+    if minimum < 4:
+        minmax[low] = colors[minimum]
+    if maximum < 4:
+        minmax[high] = colors[maximum]
+    return minmax
+
+
+def analyze(image, filename, params=None):
+    params = dict(DEFAULTS, **(params or {}))
+    context = ImageContext.of(image, filename)
+    image = context.image
+    low, high = minmax_deviation(select_channel(context, params["channel"]))
+    output = render(
+        image, low, high, params["minimum"], params["maximum"], params["filter"]
+    )
+    low_ratio = float(np.count_nonzero(low)) / low.size * 100
+    high_ratio = float(np.count_nonzero(high)) / high.size * 100
+    text = "Min/Max Deviation Results:\n"
+    text += f"Channel: {CHANNELS[params['channel']]}\n"
+    text += f"Local minima: {low_ratio:.2f}%\n"
+    text += f"Local maxima: {high_ratio:.2f}%"
+    return {
+        "text": text,
+        "image": output,
+        "values": {"low_ratio": low_ratio, "high_ratio": high_ratio},
+    }
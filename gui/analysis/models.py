@@ -0,0 +1,146 @@
+"""
+Process-wide registry of the models used by the tools.
+
+Each model is loaded once per process, on first use, and then kept warm for
+every later call of any tool or widget. The registry records how long each
+model took to load, how much resident memory loading it added and when it was
+last used, so that long sessions can evict the models not used recently:
+explicitly, after an idle time, or by a memory budget that evicts the least
+recently used ones first.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .telemetry import current_rss
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+MODEL_MEMORY_ENV = "LOOK_DGC_MODEL_MEMORY"
+
+_default = None
+
+
+def model_path(name):
+    return os.path.join(MODELS_DIR, name)
+
+
+class ModelRegistry:
+    """Thread-safe store of loaded models, ordered from least to most recently used."""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # one lock per model being loaded, so that a model is never loaded twice
+        # while other models load concurrently
+        self.loading = {}
+
+    def _lookup(self, name):
+        """Model of a registered name, marked as just used, None when not loaded."""
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            entry["used"] = time.time()
+            entry["hits"] += 1
+            self.entries.move_to_end(name)
+            return entry
+
+    def get(self, name, loader):
+        entry = self._lookup(name)
+        if entry is not None:
+            return entry["model"]
+        with self.lock:
+            loading = self.loading.setdefault(name, threading.Lock())
+        with loading:
+            entry = self._lookup(name)
+            if entry is not None:
+                return entry["model"]
+            before = current_rss()
+            started = time.perf_counter()
+            model = loader()
+            seconds = time.perf_counter() - started
+            after = current_rss()
+            with self.lock:
+                self.entries[name] = {
+                    "model": model,
+                    "memory": max(after - before, 0) if before is not None else None,
+                    "load_time": seconds,
+                    "used": time.time(),
+                    "hits": 0,
+                }
+                self.loading.pop(name, None)
+                self._shrink(keep=name)
+        return model
+
+    def _shrink(self, keep=None):
+        """Evict the least recently used models while over max_bytes."""
+        if self.max_bytes is None:
+            return
+        for name in list(self.entries):
+            if self._memory() <= self.max_bytes:
+                break
+            if name != keep:
+                del self.entries[name]
+
+    def _memory(self):
+        return sum(entry["memory"] or 0 for entry in self.entries.values())
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.entries
+
+    def memory(self):
+        """Resident memory added by loading the models held, in bytes."""
+        with self.lock:
+            return self._memory()
+
+    def usage(self):
+        """Name, memory, load time, hits and idle seconds of every model, least recently used first."""
+        now = time.time()
+        with self.lock:
+            return [
+                {
+                    "name": name,
+                    "memory": entry["memory"],
+                    "load_time": entry["load_time"],
+                    "hits": entry["hits"],
+                    "idle": now - entry["used"],
+                }
+                for name, entry in self.entries.items()
+            ]
+
+    def evict(self, name=None, idle=None):
+        """Drop one model, those unused for more than idle seconds, or all of them.
+
+        Models are freed once the callers still using them are done.
+        Returns the names evicted.
+        """
+        now = time.time()
+        with self.lock:
+            names = [
+                key
+                for key, entry in self.entries.items()
+                if (name is None or key == name) and (idle is None or now - entry["used"] > idle)
+            ]
+            for key in names:
+                del self.entries[key]
+        return names
+
+    def clear(self):
+        return self.evict()
+
+
+def default_registry():
+    global _default
+    if _default is None:
+        size = os.environ.get(MODEL_MEMORY_ENV)
+        _default = ModelRegistry(max_bytes=int(size) * 1024 ** 2 if size else None)
+    return _default
+
+
+def cached_model(name, loader):
+    """The model registered as name, loaded with loader() on first use."""
+    return default_registry().get(name, loader)
@@ -0,0 +1,36 @@
+import cv2 as cv
+import numpy as np
+
+from jpeg import compress_jpg
+from .context import ImageContext
+
+NAME = "multiple"
+TITLE = "Multiple Compression"
+VERSION = 1
+COST = 0.7
+DEFAULTS = {}
+MAX_Q = 101
+
+
+def compression_loss(gray, progress=None):
+    losses = np.zeros(MAX_Q)
+    for q in range(MAX_Q):
+        losses[q] = cv.mean(cv.absdiff(compress_jpg(gray, q, color=False), gray))[0]
+        if progress is not None:
+            progress(q)
+    return losses
+
+
+def analyze(image, filename, params=None):
+    losses = compression_loss(ImageContext.of(image, filename).gray())
+    # local minima of the loss curve hint at previous compressions
+    minima = [
+        q for q in range(2, MAX_Q - 1) if losses[q] < losses[q - 1] and losses[q] < losses[q + 1]
+    ]
+    text = "Multiple Compression Results:\n"
+    text += f"Loss range: {np.min(losses):.2f} - {np.max(losses):.2f}\n"
+    text += f"Local minima at qualities: {', '.join(map(str, minima)) or 'none'}"
+    return {
+        "text": text,
+        "values": {"losses": [float(x) for x in losses], "minima": minima},
+    }
@@ -0,0 +1,83 @@
+import cv2 as cv
+import numpy as np
+
+from imaging import create_lut, equalize_img
+from .context import ImageContext
+
+NAME = "noise"
+TITLE = "Signal Separation"
+VERSION = 1
+MODES = ["Median", "Gaussian", "BoxBlur", "Bilateral", "NonLocal"]
+DEFAULTS = {
+    "mode": 0,
+    "radius": 1,
+    "sigma": 3,
+    "levels": 32,
+    "grayscale": False,
+    "denoised": False,
+}
+
+
+def denoise(original, mode, radius, sigma, grayscale=False):
+    kernel = radius * 2 + 1
+    if mode == 0:
+        return cv.medianBlur(original, kernel)
+    if mode == 1:
+        return cv.GaussianBlur(original, (kernel, kernel), 0)
+    if mode == 2:
+        return cv.blur(original, (kernel, kernel))
+    if mode == 3:
+        return cv.bilateralFilter(original, kernel, sigma, sigma)
+    if mode == 4:
+        if grayscale:
+            return cv.fastNlMeansDenoising(original, None, kernel)
+        return cv.fastNlMeansDenoisingColored(original, None, kernel, kernel)
+    return None
+
+
+def separate(image, mode, radius, sigma, levels, grayscale=False, denoised=False):
+    context = ImageContext.of(image)
+    if grayscale:
+        original = context.gray()
+    else:
+        original = context.image
+    filtered = denoise(original, mode, radius, sigma, grayscale)
+    if denoised:
+        result = filtered
+    else:
+        noise = cv.absdiff(original, filtered)
+        if levels == 0:
+            if grayscale:
+                result = cv.equalizeHist(noise)
+            else:
+                result = equalize_img(noise)
+        else:
+            result = cv.LUT(noise, create_lut(0, 255 - levels))
+    if grayscale:
+        result = cv.cvtColor(result, cv.COLOR_GRAY2BGR)
+    return result
+
+
+def analyze(image, filename, params=None):
+    params = dict(DEFAULTS, **(params or {}))
+    result = separate(
+        ImageContext.of(image, filename),
+        params["mode"],
+        params["radius"],
+        params["sigma"],
+        params["levels"],
+        params["grayscale"],
+        params["denoised"],
+    )
+    text = "Noise Analysis Results:\n"
+    text += f"Mode: {MODES[params['mode']]}\n"
+    text += f"Radius: {params['radius']} px\n"
+    text += f"Sigma: {params['sigma']}\n"
+    text += f"Levels: {params['levels']}\n"
+    text += f"Grayscale: {'Yes' if params['grayscale'] else 'No'}\n"
+    text += f"Denoised: {'Yes' if params['denoised'] else 'No'}"
+    return {
+        "text": text,
+        "image": result,
+        "values": {"mean_noise": float(np.mean(result))},
+    }
@@ -0,0 +1,13 @@
+from .context import ImageContext
+
+NAME = "original"
+TITLE = "Original Image"
+VERSION = 1
+DEFAULTS = {}
+
+
+def analyze(image, filename, params=None):
+    text = "Original Image:\n"
+    text += "Displays the original image without any processing.\n"
+    text += "This serves as the baseline for comparison with other analysis tools."
+    return {"text": text, "image": ImageContext.of(image).image}
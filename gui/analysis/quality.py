@@ -0,0 +1,169 @@
+import os
+import subprocess
+import tempfile
+from shutil import copyfile
+
+import cv2 as cv
+import numpy as np
+
+from imaging import exiftool_exe
+from jpeg import TABLE_SIZE, ZIG_ZAG, DCT_SIZE, get_tables, loss_curve
+from .context import ImageContext
+from .models import cached_model, model_path
+
+NAME = "quality"
+TITLE = "Quality Estimation"
+VERSION = 1
+COST = 1.0
+DEFAULTS = {}
+
+MRK = b"\xFF"
+SOI = b"\xD8"
+DQT = b"\xDB"
+MSK = b"\x0F"
+PAD = b"\x00"
+MAX_TABLES = 2
+LEN_OFFSET = 2
+LUMA_IDX = 0
+CHROMA_IDX = 1
+
+
+def curve_minimum(curve, tail=5):
+    qm = np.argmin(curve[:-tail]) + 1
+    if qm == 100 - tail:
+        qm = 100
+    return int(qm)
+
+
+def find_next(file, markers):
+    while True:
+        for m in markers:
+            b = file.read(1)
+            if not b:
+                return False
+            if b != m:
+                break
+        else:
+            return True
+
+
+def read_tables(filename):
+    luma = np.zeros((DCT_SIZE, DCT_SIZE), dtype=int)
+    chroma = np.zeros((DCT_SIZE, DCT_SIZE), dtype=int)
+    handle, temp_name = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        copyfile(filename, temp_name)
+        exiftool_path = exiftool_exe()
+        if exiftool_path and os.path.exists(exiftool_path):
+            subprocess.run(
+                [exiftool_path, "-all=", "-overwrite_original", temp_name],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        found = False
+        with open(temp_name, "rb") as file:
+            first = file.read(1)
+            if first not in [MRK, SOI]:
+                raise ValueError("File is not a JPEG image!")
+            while True:
+                if not find_next(file, [MRK, DQT, PAD]):
+                    break
+                length = file.read(1)[0] - LEN_OFFSET
+                if length <= 0 or length % (TABLE_SIZE + 1) != 0:
+                    continue
+                while length > 0:
+                    mode = file.read(1)
+                    if not mode:
+                        break
+                    index = mode[0] & MSK[0]
+                    if index >= MAX_TABLES:
+                        break
+                    length -= 1
+                    for k in range(TABLE_SIZE):
+                        b = file.read(1)[0]
+                        if not b:
+                            break
+                        length -= 1
+                        i, j = ZIG_ZAG[k]
+                        if index == LUMA_IDX:
+                            luma[i, j] = b
+                        elif index == CHROMA_IDX:
+                            chroma[i, j] = b
+                    else:
+                        found = True
+    finally:
+        os.remove(temp_name)
+    if not found:
+        raise ValueError("Unable to find JPEG tables!")
+    return luma, chroma
+
+
+def table_quality(luma, chroma):
+    levels = [(1 - (np.mean(t.ravel()[1:]) - 1) / 254) * 100 for t in [luma, chroma]]
+    distance = np.zeros(101)
+    for qm in range(101):
+        lu, ch = cv.split(get_tables(qm))
+        lu_diff = np.mean(cv.absdiff(luma, lu))
+        ch_diff = np.mean(cv.absdiff(chroma, ch))
+        distance[qm] = (lu_diff + 2 * ch_diff) / 3
+    closest = np.argmin(distance)
+    deviation = distance[closest]
+    if deviation == 0:
+        quality = closest
+    else:
+        quality = int(np.round(closest - deviation))
+    if quality == 0:
+        quality = 1
+    return int(quality), float(deviation), levels
+
+
+def load_model(modelfile=None):
+    from joblib import load
+
+    return load(modelfile or model_path("jpeg_qf.mdl"))
+
+
+def warmup():
+    cached_model("jpeg_qf", load_model)
+
+
+def lossless_quality(curve, modelfile=None):
+    if modelfile is None:
+        model = cached_model("jpeg_qf", load_model)
+    else:
+        model = load_model(modelfile)
+    limit = model.best_ntree_limit if hasattr(model, "best_ntree_limit") else None
+    return model.predict(np.reshape(curve, (1, len(curve))), ntree_limit=limit)[0]
+
+
+def analyze(image, filename, params=None):
+    # loss_curve takes the grayscale as is
+    curve = loss_curve(ImageContext.of(image, filename).gray())
+    values = {"curve_minimum": curve_minimum(curve)}
+    text = "Quality Estimation Results:\n"
+    try:
+        luma, chroma = read_tables(filename)
+    except ValueError:
+        qp = float(lossless_quality(curve))
+        values["quality"] = qp
+        text += f"[LOSSLESS FORMAT] Estimated last saved quality = {qp:.1f}%"
+        if qp > 99:
+            text += " (uncompressed)"
+    else:
+        quality, deviation, levels = table_quality(luma, chroma)
+        values.update(
+            {
+                "quality": quality,
+                "deviation": deviation,
+                "luma_level": float(levels[0]),
+                "chroma_level": float(levels[1]),
+            }
+        )
+        text += f"[JPEG FORMAT] Last saved quality: {quality}% "
+        if deviation == 0:
+            text += "(standard tables)"
+        else:
+            text += f"(deviation from standard tables --> {deviation:.4f})"
+    text += f"\nMinimum compression loss at quality: {values['curve_minimum']}"
+    return {"text": text, "values": values}
@@ -0,0 +1,323 @@
+# Probability maps and fourier maps for detecting traces of resampling as explained in the paper:
+# "Exposing Digital Forgeries by Detecting Traces of Re-sampling" by Hany Farid & Alin C. Popescu
+# The fixed predictor follows "Fast and Reliable Resampling Detection by Spectral Analysis of
+# Fixed Linear Predictor Residue" by Matthias Kirchner
+
+import functools
+
+import cv2 as cv
+import numpy as np
+
+from .context import ImageContext
+
+NAME = "resampling"
+TITLE = "Image Resampling"
+VERSION = 1
+COST = 25.0
+DEFAULTS = {
+    "predictor": 3,
+    "window": "hanning",
+    "upsample": True,
+    "center": False,
+    "highpass": 1,
+    "gamma": 4.0,
+    "rescale": True,
+}
+# rows of the design matrix F held in memory at once
+TILE_PIXELS = 2 ** 18
+# window and filter shapes kept
+MASK_CACHE = 8
+# predictor value selecting the fixed linear predictor instead of expectation maximization
+FIXED = "fixed"
+FIXED_PREDICTOR = np.array([[-0.25, 0.5, -0.25], [0.5, 0.0, 0.5], [-0.25, 0.5, -0.25]])
+
+
+def normalize_gray(gray):
+    gray = gray - gray.min()
+    return gray / gray.max()
+
+
+def probability_map(process_part, predictor=3):
+    if predictor == FIXED:
+        return calculate_probability_map_fixed(process_part)
+    if predictor == 5:
+        return calculate_probability_map_5x5(process_part)
+    return calculate_probability_map_3x3(process_part)
+
+
+def tile_regions(shape, tile):
+    """Rectangles (x1, y1, x2, y2), corners included, tiling an image in nearly equal parts."""
+    height, width = shape[:2]
+    rows = np.linspace(0, height, max(-(-height // tile), 1) + 1).astype(int)
+    cols = np.linspace(0, width, max(-(-width // tile), 1) + 1).astype(int)
+    return [
+        (int(x1), int(y1), int(x2) - 1, int(y2) - 1)
+        for y1, y2 in zip(rows[:-1], rows[1:])
+        for x1, x2 in zip(cols[:-1], cols[1:])
+    ]
+
+
+def calculate_probability_map(process_part, size, iterations=100, tile=TILE_PIXELS):
+    # expectation maximization: pixels are either linearly correlated to their neighbours
+    # with the predictor a (weights w) or not, the residual variance s is estimated along
+    a = np.random.rand(size * size - 1)
+    a = a / a.sum()
+    s = 0.005
+    d = 0.1
+    c = 0
+
+    while c < iterations:
+        r = compute_residuals(a, process_part, size)
+        g = np.exp(-(r ** 2) / s)
+        w = g / (g + d)
+        s = np.sum(w * r ** 2) / w.sum()
+        a2 = solve_normal(*normal_equations(process_part, size, w * w, tile))
+
+        if np.linalg.norm(a - a2) < 0.01:
+            break
+        else:
+            a = a2
+            c = c + 1
+
+    return w.reshape(process_part.shape[0] - size + 1, process_part.shape[1] - size + 1)
+
+
+def calculate_probability_map_3x3(process_part):
+    return calculate_probability_map(process_part, 3)
+
+
+def calculate_probability_map_5x5(process_part):
+    return calculate_probability_map(process_part, 5)
+
+
+def calculate_probability_map_fixed(process_part, sigma=1.0, tau=2.0):
+    """p-map of the residue of a fixed 3x3 predictor, a single correlation without iterations."""
+    # the model is defined for 8 bit intensities
+    kernel = -FIXED_PREDICTOR
+    kernel[1, 1] = 1
+    e = cv.filter2D(np.asarray(process_part, np.float64) * 255, cv.CV_64F, kernel)
+    e = e[1:-1, 1:-1]
+    return np.exp(-np.abs(e) ** tau / sigma)
+
+
+def normal_equations(I, size, weights, tile=TILE_PIXELS):
+    """F.T @ W @ F and F.T @ W @ f, accumulated over row tiles of about tile pixels.
+
+    Only the part of F for one tile is built at a time, so memory does not grow
+    with the image. weights holds one value per pixel of f.
+    """
+    radius = size // 2
+    weights = weights.reshape(I.shape[0] - 2 * radius, I.shape[1] - 2 * radius)
+    step = max(tile // weights.shape[1], 1)
+    A = np.zeros((size * size - 1, size * size - 1))
+    b = np.zeros(size * size - 1)
+    for y in range(0, weights.shape[0], step):
+        F, f = build_matrices(I[y : y + step + 2 * radius], size)
+        weighted = F.T * weights[y : y + step].ravel()
+        A += weighted @ F
+        b += weighted @ f
+    return A, b
+
+
+def solve_normal(A, b):
+    try:
+        # the normal matrix is symmetric positive definite unless the region is flat
+        L = np.linalg.cholesky(A)
+        return np.linalg.solve(L.T, np.linalg.solve(L, b))
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(A, b, rcond=None)[0]
+
+
+def normalized_radius(shape):
+    """Distance of each element from the center, sqrt(2) at the corners."""
+    rows, cols = shape
+    center_x, center_y = rows // 2, cols // 2
+    max_radius = np.sqrt(center_x ** 2 + center_y ** 2)
+    i, j = np.ogrid[:rows, :cols]
+    return np.sqrt((i - center_x) ** 2 + (j - center_y) ** 2) / max_radius * np.sqrt(2)
+
+
+# masks depend on the shape only and are reused for every map of that size,
+# they are shared between calls and therefore read-only
+@functools.lru_cache(maxsize=MASK_CACHE)
+def make_rotational_invariant_window(shape):
+    r = normalized_radius(shape)
+    W = np.where(
+        r < 3 / 4, 1.0, 0.5 + 0.5 * np.cos(np.pi * (r - 3 / 4) / (np.sqrt(2) - 3 / 4))
+    )
+    W[r > np.sqrt(2)] = 0
+    W.flags.writeable = False
+    return W
+
+
+@functools.lru_cache(maxsize=MASK_CACHE)
+def make_high_pass_filter(shape):
+    r = normalized_radius(shape)
+    H = 0.5 - 0.5 * np.cos(np.pi * r / np.sqrt(2))
+    H[r > np.sqrt(2)] = 0
+    H.flags.writeable = False
+    return H
+
+
+def fourier_map(
+    process_prob_map,
+    window="hanning",
+    upsample=True,
+    center=False,
+    highpass=1,
+    gamma=4.0,
+    rescale=True,
+):
+    # take center square portion of probability map, this will make analysis easier and more consistent
+    x, y = process_prob_map.shape
+    size = min(x, y)
+    half_size = size // 2
+    center_x, center_y = x // 2, y // 2
+    square_prob_map = process_prob_map[
+        center_x - half_size : center_x + half_size,
+        center_y - half_size : center_y + half_size,
+    ]
+
+    # apply pre-processing window
+    if window == "hanning":
+        hanning_window = np.hanning(square_prob_map.shape[0])[:, None] * np.hanning(
+            square_prob_map.shape[1]
+        )
+        windowed_prob_map = square_prob_map * hanning_window
+    elif window == "riw":
+        W = make_rotational_invariant_window(square_prob_map.shape)
+        windowed_prob_map = square_prob_map * W
+    else:
+        return None
+
+    if upsample:
+        upsampled = cv.pyrUp(windowed_prob_map)
+    else:
+        upsampled = windowed_prob_map
+
+    # fourier transform, only the magnitude is used: taking it before shifting leaves a
+    # single complex array alive, which dominates memory on whole images
+    magnitude_spectrum = np.fft.fftshift(np.abs(np.fft.fft2(upsampled)))
+
+    # take center?
+    if center:
+        height, width = magnitude_spectrum.shape
+        center_x, center_y = width // 2, height // 2
+        half_size = width // 4
+        magnitude_spectrum = magnitude_spectrum[
+            center_y - half_size : center_y + half_size,
+            center_x - half_size : center_x + half_size,
+        ]
+
+    # filter option
+    if highpass == 1:
+        # create circular mask:
+        rows, cols = magnitude_spectrum.shape
+        center = (int(cols / 2), int(rows / 2))
+        radius = int(0.1 * (min(rows, cols) / 2))
+        if radius == 0:
+            radius = 1  # radius should at least be = 1
+
+        Y, X = np.ogrid[:rows, :cols]
+        mask = (X - center[0]) ** 2 + (Y - center[1]) ** 2 <= radius ** 2
+        magnitude_spectrum[mask] = 0
+
+    elif highpass == 2:
+        magnitude_spectrum = magnitude_spectrum * make_high_pass_filter(magnitude_spectrum.shape)
+    else:
+        return None
+
+    # scale and gamma correct
+    minimum = magnitude_spectrum.min()
+    maximum = magnitude_spectrum.max()
+    spectrum = magnitude_spectrum - minimum
+    del magnitude_spectrum
+    spectrum /= maximum - minimum
+    np.power(spectrum, gamma, out=spectrum)
+
+    # rescale if checked
+    if rescale:
+        spectrum *= maximum
+
+    return spectrum
+
+
+def predictor_offsets(size):
+    """(dy, dx) of the neighbours weighted by a size x size predictor, in row order."""
+    radius = size // 2
+    return [
+        (dy, dx)
+        for dy in range(-radius, radius + 1)
+        for dx in range(-radius, radius + 1)
+        # skip I(x; y), its coefficient is 0
+        if dy or dx
+    ]
+
+
+def build_matrices(I, size):
+    # the i^th row of the matrix F holds the neighbors of the i^th element of f, the image
+    # strung out in row-order: each column is filled at once from a shifted view of the image,
+    # column-major so that these writes are contiguous
+    radius = size // 2
+    rows, cols = I.shape[0] - 2 * radius, I.shape[1] - 2 * radius
+    offsets = predictor_offsets(size)
+    F = np.empty((rows * cols, len(offsets)), order="F")
+    for k, (dy, dx) in enumerate(offsets):
+        F[:, k] = I[radius + dy : radius + dy + rows, radius + dx : radius + dx + cols].ravel()
+    f = I[radius : radius + rows, radius : radius + cols].astype(np.float64).ravel()
+    return F, f
+
+
+def build_matrices_for_processing_3x3(I):
+    return build_matrices(I, 3)
+
+
+def build_matrices_for_processing_5x5(I):
+    return build_matrices(I, 5)
+
+
+def compute_residuals(a, I, size):
+    """f - F @ a for every pixel, computed as a single correlation of the image."""
+    radius = size // 2
+    kernel = np.zeros((size, size))
+    for k, (dy, dx) in enumerate(predictor_offsets(size)):
+        kernel[radius + dy, radius + dx] = -a[k]
+    kernel[radius, radius] = 1
+    r = cv.filter2D(np.asarray(I, np.float64), cv.CV_64F, kernel, borderType=cv.BORDER_CONSTANT)
+    return r[radius : I.shape[0] - radius, radius : I.shape[1] - radius].ravel()
+
+
+def analyze(image, filename, params=None):
+    params = dict(DEFAULTS, **(params or {}))
+    gray = normalize_gray(ImageContext.of(image, filename).as_float(np.float64, gray=True))
+    prob_map = probability_map(gray, params["predictor"])
+    spectrum = fourier_map(
+        prob_map,
+        params["window"],
+        params["upsample"],
+        params["center"],
+        params["highpass"],
+        params["gamma"],
+        params["rescale"],
+    )
+    output = np.hstack(
+        [
+            cv.resize(prob_map, (spectrum.shape[1], spectrum.shape[0])),
+            cv.normalize(spectrum, None, 0, 1, cv.NORM_MINMAX),
+        ]
+    )
+    text = "Image Resampling Results:\n"
+    if params["predictor"] == FIXED:
+        text += "Predictor: fixed\n"
+    else:
+        text += f"Predictor: {params['predictor']}x{params['predictor']}\n"
+    text += f"Mean interpolation probability: {np.mean(prob_map):.4f}\n"
+    text += f"Spectrum peak: {np.max(spectrum):.4f}"
+    return {
+        "text": text,
+        "image": cv.cvtColor(cv.convertScaleAbs(output, None, 255), cv.COLOR_GRAY2BGR),
+        "values": {
+            "mean_probability": float(np.mean(prob_map)),
+            "spectrum_peak": float(np.max(spectrum)),
+        },
+    }
@@ -0,0 +1,126 @@
+"""
+Cost-aware ordering of batch tasks.
+
+The cost of a task is estimated from the image size and the seconds per
+megapixel of its tool: the COST declared by the analyzer at first, then the
+wall times observed in earlier runs, which are kept next to the result cache.
+The executor starts the most expensive ready task first, so slow tools do not
+end up alone at the tail of a run, and never runs more tasks of one tool at
+once than its MAX_WORKERS (or an explicit limit) allows.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import tempfile
+
+from . import get_analyzer
+from .cache import default_directory
+
+DEFAULT_COST = 0.1
+HISTORY_FILE = "timings.json"
+SMOOTHING = 0.3
+
+
+def tool_name(tool):
+    analyzer = get_analyzer(tool)
+    return analyzer.NAME if analyzer is not None else tool
+
+
+class CostModel:
+    """Seconds per megapixel of each tool, learned from completed tasks."""
+
+    def __init__(self, rates=None, path=None):
+        self.rates = dict(rates or {})
+        self.path = path
+
+    @classmethod
+    def load(cls, path=None):
+        """Cost model with the timing history of earlier runs."""
+        path = path or os.path.join(default_directory(), HISTORY_FILE)
+        try:
+            with open(path) as file:
+                rates = json.load(file)
+        except (OSError, ValueError):
+            rates = {}
+        return cls(rates, path)
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            handle, temp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(self.path))
+            with os.fdopen(handle, "w") as file:
+                json.dump(self.rates, file, indent=4, sort_keys=True)
+            os.replace(temp, self.path)
+        except OSError:
+            # the history is only a hint, losing it must not fail the batch
+            pass
+
+    def rate(self, tool):
+        name = tool_name(tool)
+        if name in self.rates:
+            return self.rates[name]
+        return getattr(get_analyzer(tool), "COST", DEFAULT_COST)
+
+    def estimate(self, tool, pixels):
+        return self.rate(tool) * pixels / 1e6
+
+    def update(self, tool, pixels, seconds):
+        if pixels <= 0:
+            return
+        name = tool_name(tool)
+        rate = seconds * 1e6 / pixels
+        if name in self.rates:
+            # moving average, recent runs reflect the current machine best
+            rate = (1 - SMOOTHING) * self.rates[name] + SMOOTHING * rate
+        self.rates[name] = rate
+
+
+class TaskQueue:
+    """Ready tasks ordered longest first, respecting per-tool concurrency limits."""
+
+    def __init__(self, costs, limits=None):
+        self.costs = costs
+        self.limits = {tool_name(t): max(int(n), 1) for t, n in (limits or {}).items()}
+        self.heap = []
+        self.running = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def limit(self, tool):
+        name = tool_name(tool)
+        if name in self.limits:
+            return self.limits[name]
+        return getattr(get_analyzer(tool), "MAX_WORKERS", None)
+
+    def push(self, tool, pixels, task):
+        # ties keep submission order, so equal tasks run image by image
+        cost = self.costs.estimate(tool, pixels)
+        heapq.heappush(self.heap, (-cost, next(self.counter), tool, task))
+
+    def pop(self):
+        """Return (tool, task) of the costliest task allowed to start, or None."""
+        blocked = []
+        found = None
+        while self.heap:
+            item = heapq.heappop(self.heap)
+            limit = self.limit(item[2])
+            if limit is None or self.running.get(item[2], 0) < limit:
+                found = item
+                break
+            blocked.append(item)
+        for item in blocked:
+            heapq.heappush(self.heap, item)
+        if found is None:
+            return None
+        tool = found[2]
+        self.running[tool] = self.running.get(tool, 0) + 1
+        return tool, found[3]
+
+    def done(self, tool):
+        self.running[tool] -= 1
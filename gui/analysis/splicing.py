@@ -0,0 +1,48 @@
+import os
+
+import cv2 as cv
+
+from jpeg import estimate_qf
+from .context import ImageContext
+
+NAME = "splicing"
+TITLE = "Composite Splicing"
+VERSION = 1
+COST = 10.0
+# TensorFlow already uses every core for a single image
+MAX_WORKERS = 1
+DEFAULTS = {}
+
+
+def warmup():
+    # importing noiseprint builds the network graph
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+    import noiseprint.noiseprint  # noqa: F401
+
+
+def estimate_noise(image, gray):
+    warmup()
+    from noiseprint.noiseprint import genNoiseprint
+
+    return genNoiseprint(gray, estimate_qf(image), model_name="net")
+
+
+def compute_heatmap(noise, gray):
+    from noiseprint.noiseprint_blind import genMappUint8, noiseprint_blind_post
+
+    mapp, valid, range0, range1, imgsize, other = noiseprint_blind_post(noise, gray)
+    if mapp is None:
+        raise ValueError("Too many invalid blocks!")
+    return cv.applyColorMap(
+        genMappUint8(mapp, valid, range0, range1, imgsize), cv.COLORMAP_JET
+    )
+
+
+def analyze(image, filename, params=None):
+    context = ImageContext.of(image, filename)
+    image = context.image
+    gray = context.as_float(gray=True, normalize=True)
+    heatmap = compute_heatmap(estimate_noise(image, gray), gray)
+    text = "Composite Splicing Results:\n"
+    text += "Noiseprint splicing probability heatmap computed"
+    return {"text": text, "image": heatmap}
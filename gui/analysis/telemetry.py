@@ -0,0 +1,168 @@
+"""
+Timing and resource telemetry for batch runs.
+
+Every task reports its wall and CPU time, how long it waited in the pool queue
+and how much it raised the peak resident memory of its worker. A Telemetry
+instance collects these together with image decoding times and summarizes
+them per tool, showing which tool dominates a run and the sustained number of
+images per second.
+"""
+
+import os
+import sys
+import threading
+import time
+from multiprocessing import parent_process
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, memory is then left out of the report
+    resource = None
+
+METRICS = ("wall", "cpu", "queue_wait", "rss_delta")
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, None when unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in kilobytes on Linux, in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes, None when unknown."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # /proc is only available on Linux
+        return None
+
+
+class TaskTimer:
+    """Measure one task; submitted is the time.time() when it was queued."""
+
+    def __init__(self, submitted=None):
+        # pool processes run one task at a time, threads share their process
+        self.cpu_clock = time.process_time if parent_process() is not None else time.thread_time
+        self.submitted = submitted
+        self.started = time.time()
+        self.rss = peak_rss()
+        self.cpu = self.cpu_clock()
+        self.wall = time.perf_counter()
+
+    def stop(self):
+        timing = {"wall": time.perf_counter() - self.wall, "cpu": self.cpu_clock() - self.cpu}
+        if self.submitted is not None:
+            timing["queue_wait"] = max(self.started - self.submitted, 0.0)
+        if self.rss is not None:
+            timing["rss_delta"] = peak_rss() - self.rss
+        return timing
+
+
+def stats(values):
+    if not values:
+        return None
+    values = np.asarray(values, np.float64)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+        "total": float(values.sum()),
+    }
+
+
+def format_seconds(seconds):
+    return f"{seconds * 1000:.0f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+
+class Telemetry:
+    """Thread-safe collector of decode and task timings for one batch run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.decode = {}
+        self.tasks = {}
+        self.cached = {}
+        self.images = set()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add_decode(self, filename, seconds):
+        with self.lock:
+            self.decode[filename] = seconds
+
+    def add_task(self, filename, tool, timing):
+        with self.lock:
+            self.images.add(filename)
+            if timing is not None:
+                self.tasks.setdefault(tool, []).append(timing)
+
+    def add_cached(self, filename, tool):
+        with self.lock:
+            self.images.add(filename)
+            self.cached[tool] = self.cached.get(tool, 0) + 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        with self.lock:
+            elapsed = self.elapsed()
+            busy = sum(t["wall"] for timings in self.tasks.values() for t in timings)
+            tools = {}
+            for tool in list(self.tasks) + [t for t in self.cached if t not in self.tasks]:
+                timings = self.tasks.get(tool, [])
+                record = {"tasks": len(timings), "cached": self.cached.get(tool, 0)}
+                for metric in METRICS:
+                    record[metric] = stats([t[metric] for t in timings if metric in t])
+                wall = sum(t["wall"] for t in timings)
+                record["share"] = wall / busy if busy else 0.0
+                tools[tool] = record
+            return {
+                "images": len(self.images),
+                "elapsed": elapsed,
+                "images_per_sec": len(self.images) / elapsed if elapsed else 0.0,
+                "decode": stats(list(self.decode.values())),
+                "tools": tools,
+            }
+
+    def format(self):
+        """Human readable summary, one line per tool from slowest to fastest."""
+        summary = self.summary()
+        lines = [
+            f"Processed {summary['images']} images in {format_seconds(summary['elapsed'])} "
+            f"({summary['images_per_sec']:.2f} images/s)"
+        ]
+        decode = summary["decode"]
+        if decode is not None:
+            lines.append(
+                f"Decoding: p50 {format_seconds(decode['p50'])}, p95 {format_seconds(decode['p95'])}, "
+                f"max {format_seconds(decode['max'])}"
+            )
+        tools = sorted(summary["tools"].items(), key=lambda item: -item[1]["share"])
+        for tool, record in tools:
+            line = f"{tool}: {record['tasks']} tasks"
+            if record["cached"]:
+                line += f" ({record['cached']} cached)"
+            wall = record["wall"]
+            if wall is not None:
+                line += (
+                    f", wall p50 {format_seconds(wall['p50'])} / p95 {format_seconds(wall['p95'])}"
+                    f" / max {format_seconds(wall['max'])}, CPU p50 {format_seconds(record['cpu']['p50'])}"
+                )
+                if record["queue_wait"] is not None:
+                    line += f", queued p50 {format_seconds(record['queue_wait']['p50'])}"
+                if record["rss_delta"] is not None:
+                    line += f", peak memory +{record['rss_delta']['max'] / 1024 ** 2:.1f} MB"
+                line += f", {record['share']:.0%} of tool time"
+            lines.append(line)
+        return "\n".join(lines)
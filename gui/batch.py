@@ -3,74 +3,56 @@ import threading
 import json
 import csv
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import cv2 as cv
 from PySide6.QtCore import Qt, Signal, QRunnable, QObject, QThreadPool
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem,
     QPushButton, QLabel, QProgressBar, QCheckBox, QGroupBox, QTextEdit,
     QMessageBox, QFileDialog, QSplitter, QTreeWidget, QTreeWidgetItem,
-    QScrollArea, QFrame
+    QScrollArea, QFrame, QSpinBox
 )
 from PySide6.QtGui import QIcon
 
 from tools import ToolWidget
-from utility import load_images, modify_font
+from imaging import thumbnail
+from utility import select_images, modify_font
 from report import generate_pdf_report
 
-# Import all tool widgets for instantiation
-from adjust import AdjustWidget
-from cloning import CloningWidget
-from comparison import ComparisonWidget
-from contrast import ContrastWidget
-from digest import DigestWidget
-from echo import EchoWidget
-from editor import EditorWidget
-from ela import ElaWidget
-from exif import ExifWidget
-from frequency import FrequencyWidget
-from gradient import GradientWidget
-from header import HeaderWidget
-from histogram import HistWidget
-from location import LocationWidget
-from magnifier import MagnifierWidget
-from median import MedianWidget
-from minmax import MinMaxWidget
-from multiple import MultipleWidget
-from noise import NoiseWidget
-from original import OriginalWidget
-from pca import PcaWidget
-from planes import PlanesWidget
-from plots import PlotsWidget
-from quality import QualityWidget
-from reverse import ReverseWidget
-from space import SpaceWidget
-
-# Try to import tensorflow-dependent modules
-try:
-    from splicing import SplicingWidget
-    SPLICING_AVAILABLE = True
-except ImportError:
-    SPLICING_AVAILABLE = False
-
-# TruFor is always available but shows setup message if not configured
-from trufor import TruForWidget
-TRUFOR_AVAILABLE = True
-
-from stats import StatsWidget
-from stereogram import StereoWidget
-from thumbnail import ThumbWidget
-from wavelets import WaveletWidget
-from ghostmmaps import GhostmapWidget
-from resampling import ResamplingWidget
-from noise_estimmation import NoiseWaveletBlockingWidget
+from analysis import get_analyzer
+from analysis.cache import default_cache
+from analysis.executor import BatchExecutor, default_jobs
+from analysis.ingest import list_images, stream_images
+from analysis.journal import batch_journal, create_batch, last_batch
+from analysis.scheduler import CostModel
+from analysis.telemetry import Telemetry
+
+PREVIEW_SIZE = 1024
+GROUP_NAMES = [
+    "[General]", "[Metadata]", "[Inspection]", "[Detail]", "[Colors]",
+    "[Noise]", "[JPEG]", "[Tampering]", "[AI Solutions]", "[Various]"
+]
+TOOL_NAMES = [
+    ["Original Image", "File Digest", "Hex Editor", "Similarity Search"],
+    ["Header Structure", "EXIF Full Dump", "Thumbnail Analysis", "Geolocation data"],
+    ["Enhancing Magnifier", "Channel Histogram", "Global Adjustments", "Reference Comparison"],
+    ["Luminance Gradient", "Echo Edge Filter", "Wavelet Threshold", "Frequency Split"],
+    ["RGB/HSV Plots", "Space Conversion", "PCA Projection", "Pixel Statistics"],
+    ["Signal Separation", "Min/Max Deviation", "Bit Plane Values", "Wavelet Blocking", "PRNU Identification"],
+    ["Quality Estimation", "Error Level Analysis", "Multiple Compression", "JPEG Ghost Maps"],
+    ["Contrast Enhancement", "Copy-Move Forgery", "Composite Splicing", "Image Resampling"],
+    ["TruFor"],
+    ["Median Filtering", "Illuminant Map", "Dead/Hot Pixels", "Stereogram Decoder"]
+]
 
 
 class BatchAnalysisWidget(ToolWidget):
     def __init__(self, parent=None):
         super(BatchAnalysisWidget, self).__init__(parent)
-        self.images = []  # List of (filename, basename, image)
+        self.filenames = []  # Images are decoded lazily while the batch runs
         self.selected_tools = []  # List of (group, tool) tuples
         self.results = {}  # Dict: image_basename -> {tool_name: data}
+        self.telemetry = None  # Timings of the last run
+        self.running = False
         self.executor = None
         self.thread_pool = QThreadPool.globalInstance()
         self.logger = logging.getLogger('batch_analysis')
@@ -98,6 +80,9 @@ class BatchAnalysisWidget(ToolWidget):
         self.load_btn = QPushButton("Load Multiple Images")
         self.load_btn.clicked.connect(self.load_images)
         load_layout.addWidget(self.load_btn)
+        self.folder_btn = QPushButton("Load Folder")
+        self.folder_btn.clicked.connect(self.load_folder)
+        load_layout.addWidget(self.folder_btn)
         self.image_list = QListWidget()
         load_layout.addWidget(self.image_list)
         load_group.setLayout(load_layout)
@@ -120,6 +105,28 @@ class BatchAnalysisWidget(ToolWidget):
         self.run_btn = QPushButton("Run Batch Analysis")
         self.run_btn.clicked.connect(self.run_analysis)
         run_layout.addWidget(self.run_btn)
+        self.resume_btn = QPushButton("Resume Last Batch")
+        self.resume_btn.setToolTip("Continue the last batch, skipping the tasks it already finished")
+        self.resume_btn.setEnabled(last_batch() is not None)
+        self.resume_btn.clicked.connect(self.resume_analysis)
+        run_layout.addWidget(self.resume_btn)
+        self.processes_check = QCheckBox(f"Use worker processes ({default_jobs()} cores)")
+        self.processes_check.setToolTip("Run tools in parallel processes instead of threads")
+        self.processes_check.setChecked(True)
+        run_layout.addWidget(self.processes_check)
+        inflight_layout = QHBoxLayout()
+        inflight_layout.addWidget(QLabel("Images in memory:"))
+        self.inflight_spin = QSpinBox()
+        self.inflight_spin.setToolTip("Images decoded and held at once, bounding memory use")
+        self.inflight_spin.setRange(1, 256)
+        self.inflight_spin.setValue(default_jobs() + 1)
+        inflight_layout.addWidget(self.inflight_spin)
+        inflight_layout.addStretch()
+        run_layout.addLayout(inflight_layout)
+        self.cache_check = QCheckBox("Reuse cached results")
+        self.cache_check.setToolTip("Skip images and tools already analyzed with the same settings")
+        self.cache_check.setChecked(True)
+        run_layout.addWidget(self.cache_check)
         self.progress_bar = QProgressBar()
         run_layout.addWidget(self.progress_bar)
         self.status_label = QLabel("Ready")
@@ -160,33 +167,18 @@ class BatchAnalysisWidget(ToolWidget):
         self.setLayout(layout)
 
     def populate_tools_tree(self):
-        # Copy the tool structure from tools.py
-        group_names = [
-            "[General]", "[Metadata]", "[Inspection]", "[Detail]", "[Colors]",
-            "[Noise]", "[JPEG]", "[Tampering]", "[AI Solutions]", "[Various]"
-        ]
-        tool_names = [
-            ["Original Image", "File Digest", "Hex Editor", "Similarity Search"],
-            ["Header Structure", "EXIF Full Dump", "Thumbnail Analysis", "Geolocation data"],
-            ["Enhancing Magnifier", "Channel Histogram", "Global Adjustments", "Reference Comparison"],
-            ["Luminance Gradient", "Echo Edge Filter", "Wavelet Threshold", "Frequency Split"],
-            ["RGB/HSV Plots", "Space Conversion", "PCA Projection", "Pixel Statistics"],
-            ["Signal Separation", "Min/Max Deviation", "Bit Plane Values", "Wavelet Blocking", "PRNU Identification"],
-            ["Quality Estimation", "Error Level Analysis", "Multiple Compression", "JPEG Ghost Maps"],
-            ["Contrast Enhancement", "Copy-Move Forgery", "Composite Splicing", "Image Resampling"],
-            ["TruFor"],
-            ["Median Filtering", "Illuminant Map", "Dead/Hot Pixels", "Stereogram Decoder"]
-        ]
-
-        for i, group in enumerate(group_names):
+        for i, group in enumerate(GROUP_NAMES):
             group_item = QTreeWidgetItem()
             group_item.setText(0, group)
             modify_font(group_item, bold=True)
-            for j, tool in enumerate(tool_names[i]):
+            for j, tool in enumerate(TOOL_NAMES[i]):
                 tool_item = QTreeWidgetItem(group_item)
                 tool_item.setText(0, tool)
                 tool_item.setData(0, Qt.UserRole, (i, j))
                 tool_item.setCheckState(0, Qt.Unchecked)
+                if get_analyzer(tool) is None:
+                    # interactive-only tool, nothing to run headless
+                    tool_item.setDisabled(True)
             self.tools_tree.addTopLevelItem(group_item)
         self.tools_tree.expandAll()
 
@@ -201,30 +193,74 @@ class BatchAnalysisWidget(ToolWidget):
                     self.selected_tools.remove(group_tool)
 
     def load_images(self):
-        images = load_images(self)
-        if images:
-            self.images = images
+        self.set_filenames(select_images(self))
+
+    def load_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Load Folder")
+        if folder:
+            self.set_filenames(list(list_images(folder)))
+
+    def set_filenames(self, filenames):
+        if filenames:
+            self.filenames = filenames
             self.image_list.clear()
-            for _, basename, _ in images:
-                self.image_list.addItem(basename)
-            self.status_label.setText(f"Loaded {len(images)} images")
+            for filename in filenames:
+                self.image_list.addItem(os.path.basename(filename))
+            self.status_label.setText(f"Loaded {len(filenames)} images")
+
+    def select_tools(self, names):
+        for i in range(self.tools_tree.topLevelItemCount()):
+            group_item = self.tools_tree.topLevelItem(i)
+            for j in range(group_item.childCount()):
+                item = group_item.child(j)
+                if not item.isDisabled():
+                    item.setCheckState(0, Qt.Checked if item.text(0) in names else Qt.Unchecked)
 
     def run_analysis(self):
-        if not self.images:
+        if not self.filenames:
             QMessageBox.warning(self, "No Images", "Please load images first.")
             return
         if not self.selected_tools:
             QMessageBox.warning(self, "No Tools Selected", "Please select at least one tool.")
             return
+        try:
+            tools = [TOOL_NAMES[group][tool] for group, tool in self.selected_tools]
+            journal = batch_journal(create_batch(self.filenames, tools))
+        except OSError as e:
+            self.logger.warning(f"Batch journal disabled, the run cannot be resumed: {str(e)}")
+            journal = None
+        self.start_analysis(journal)
+
+    def resume_analysis(self):
+        batch = last_batch()
+        if batch is None:
+            QMessageBox.warning(self, "No Batch", "There is no previous batch to resume.")
+            return
+        directory, manifest = batch
+        self.set_filenames(manifest["filenames"])
+        self.select_tools(manifest["tools"])
+        self.start_analysis(batch_journal(directory, resume=True))
 
+    def start_analysis(self, journal):
         self.results = {}
-        self.progress_bar.setRange(0, len(self.images) * len(self.selected_tools))
+        self.progress_bar.setRange(0, len(self.filenames) * len(self.selected_tools))
         self.progress_bar.setValue(0)
         self.status_label.setText("Running analysis...")
         self.run_btn.setEnabled(False)
+        self.resume_btn.setEnabled(False)
+        self.running = True
 
         # Run in thread pool to avoid freezing GUI
-        self.analysis_runnable = AnalysisRunnable(self.images, self.selected_tools, self.logger)
+        self.analysis_runnable = AnalysisRunnable(
+            self.filenames,
+            self.selected_tools,
+            self.logger,
+            self.processes_check.isChecked(),
+            default_cache() if self.cache_check.isChecked() else None,
+            journal,
+            self.inflight_spin.value(),
+        )
+        self.telemetry = self.analysis_runnable.telemetry
         self.analysis_runnable.progress.connect(self.update_progress)
         self.analysis_runnable.finished.connect(self.on_analysis_finished)
         self.thread_pool.start(self.analysis_runnable)
@@ -234,12 +270,17 @@ class BatchAnalysisWidget(ToolWidget):
 
     def on_analysis_finished(self, results):
         self.results = results
+        self.running = False
         self.run_btn.setEnabled(True)
-        self.status_label.setText("Analysis complete")
+        self.resume_btn.setEnabled(True)
+        rate = self.telemetry.summary()["images_per_sec"]
+        self.status_label.setText(f"Analysis complete ({rate:.2f} images/s)")
         self.display_results()
 
     def display_results(self):
         summary = ""
+        if self.telemetry is not None:
+            summary += f"{self.telemetry.format()}\n\n"
         for img_basename, tool_results in self.results.items():
             summary += f"Image: {img_basename}\n"
             for tool_name, data in tool_results.items():
@@ -250,200 +291,237 @@ class BatchAnalysisWidget(ToolWidget):
             summary += "\n"
         self.results_text.setPlainText(summary)
 
+    def current_results(self):
+        """Results so far, exports also work while a batch is still running."""
+        if self.running:
+            return self.analysis_runnable.snapshot()
+        return self.results
+
     def export_pdf(self):
-        if not self.results:
+        results = self.current_results()
+        if not any(results.values()):
             QMessageBox.warning(self, "No Results", "Run analysis first.")
             return
         output_path = QFileDialog.getSaveFileName(self, "Save PDF Report", "", "PDF files (*.pdf)")[0]
         if output_path:
             try:
                 from report import generate_batch_pdf_report
-                images_data = [(basename, image) for _, basename, image in self.images]
-                generate_batch_pdf_report("Batch Analysis", images_data, self.results, output_path)
+                images_data = [(os.path.basename(f), f) for f in self.filenames]
+                generate_batch_pdf_report("Batch Analysis", images_data, self.with_maps(results), output_path)
                 QMessageBox.information(self, "Exported", f"PDF saved to {output_path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", str(e))
 
     def export_csv(self):
-        if not self.results:
+        results = self.current_results()
+        if not any(results.values()):
             QMessageBox.warning(self, "No Results", "Run analysis first.")
             return
         output_path = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV files (*.csv)")[0]
         if output_path:
             with open(output_path, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
-                writer.writerow(["Image", "Tool", "Result"])
-                for img, tools in self.results.items():
+                writer.writerow([
+                    "Image", "Tool", "Result", "Decode (ms)", "Wall (ms)", "CPU (ms)",
+                    "Queue wait (ms)", "Peak memory delta (MB)",
+                ])
+                decode = {}
+                if self.telemetry is not None:
+                    decode = {os.path.basename(f): s for f, s in self.telemetry.decode.items()}
+                for img, tools in results.items():
                     for tool, data in tools.items():
                         result = data.get('text', 'Data available')
-                        writer.writerow([img, tool, result])
+                        timing = data.get('timing', {})
+                        writer.writerow([
+                            img, tool, result,
+                            self.format_value(decode.get(img), 1000),
+                            self.format_value(timing.get('wall'), 1000),
+                            self.format_value(timing.get('cpu'), 1000),
+                            self.format_value(timing.get('queue_wait'), 1000),
+                            self.format_value(timing.get('rss_delta'), 1 / 1024 ** 2),
+                        ])
+                if self.telemetry is not None:
+                    writer.writerow([])
+                    writer.writerow([
+                        "Tool", "Tasks", "Cached", "Wall p50 (ms)", "Wall p95 (ms)", "Wall max (ms)",
+                        "CPU p50 (ms)", "Queue wait p50 (ms)", "Peak memory delta max (MB)", "Share of tool time",
+                    ])
+                    summary = self.telemetry.summary()
+                    for tool, record in summary["tools"].items():
+                        wall = record["wall"] or {}
+                        writer.writerow([
+                            tool, record["tasks"], record["cached"],
+                            self.format_value(wall.get("p50"), 1000),
+                            self.format_value(wall.get("p95"), 1000),
+                            self.format_value(wall.get("max"), 1000),
+                            self.format_value((record["cpu"] or {}).get("p50"), 1000),
+                            self.format_value((record["queue_wait"] or {}).get("p50"), 1000),
+                            self.format_value((record["rss_delta"] or {}).get("max"), 1 / 1024 ** 2),
+                            f"{record['share']:.1%}",
+                        ])
+                    writer.writerow(["Images", summary["images"]])
+                    writer.writerow(["Elapsed (s)", f"{summary['elapsed']:.2f}"])
+                    writer.writerow(["Images/s", f"{summary['images_per_sec']:.2f}"])
             QMessageBox.information(self, "Exported", f"CSV saved to {output_path}")
 
     def export_json(self):
-        if not self.results:
+        results = self.current_results()
+        if not any(results.values()):
             QMessageBox.warning(self, "No Results", "Run analysis first.")
             return
         output_path = QFileDialog.getSaveFileName(self, "Save JSON", "", "JSON files (*.json)")[0]
         if output_path:
+            # Image maps are not JSON serializable, keep them for the PDF report only
+            results = {
+                img: {
+                    tool: {k: v for k, v in data.items() if k not in ('image', 'map')}
+                    for tool, data in tools.items()
+                }
+                for img, tools in results.items()
+            }
+            output = {"results": results}
+            if self.telemetry is not None:
+                output["telemetry"] = self.telemetry.summary()
             with open(output_path, 'w') as jsonfile:
-                json.dump(self.results, jsonfile, indent=4)
+                json.dump(output, jsonfile, indent=4)
             QMessageBox.information(self, "Exported", f"JSON saved to {output_path}")
 
+    @staticmethod
+    def with_maps(results):
+        """Results with the maps kept in the batch journal loaded back, for the report."""
+        loaded = {}
+        for img, tools in results.items():
+            loaded[img] = {}
+            for tool, data in tools.items():
+                data = dict(data)
+                path = data.pop('map', None)
+                if path is not None:
+                    image = cv.imread(path, cv.IMREAD_UNCHANGED)
+                    if image is not None:
+                        data['image'] = image
+                loaded[img][tool] = data
+        return loaded
+
+    @staticmethod
+    def format_value(value, scale):
+        return "" if value is None else f"{value * scale:.1f}"
+
 
 class AnalysisRunnable(QObject, QRunnable):
     progress = Signal(int)
     finished = Signal(dict)
 
-    def __init__(self, images, selected_tools, logger):
+    def __init__(
+        self, filenames, selected_tools, logger, processes=True, cache=None, journal=None, inflight=None
+    ):
         super().__init__()
-        self.images = images
+        self.filenames = filenames
         self.selected_tools = selected_tools
         self.logger = logger
+        self.processes = processes
+        self.cache = cache
+        self.journal = journal
+        self.inflight = inflight
+        self.missing = {}
         self.results = {}
+        self.telemetry = Telemetry()
+        self.lock = threading.Lock()
 
     def run(self):
-        total_tasks = len(self.images) * len(self.selected_tools)
-        completed_tasks = 0
-
-        with ThreadPoolExecutor(max_workers=min(8, total_tasks)) as executor:
-            futures = []
-            for filename, basename, image in self.images:
-                self.results[basename] = {}
-                for group, tool in self.selected_tools:
-                    future = executor.submit(self.process_tool, filename, basename, image, group, tool)
-                    futures.append(future)
-
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    if result:
-                        basename, tool_name, data = result
-                        self.results[basename][tool_name] = data
-                except Exception as e:
-                    self.logger.error(f"Error in parallel processing: {str(e)}")
-                completed_tasks += 1
-                if self.progress_signal:
-                    self.progress_signal.emit(completed_tasks)
+        tools = [self.get_tool_name(group, tool) for group, tool in self.selected_tools]
+        self.completed_tasks = 0
+        for filename in self.filenames:
+            self.results[os.path.basename(filename)] = {}
 
-        self.finished.emit(self.results)
-
-    def process_tool(self, filename, basename, image, group, tool):
-        tool_name = self.get_tool_name(group, tool)
         try:
-            widget = self.create_tool_widget(group, tool, filename, image)
-            if widget and hasattr(widget, 'get_report_data'):
-                data = widget.get_report_data()
-                if data:
-                    return (basename, tool_name, data)
+            self.missing = self.load_completed(tools)
+            images = (
+                # full paths identify the results in the journal
+                (filename, filename, image, self.missing[filename])
+                for filename, _, image in stream_images(
+                    list(self.missing), on_error=self.on_load_error, on_decode=self.telemetry.add_decode
+                )
+            )
+            costs = CostModel.load()
+            with BatchExecutor(
+                tools,
+                processes=self.processes,
+                inflight=self.inflight,
+                cache=self.cache,
+                telemetry=self.telemetry,
+                costs=costs,
+            ) as executor:
+                for filename, tool_name, data in executor.run(images):
+                    self.add_result(filename, tool_name, data)
+            costs.save()
         except Exception as e:
-            return (basename, tool_name, {'text': f"Error: {str(e)}"})
-        return None
+            self.logger.error(f"Error in parallel processing: {str(e)}")
 
-    def get_tool_name(self, group, tool):
-        # Map back to name
-        tool_names = [
-            ["Original Image", "File Digest", "Hex Editor", "Similarity Search"],
-            ["Header Structure", "EXIF Full Dump", "Thumbnail Analysis", "Geolocation data"],
-            ["Enhancing Magnifier", "Channel Histogram", "Global Adjustments", "Reference Comparison"],
-            ["Luminance Gradient", "Echo Edge Filter", "Wavelet Threshold", "Frequency Split"],
-            ["RGB/HSV Plots", "Space Conversion", "PCA Projection", "Pixel Statistics"],
-            ["Signal Separation", "Min/Max Deviation", "Bit Plane Values", "Wavelet Blocking", "PRNU Identification"],
-            ["Quality Estimation", "Error Level Analysis", "Multiple Compression", "JPEG Ghost Maps"],
-            ["Contrast Enhancement", "Copy-Move Forgery", "Composite Splicing", "Image Resampling"],
-            ["TruFor"],
-            ["Median Filtering", "Illuminant Map", "Dead/Hot Pixels", "Stereogram Decoder"]
-        ]
-        return tool_names[group][tool]
-
-    def create_tool_widget(self, group, tool, filename, image):
-        # Instantiate the widget based on group and tool
-        if group == 0:
-            if tool == 0:
-                return OriginalWidget(image)
-            elif tool == 1:
-                return DigestWidget(filename, image)
-            elif tool == 2:
-                return EditorWidget()
-            elif tool == 3:
-                return ReverseWidget()
-        elif group == 1:
-            if tool == 0:
-                return HeaderWidget(filename)
-            elif tool == 1:
-                return ExifWidget(filename)
-            elif tool == 2:
-                return ThumbWidget(filename, image)
-            elif tool == 3:
-                return LocationWidget(filename)
-        elif group == 2:
-            if tool == 0:
-                return MagnifierWidget(image)
-            elif tool == 1:
-                return HistWidget(image)
-            elif tool == 2:
-                return AdjustWidget(image)
-            elif tool == 3:
-                return ComparisonWidget(filename, image)
-        elif group == 3:
-            if tool == 0:
-                return GradientWidget(image)
-            elif tool == 1:
-                return EchoWidget(image)
-            elif tool == 2:
-                return WaveletWidget(image)
-            elif tool == 3:
-                return FrequencyWidget(image)
-        elif group == 4:
-            if tool == 0:
-                return PlotsWidget(image)
-            elif tool == 1:
-                return SpaceWidget(image)
-            elif tool == 2:
-                return PcaWidget(image)
-            elif tool == 3:
-                return StatsWidget(image)
-        elif group == 5:
-            if tool == 0:
-                return NoiseWidget(image)
-            elif tool == 1:
-                return MinMaxWidget(image)
-            elif tool == 2:
-                return PlanesWidget(image)
-            elif tool == 3:
-                return NoiseWaveletBlockingWidget(filename, image)
-            elif tool == 4:
-                return MultipleWidget(image)  # PRNU Identification
-        elif group == 6:
-            if tool == 0:
-                return QualityWidget(filename, image)
-            elif tool == 1:
-                return ElaWidget(image)
-            elif tool == 2:
-                return MultipleWidget(image)  # Multiple Compression
-            elif tool == 3:
-                return GhostmapWidget(filename, image)
-        elif group == 7:
-            if tool == 0:
-                return ContrastWidget(image)
-            elif tool == 1:
-                return CloningWidget(image)
-            elif tool == 2:
-                if SPLICING_AVAILABLE:
-                    return SplicingWidget(image)
+        if self.journal is not None:
+            self.journal.close()
+        self.telemetry.stop()
+        self.finished.emit(self.results)
+
+    def load_completed(self, tools):
+        """Collect journaled and cached results, returning the tools still to run for each file."""
+        missing = {}
+        for filename in self.filenames:
+            tools_left = []
+            for tool_name in tools:
+                record = self.journal.completed.get((filename, tool_name)) if self.journal else None
+                if record is None:
+                    tools_left.append(tool_name)
                 else:
-                    return None  # Splicing not available
-            elif tool == 3:
-                return ResamplingWidget(filename, image)
-        elif group == 8:
-            if tool == 0:
-                return TruForWidget(filename, image)
-        elif group == 9:
-            if tool == 0:
-                return MedianWidget(image)
-            elif tool == 1:
-                return None  # Illuminant Map - not implemented
-            elif tool == 2:
-                return None  # Dead/Hot Pixels - not implemented
-            elif tool == 3:
-                return StereoWidget(image)
-        return None  # Placeholder for unimplemented tools
+                    self.add_result(filename, tool_name, self.journal.load(record, maps=False), record)
+            if self.cache is not None and tools_left:
+                hits, tools_left = self.cache.lookup(filename, tools_left)
+                for tool_name, data in hits.items():
+                    self.telemetry.add_cached(filename, tool_name)
+                    self.add_result(filename, tool_name, data)
+            if tools_left:
+                missing[filename] = tools_left
+        return missing
+
+    def add_result(self, filename, tool_name, data, record=None):
+        """Keep the text and values of a result, its map only in the journal when there is one.
+
+        record is the journal record of a result already journaled.
+        """
+        if 'image' in data:
+            # keep a report-sized preview, not the full resolution map
+            data['image'] = thumbnail(data['image'], PREVIEW_SIZE)
+        if self.journal is not None:
+            if record is None:
+                record = self.journal.write(filename, tool_name, data)
+            # memory stays flat however many images the batch has, reports load the maps back
+            data = {k: v for k, v in data.items() if k != 'image'}
+            path = self.journal.map_path(record)
+            if path is not None:
+                data['map'] = path
+        with self.lock:
+            self.results[os.path.basename(filename)][tool_name] = data
+        self.advance(1)
+
+    def snapshot(self):
+        """Copy of the results so far, safe to export while the batch runs."""
+        with self.lock:
+            return {image: dict(tools) for image, tools in self.results.items()}
+
+    def on_load_error(self, filename, message):
+        self.logger.error(f"Unable to load {filename}: {message}")
+        for tool_name in self.missing[filename]:
+            data = {'text': f"Error: {message}"}
+            if self.journal is not None:
+                self.journal.write(filename, tool_name, data)
+            with self.lock:
+                self.results[os.path.basename(filename)][tool_name] = data
+        self.advance(len(self.missing[filename]))
+
+    def advance(self, tasks):
+        # load errors are reported from the decoding thread
+        with self.lock:
+            self.completed_tasks += tasks
+            self.progress.emit(self.completed_tasks)
+
+    def get_tool_name(self, group, tool):
+        return TOOL_NAMES[group][tool]
@@ -0,0 +1,195 @@
+"""
+Headless command line interface.
+
+    look-dgc analyze <paths...> --tools ela,noise,median --jobs N --out results.jsonl
+
+Runs the analyzers of the batch engine without any Qt import, streaming one
+JSON record per image and tool as results complete. Result maps are written
+as PNG files to a sidecar directory next to the output file. The output is
+an analysis.journal file, so an interrupted run continues with --resume.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import analysis
+from analysis.cache import default_cache
+from analysis.executor import BatchExecutor, default_jobs
+from analysis.ingest import list_images, stream_images
+from analysis.journal import Journal
+from analysis.scheduler import CostModel
+from analysis.telemetry import Telemetry
+
+
+def parse_tools(value):
+    if value == "all":
+        return list(analysis.ANALYZERS)
+    tools = []
+    for name in value.split(","):
+        analyzer = analysis.get_analyzer(name.strip())
+        if analyzer is None:
+            raise argparse.ArgumentTypeError(
+                f"unknown tool '{name}' (choose from {', '.join(analysis.ANALYZERS)})"
+            )
+        tools.append(analyzer.NAME)
+    return tools
+
+
+def parse_param(value):
+    """Parse tool.key=value, the value is read as JSON when possible."""
+    try:
+        name, value = value.split("=", 1)
+        tool, key = name.split(".", 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected tool.key=value, got '{value}'")
+    analyzer = analysis.get_analyzer(tool)
+    if analyzer is None:
+        raise argparse.ArgumentTypeError(f"unknown tool '{tool}'")
+    if key not in analyzer.DEFAULTS:
+        raise argparse.ArgumentTypeError(
+            f"unknown parameter '{key}' for {analyzer.NAME} (choose from {', '.join(analyzer.DEFAULTS)})"
+        )
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return analyzer.NAME, key, value
+
+
+def parse_limit(value):
+    try:
+        tool, count = value.split("=", 1)
+        count = int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected tool=count, got '{value}'")
+    if analysis.get_analyzer(tool) is None or count < 1:
+        raise argparse.ArgumentTypeError(f"invalid limit '{value}'")
+    return analysis.get_analyzer(tool).NAME, count
+
+
+def parse_positive(value):
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got '{value}'")
+    return count
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="look-dgc", description="LOOK-DGC digital image forensics toolkit")
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze = commands.add_parser("analyze", help="run analysis tools on images without the GUI")
+    analyze.add_argument("paths", nargs="+", help="image files, directories or glob patterns")
+    analyze.add_argument(
+        "-t", "--tools", type=parse_tools, default="all",
+        help="comma separated tool names or 'all' (default: all)",
+    )
+    analyze.add_argument(
+        "-j", "--jobs", type=int, default=default_jobs(),
+        help="number of parallel workers (default: %(default)s)",
+    )
+    analyze.add_argument(
+        "--inflight", type=parse_positive, metavar="IMAGES",
+        help="images decoded and held in memory at once, bounding memory use (default: jobs + 1)",
+    )
+    analyze.add_argument("-o", "--out", default="-", help="JSON Lines output file (default: stdout)")
+    analyze.add_argument(
+        "-m", "--maps",
+        help="directory for result maps (default: <out>.maps, none when writing to stdout)",
+    )
+    analyze.add_argument(
+        "-p", "--param", type=parse_param, action="append", default=[],
+        metavar="TOOL.KEY=VALUE", help="override a tool parameter, may be repeated",
+    )
+    analyze.add_argument(
+        "-l", "--limit", type=parse_limit, action="append", default=[],
+        metavar="TOOL=COUNT", help="run at most COUNT tasks of a tool at once, may be repeated",
+    )
+    analyze.add_argument("--telemetry", metavar="FILE", help="write per-tool timing statistics as JSON")
+    analyze.add_argument("-q", "--quiet", action="store_true", help="do not print the timing summary")
+    analyze.add_argument("-r", "--recursive", action="store_true", help="descend into subdirectories")
+    analyze.add_argument("--threads", action="store_true", help="use threads instead of worker processes")
+    analyze.add_argument(
+        "--resume", action="store_true",
+        help="keep the results already in the output file and only run the missing tasks",
+    )
+    analyze.add_argument("--no-cache", action="store_true", help="neither read nor write the result cache")
+    return parser
+
+
+def analyze(args):
+    filenames = list(list_images(args.paths, args.recursive))
+    if not filenames:
+        print("look-dgc: no images found", file=sys.stderr)
+        return 1
+    if args.resume and args.out == "-":
+        print("look-dgc: --resume needs an output file", file=sys.stderr)
+        return 1
+    params = {}
+    for tool, key, value in args.param:
+        params.setdefault(tool, {})[key] = value
+    if args.maps is None and args.out != "-":
+        args.maps = os.path.splitext(args.out)[0] + ".maps"
+    cache = None if args.no_cache else default_cache()
+    telemetry = Telemetry()
+    costs = CostModel.load()
+
+    with Journal(args.out, args.maps, args.resume) as writer:
+        missing = {}
+        for filename in filenames:
+            missing_tools = [t for t in args.tools if not writer.is_done(filename, t)]
+            if cache is not None and missing_tools:
+                hits, missing_tools = cache.lookup(filename, missing_tools, params)
+                for tool, data in hits.items():
+                    telemetry.add_cached(filename, tool)
+                    writer.write(filename, tool, data)
+            if missing_tools:
+                missing[filename] = missing_tools
+
+        def on_error(filename, message):
+            for tool in missing[filename]:
+                writer.write(filename, tool, error=message)
+
+        images = (
+            # the full path identifies results, basenames may repeat across folders
+            (filename, filename, image, missing[filename])
+            for filename, _, image in stream_images(
+                list(missing), on_error=on_error, on_decode=telemetry.add_decode
+            )
+        )
+        with BatchExecutor(
+            args.tools,
+            args.jobs,
+            not args.threads,
+            params,
+            cache=cache,
+            telemetry=telemetry,
+            costs=costs,
+            limits=dict(args.limit),
+            inflight=args.inflight,
+        ) as executor:
+            for filename, tool, data in executor.run(images):
+                writer.write(filename, tool, data)
+    costs.save()
+    telemetry.stop()
+    if not args.quiet:
+        print(telemetry.format(), file=sys.stderr)
+    if args.telemetry:
+        with open(args.telemetry, "w") as file:
+            json.dump(telemetry.summary(), file, indent=4)
+    return 0 if writer.errors == 0 else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "analyze":
+        return analyze(args)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,7 @@
-from itertools import compress
 from os.path import splitext
 from time import time
 
 import cv2 as cv
-import numpy as np
 from PySide6.QtCore import Qt, QCoreApplication
 from PySide6.QtWidgets import (
     QToolButton,
@@ -17,6 +15,16 @@ from PySide6.QtWidgets import (
     QProgressDialog,
 )
 
+from analysis.cloning import (
+    BLOCKS,
+    DETECTORS,
+    MATCHERS,
+    cluster_matches,
+    detect_keypoints,
+    match_blocks,
+    match_keypoints,
+    render,
+)
 from tools import ToolWidget
 from utility import elapsed_time, modify_font, load_image
 from viewer import ImageViewer
@@ -27,9 +35,7 @@ class CloningWidget(ToolWidget):
         super(CloningWidget, self).__init__(parent)
 
         self.detector_combo = QComboBox()
-        self.detector_combo.addItems(
-            [self.tr("BRISK"), self.tr("ORB"), self.tr("AKAZE")]
-        )
+        self.detector_combo.addItems([self.tr(d) for d in DETECTORS])
         self.detector_combo.setCurrentIndex(0)
         self.detector_combo.setToolTip(
             self.tr("Algorithm used for localization and description")
@@ -41,6 +47,10 @@ class CloningWidget(ToolWidget):
         self.response_spin.setToolTip(
             self.tr("Maximum keypoint response to perform matching")
         )
+        self.tiled_check = QCheckBox(self.tr("Tiled"))
+        self.tiled_check.setToolTip(
+            self.tr("Detect keypoints in parallel on image tiles (faster on large images)")
+        )
         self.matching_spin = QSpinBox()
         self.matching_spin.setRange(1, 100)
         self.matching_spin.setSuffix(self.tr("%"))
@@ -48,6 +58,21 @@ class CloningWidget(ToolWidget):
         self.matching_spin.setToolTip(
             self.tr("Maximum metric difference to accept matching")
         )
+        self.matcher_combo = QComboBox()
+        self.matcher_combo.addItems([self.tr(m) for m in MATCHERS])
+        self.matcher_combo.setCurrentIndex(0)
+        self.matcher_combo.setToolTip(
+            self.tr(
+                "Exact matching compares all keypoints, approximate matching uses hashing "
+                "and scales to many more keypoints (auto: approximate on large sets)"
+            )
+        )
+        self.tables_spin = QSpinBox()
+        self.tables_spin.setRange(1, 32)
+        self.tables_spin.setValue(12)
+        self.tables_spin.setToolTip(
+            self.tr("Hash tables of approximate matching (more find more matches, but slower)")
+        )
         self.distance_spin = QSpinBox()
         self.distance_spin.setRange(1, 100)
         self.distance_spin.setSuffix(self.tr("%"))
@@ -89,7 +114,10 @@ class CloningWidget(ToolWidget):
 
         self.detector_combo.currentIndexChanged.connect(self.update_detector)
         self.response_spin.valueChanged.connect(self.update_detector)
+        self.tiled_check.stateChanged.connect(self.update_detector)
         self.matching_spin.valueChanged.connect(self.update_matching)
+        self.matcher_combo.currentIndexChanged.connect(self.update_matching)
+        self.tables_spin.valueChanged.connect(self.update_matching)
         self.distance_spin.valueChanged.connect(self.update_cluster)
         self.cluster_spin.valueChanged.connect(self.update_cluster)
         self.nolines_check.stateChanged.connect(self.process)
@@ -104,8 +132,13 @@ class CloningWidget(ToolWidget):
         top_layout.addWidget(self.detector_combo)
         top_layout.addWidget(QLabel(self.tr("Response:")))
         top_layout.addWidget(self.response_spin)
+        top_layout.addWidget(self.tiled_check)
         top_layout.addWidget(QLabel(self.tr("Matching:")))
         top_layout.addWidget(self.matching_spin)
+        top_layout.addWidget(QLabel(self.tr("Matcher:")))
+        top_layout.addWidget(self.matcher_combo)
+        top_layout.addWidget(QLabel(self.tr("Tables:")))
+        top_layout.addWidget(self.tables_spin)
         top_layout.addWidget(QLabel(self.tr("Distance:")))
         top_layout.addWidget(self.distance_spin)
         top_layout.addWidget(QLabel(self.tr("Cluster:")))
@@ -158,6 +191,12 @@ class CloningWidget(ToolWidget):
 
     def update_detector(self):
         self.total = self.kpts = self.desc = self.matches = self.clusters = None
+        # the block engine has no keypoint response nor descriptor matcher
+        keypoints = self.detector_combo.currentIndex() != BLOCKS
+        self.response_spin.setEnabled(keypoints)
+        self.tiled_check.setEnabled(keypoints)
+        self.matcher_combo.setEnabled(keypoints)
+        self.tables_spin.setEnabled(keypoints)
         self.status_label.setText("")
         self.process_button.setEnabled(True)
 
@@ -179,31 +218,31 @@ class CloningWidget(ToolWidget):
         self.canceled = False
         self.status_label.setText(self.tr("Processing, please wait..."))
         algorithm = self.detector_combo.currentIndex()
-        response = 100 - self.response_spin.value()
-        matching = self.matching_spin.value() / 100 * 255
-        distance = self.distance_spin.value() / 100
+        response = self.response_spin.value()
+        matching = self.matching_spin.value()
+        distance = self.distance_spin.value()
         cluster = self.cluster_spin.value()
         modify_font(self.status_label, bold=False, italic=True)
         QCoreApplication.processEvents()
 
-        if self.kpts is None:
-            if algorithm == 0:
-                detector = cv.BRISK_create()
-            elif algorithm == 1:
-                detector = cv.ORB_create()
-            elif algorithm == 2:
-                detector = cv.AKAZE_create()
-            else:
+        if algorithm == BLOCKS and self.clusters is None:
+            # blocks are described, matched and clustered at once
+            mask = self.mask if self.onoff_button.isChecked() else None
+            try:
+                self.total, self.kpts, self.matches, self.clusters = match_blocks(
+                    self.gray, matching, distance, cluster, mask
+                )
+            except ValueError as error:
+                QMessageBox.warning(self, self.tr("Warning"), str(error))
+                self.status_label.setText("")
                 return
+
+        if self.kpts is None:
             mask = self.mask if self.onoff_button.isChecked() else None
-            self.kpts, self.desc = detector.detectAndCompute(self.gray, mask)
-            self.total = len(self.kpts)
-            responses = np.array([k.response for k in self.kpts])
-            strongest = (
-                cv.normalize(responses, None, 0, 100, cv.NORM_MINMAX) >= response
-            ).flatten()
-            self.kpts = list(compress(self.kpts, strongest))
-            if len(self.kpts) > 30000:
+            self.total, self.kpts, self.desc = detect_keypoints(
+                self.gray, algorithm, response, mask, self.tiled_check.isChecked()
+            )
+            if self.desc is None:
                 QMessageBox.warning(
                     self,
                     self.tr("Warning"),
@@ -215,132 +254,48 @@ class CloningWidget(ToolWidget):
                 self.total = 0
                 self.status_label.setText("")
                 return
-            self.desc = self.desc[strongest]
 
         if self.matches is None:
-            matcher = cv.BFMatcher_create(cv.NORM_HAMMING, True)
-            self.matches = matcher.radiusMatch(self.desc, self.desc, matching)
-            if self.matches is None:
-                self.status_label.setText(
-                    self.tr("No keypoint match found with current settings")
-                )
-                modify_font(self.status_label, italic=False, bold=True)
-                return
-            self.matches = [item for sublist in self.matches for item in sublist]
-            self.matches = [m for m in self.matches if m.queryIdx != m.trainIdx]
+            self.matches = match_keypoints(
+                self.desc,
+                matching,
+                self.matcher_combo.currentIndex(),
+                self.tables_spin.value(),
+            )
 
         if not self.matches:
             self.clusters = []
         elif self.clusters is None:
-            self.clusters = []
-            min_dist = distance * np.min(self.gray.shape) / 2
-            kpts_a = np.array([p.pt for p in self.kpts])
-            ds = np.linalg.norm(
-                [kpts_a[m.queryIdx] - kpts_a[m.trainIdx] for m in self.matches], axis=1
-            )
-            self.matches = [m for i, m in enumerate(self.matches) if ds[i] > min_dist]
-
-            total = len(self.matches)
             progress = QProgressDialog(
-                self.tr("Clustering matches..."), self.tr("Cancel"), 0, total, self
+                self.tr("Clustering matches..."),
+                self.tr("Cancel"),
+                0,
+                len(self.matches),
+                self,
             )
             progress.canceled.connect(self.cancel)
             progress.setWindowModality(Qt.WindowModal)
-            for i in range(total):
-                match0 = self.matches[i]
-                d0 = ds[i]
-                query0 = match0.queryIdx
-                train0 = match0.trainIdx
-                group = [match0]
-
-                for j in range(i + 1, total):
-                    match1 = self.matches[j]
-                    query1 = match1.queryIdx
-                    train1 = match1.trainIdx
-                    if query1 == train0 and train1 == query0:
-                        continue
-                    d1 = ds[j]
-                    if np.abs(d0 - d1) > min_dist:
-                        continue
-
-                    a0 = np.array(self.kpts[query0].pt)
-                    b0 = np.array(self.kpts[train0].pt)
-                    a1 = np.array(self.kpts[query1].pt)
-                    b1 = np.array(self.kpts[train1].pt)
-
-                    aa = np.linalg.norm(a0 - a1)
-                    bb = np.linalg.norm(b0 - b1)
-                    ab = np.linalg.norm(a0 - b1)
-                    ba = np.linalg.norm(b0 - a1)
 
-                    if not (
-                        0 < aa < min_dist
-                        and 0 < bb < min_dist
-                        or 0 < ab < min_dist
-                        and 0 < ba < min_dist
-                    ):
-                        continue
-                    for g in group:
-                        if g.queryIdx == train1 and g.trainIdx == query1:
-                            break
-                    else:
-                        group.append(match1)
-
-                if len(group) >= cluster:
-                    self.clusters.append(group)
+            def update(i):
                 progress.setValue(i)
-                if self.canceled:
-                    self.update_detector()
-                    return
-            progress.close()
-
-        output = np.copy(self.image)
-        hsv = np.zeros((1, 1, 3))
-        nolines = self.nolines_check.isChecked()
-        show_kpts = self.kpts_check.isChecked()
-
-        if show_kpts:
-            for kpt in self.kpts:
-                cv.circle(output, (int(kpt.pt[0]), int(kpt.pt[1])), 2, (250, 227, 72))
+                return not self.canceled
 
-        angles = []
-        for c in self.clusters:
-            for m in c:
-                ka = self.kpts[m.queryIdx]
-                pa = tuple(map(int, ka.pt))
-                sa = int(np.round(ka.size))
-                kb = self.kpts[m.trainIdx]
-                pb = tuple(map(int, kb.pt))
-                sb = int(np.round(kb.size))
-                angle = np.arctan2(pb[1] - pa[1], pb[0] - pa[0])
-                if angle < 0:
-                    angle += np.pi
-                angles.append(angle)
-                hsv[0, 0, 0] = angle / np.pi * 180
-                hsv[0, 0, 1] = 255
-                hsv[0, 0, 2] = m.distance / matching * 255
-                rgb = cv.cvtColor(hsv.astype(np.uint8), cv.COLOR_HSV2BGR)
-                rgb = tuple([int(x) for x in rgb[0, 0]])
-                cv.circle(output, pa, sa, rgb, 1, cv.LINE_AA)
-                cv.circle(output, pb, sb, rgb, 1, cv.LINE_AA)
-                if not nolines:
-                    cv.line(output, pa, pb, rgb, 1, cv.LINE_AA)
+            self.matches, self.clusters = cluster_matches(
+                self.kpts, self.matches, self.gray.shape, distance, cluster, update
+            )
+            if self.clusters is None:
+                self.update_detector()
+                return
+            progress.close()
 
-        regions = 0
-        if angles:
-            angles = np.reshape(np.array(angles, dtype=np.float32), (len(angles), 1))
-            if np.std(angles) < 0.1:
-                regions = 1
-            else:
-                criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-                attempts = 10
-                flags = cv.KMEANS_PP_CENTERS
-                compact = [
-                    cv.kmeans(angles, k, None, criteria, attempts, flags)[0]
-                    for k in range(1, 11)
-                ]
-                compact = cv.normalize(np.array(compact), None, 0, 1, cv.NORM_MINMAX)
-                regions = np.argmax(compact < 0.005) + 1
+        output, regions = render(
+            self.image,
+            self.kpts,
+            self.clusters,
+            matching,
+            not self.nolines_check.isChecked(),
+            self.kpts_check.isChecked(),
+        )
         self.viewer.update_processed(output)
         self.process_button.setEnabled(False)
         modify_font(self.status_label, italic=False, bold=True)
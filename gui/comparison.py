@@ -4,7 +4,6 @@ from subprocess import run, PIPE
 
 import cv2 as cv
 import numpy as np
-import sewar
 from PySide6.QtCore import QTemporaryDir, Qt
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
@@ -354,6 +353,8 @@ class ComparisonWidget(ToolWidget):
         self.reference_viewer.update_original(result)
 
     def metrics(self):
+        import sewar
+
         progress = QProgressDialog(
             self.tr("Computing metrics..."),
             self.tr("Cancel"),
@@ -1,7 +1,5 @@
 from time import time
 
-import cv2 as cv
-import numpy as np
 from PySide6.QtWidgets import (
     QPushButton,
     QVBoxLayout,
@@ -11,9 +9,11 @@ from PySide6.QtWidgets import (
     QLabel,
 )
 
+from analysis.context import ImageContext
+from analysis.ela import error_level
 from jpeg import compress_jpg
 from tools import ToolWidget
-from utility import elapsed_time, desaturate, create_lut
+from utility import elapsed_time
 from viewer import ImageViewer
 
 
@@ -53,7 +53,8 @@ class ElaWidget(ToolWidget):
         params_layout.addStretch()
 
         self.image = image
-        self.original = image.astype(np.float32) / 255
+        # conversions are reused each time a setting changes
+        self.context = ImageContext(image)
         self.compressed = None
         self.viewer = ImageViewer(self.image, self.image)
         self.default()
@@ -77,22 +78,14 @@ class ElaWidget(ToolWidget):
 
     def process(self):
         start = time()
-        scale = self.scale_spin.value()
-        contrast = int(self.contrast_spin.value() / 100 * 128)
-        linear = self.linear_check.isChecked()
-        grayscale = self.gray_check.isChecked()
-        if not linear:
-            difference = cv.absdiff(
-                self.original, self.compressed.astype(np.float32) / 255
-            )
-            ela = cv.convertScaleAbs(cv.sqrt(difference) * 255, None, scale / 20)
-        else:
-            ela = cv.convertScaleAbs(
-                cv.subtract(self.compressed, self.image), None, scale
-            )
-        ela = cv.LUT(ela, create_lut(contrast, contrast))
-        if grayscale:
-            ela = desaturate(ela)
+        ela = error_level(
+            self.context,
+            self.compressed,
+            self.scale_spin.value(),
+            self.contrast_spin.value(),
+            self.linear_check.isChecked(),
+            self.gray_check.isChecked(),
+        )
         self.viewer.update_processed(ela)
         self.info_message.emit(self.tr(f"Error Level Analysis = {elapsed_time(start)}"))
 
@@ -1,7 +1,10 @@
 # This code implements JPEG Ghost maps as explained in the paper: "Exposing Digital Forgeries from JPEG Ghosts" by Hany Farid
 # The book "Digital Image Forensics" by Hany Farid gives a more detailed explanation of the technique for those interested
 
+import numpy as np
 from PySide6.QtWidgets import (
+    QComboBox,
+    QMessageBox,
     QVBoxLayout,
     QHBoxLayout,
     QLabel,
@@ -10,16 +13,11 @@ from PySide6.QtWidgets import (
     QPushButton,
 )
 
+from analysis.cache import default_cache, source_hash
+from analysis.ghostmaps import ALIGN_BEST, VERSION, align_offsets, ghost_maps, qualities, render
 from tools import ToolWidget
 from viewer import ImageViewer
 
-# ghost necessary imports
-import matplotlib.pyplot as plt
-import math
-import numpy as np
-import cv2
-import os
-
 
 class GhostmapWidget(ToolWidget):
     # tool layout
@@ -28,9 +26,13 @@ class GhostmapWidget(ToolWidget):
 
         # save variables to self
         self.filename = filename
+        self.image = image
+        self.source = source_hash(filename, image)
 
         # store different xy-offsets so user can quickly cycle different maps and inspect changes
         self.ghostmaps = [None] * 64
+        # (x, y) offsets listed in best_combo, strongest ghost first
+        self.best_offsets = []
 
         # prepare user interface - input variables
         # qmin
@@ -65,6 +67,14 @@ class GhostmapWidget(ToolWidget):
         self.process_next_offset_button = QPushButton(self.tr("Next offset"))
         # calculate previous offset ghost maps
         self.process_previous_offset_button = QPushButton(self.tr("Previous offset"))
+        # rank every offset by ghost contrast and list the best ones
+        self.auto_align_button = QPushButton(self.tr("Auto-align"))
+        self.auto_align_button.setToolTip(
+            self.tr("Compare all 64 grid offsets and show those with the strongest ghosts")
+        )
+        self.best_combo = QComboBox()
+        self.best_combo.setToolTip(self.tr("Grid offsets ranked by ghost contrast"))
+        self.best_combo.setEnabled(False)
 
         # combine top layout
         top_layout = QHBoxLayout()
@@ -83,11 +93,12 @@ class GhostmapWidget(ToolWidget):
         top_layout.addWidget(self.yoffset_spin)
         top_layout.addWidget(self.process_previous_offset_button)
         top_layout.addWidget(self.process_next_offset_button)
+        top_layout.addWidget(self.auto_align_button)
+        top_layout.addWidget(self.best_combo)
         top_layout.addStretch()
 
         self.viewer = ImageViewer(image, image, None)
 
-        self.plt = plt
         self.processGhostmaps()
 
         self.process_button.clicked.connect(self.processGhostmaps)
@@ -95,6 +106,8 @@ class GhostmapWidget(ToolWidget):
             self.calculate_previous_offset
         )
         self.process_next_offset_button.clicked.connect(self.calculate_next_offset)
+        self.auto_align_button.clicked.connect(self.auto_align)
+        self.best_combo.activated.connect(self.show_best_offset)
 
         main_layout = QVBoxLayout()
         main_layout.addLayout(top_layout)
@@ -143,17 +156,45 @@ class GhostmapWidget(ToolWidget):
             self.yoffset_spin.setValue(y_offset)
             self.processGhostmaps()
 
+    def auto_align(self):
+        Qmin = self.qmin_spin.value()
+        Qmax = self.qmax_spin.value()
+        Qstep = self.qstep_spin.value()
+        try:
+            ranking = default_cache().memoize(
+                self.source,
+                "ghostmaps.align",
+                VERSION,
+                {"qmin": Qmin, "qmax": Qmax, "qstep": Qstep},
+                lambda: {"ranking": np.array(align_offsets(self.image, Qmin, Qmax, Qstep))},
+            )["ranking"]
+        except ValueError as error:
+            QMessageBox.warning(self, self.tr("Warning"), str(error))
+            return
+        self.best_offsets = [(int(x), int(y)) for _, x, y in ranking[:ALIGN_BEST]]
+        self.best_combo.clear()
+        for contrast, x, y in ranking[:ALIGN_BEST]:
+            self.best_combo.addItem(self.tr(f"X = {int(x)}, Y = {int(y)} (contrast {contrast:.3f})"))
+        self.best_combo.setEnabled(True)
+        self.best_combo.setCurrentIndex(0)
+        self.show_best_offset(0)
+
+    def show_best_offset(self, index):
+        if not 0 <= index < len(self.best_offsets):
+            return
+        x_offset, y_offset = self.best_offsets[index]
+        self.xoffset_spin.setValue(x_offset)
+        self.yoffset_spin.setValue(y_offset)
+        self.processGhostmaps()
+
     # calculate ghost maps function:
     def processGhostmaps(self):
         self.process_button.setEnabled(False)  # wait for processing
-        self.plt.clf()
 
         Qmin = self.qmin_spin.value()
         Qmax = self.qmax_spin.value()
         Qstep = self.qstep_spin.value()
 
-        averagingBlock = 16
-
         shift_x = self.xoffset_spin.value()
         shift_y = self.yoffset_spin.value()
 
@@ -181,122 +222,24 @@ class GhostmapWidget(ToolWidget):
                 self.process_button.setEnabled(True)
                 return
 
-        # load original
-        original = np.double(cv2.imread(self.filename))
-        ydim, xdim, zdim = original.shape
-
-        # construct ghostmaps with possible shift
-        nQ = int((Qmax - Qmin) / Qstep) + 1
-
-        i = 0
-        ghostmap = np.zeros((ydim, xdim, nQ))
-        for quality in range(Qmin, Qmax + 1, Qstep):
-            # Shift the image because:
-            # misalignment of JPEG block lattice may destroy the JPEG ghost since new spatial frequencies will be introduced
-            # by shifting we can search for the correct alignment, if there is one
-            shifted_original = np.roll(original, shift_x, axis=1)
-            shifted_original = np.roll(shifted_original, shift_y, axis=0)
-            # compute difference original and re-compressed versions of original
-            # store recompressed image as variable so we're not writing to disk:
-            tempvar1 = cv2.imencode(
-                ".jpg", shifted_original, [int(cv2.IMWRITE_JPEG_QUALITY), quality]
-            )[1].tobytes()
-            tempcar2 = np.frombuffer(tempvar1, np.byte)
-            tmpResave = np.double(cv2.imdecode(tempcar2, cv2.IMREAD_ANYCOLOR))
-
-            # compute difference and average over RGB
-            for z in range(zdim):
-                ghostmap[:, :, i] += np.square(
-                    shifted_original[:, :, z].astype(np.double) - tmpResave[:, :, z]
-                )
-
-            ghostmap[:, :, i] /= zdim
-            i += 1
-
-        # compute average over larger area to counter complicating factor, as explained in paper
-        blkE = np.zeros(
-            (int((ydim) / averagingBlock), int((xdim) / averagingBlock), nQ)
-        )
-        for c in range(nQ):
-            cy = 0
-            for y in range(0, ydim - averagingBlock, averagingBlock):
-                cx = 0
-                for x in range(0, xdim - averagingBlock, averagingBlock):
-                    bE = ghostmap[y : y + averagingBlock, x : x + averagingBlock, c]
-                    blkE[cy, cx, c] = np.mean(bE)
-                    cx += 1
-                cy += 1
-
-        # normalize difference
-        minval = np.min(blkE, axis=2)
-        maxval = np.max(blkE, axis=2)
-        for c in range(nQ):
-            blkE[:, :, c] = (blkE[:, :, c] - minval) / (maxval - minval)
-
-        # change plotsize (inches)
-        self.plt.figure(figsize=(12, 8))
-
-        if includeoriginal:
-            sp = math.ceil(math.sqrt(nQ + 1))
-            # Plot original image - needs to be normalized first for a subplot & converted to RGB, because cv2 works by default on BGR
-            original_uint8 = cv2.convertScaleAbs(
-                original
-            )  # cv2.cvtColor expects input images to have depth of 8-bit per channel
-            original_rgb = cv2.cvtColor(original_uint8, cv2.COLOR_BGR2RGB)
-            originalRGB_normalized = original_rgb.astype(np.float32) / 255.0
-            self.plt.subplot(sp, sp, 1)
-            self.plt.imshow(originalRGB_normalized)
-            self.plt.title("Original Image")
-            self.plt.axis("off")
-            # add maps:
-            if grayscale:
-                for c in range(nQ):
-                    self.plt.subplot(sp, sp, c + 2)
-                    self.plt.imshow(blkE[:, :, c], cmap="gray", vmin=0, vmax=1)
-                    self.plt.axis("off")
-                    self.plt.title("Quality " + str(Qmin + c * Qstep))
-                    self.plt.draw()
-            else:
-                for c in range(nQ):
-                    self.plt.subplot(sp, sp, c + 2)
-                    self.plt.imshow(blkE[:, :, c], vmin=0, vmax=1)
-                    self.plt.axis("off")
-                    self.plt.title("Quality " + str(Qmin + c * Qstep))
-                    self.plt.draw()
-        else:
-            sp = math.ceil(math.sqrt(nQ))
-            if grayscale:
-                for c in range(nQ):
-                    self.plt.subplot(sp, sp, c + 1)
-                    self.plt.imshow(blkE[:, :, c], cmap="gray", vmin=0, vmax=1)
-                    self.plt.axis("off")
-                    self.plt.title("Quality " + str(Qmin + c * Qstep))
-                    self.plt.draw()
-            else:
-                for c in range(nQ):
-                    self.plt.subplot(sp, sp, c + 1)
-                    self.plt.imshow(blkE[:, :, c], vmin=0, vmax=1)
-                    self.plt.axis("off")
-                    self.plt.title("Quality " + str(Qmin + c * Qstep))
-                    self.plt.draw()
-
-        # Add main title
-        self.plt.suptitle(
-            "Ghost plots for grid offset X = "
-            + str(shift_x)
-            + " and Y = "
-            + str(shift_y)
+        # maps of earlier sessions on the same file are reused from the disk cache
+        maps = default_cache().memoize(
+            self.source,
+            "ghostmaps.maps",
+            VERSION,
+            {"qmin": Qmin, "qmax": Qmax, "qstep": Qstep, "x": shift_x, "y": shift_y},
+            lambda: {"maps": ghost_maps(self.image, Qmin, Qmax, Qstep, shift_x, shift_y)},
+        )["maps"]
+        numpy_ghostplot = render(
+            self.image,
+            maps,
+            qualities(Qmin, Qmax, Qstep),
+            shift_x,
+            shift_y,
+            grayscale,
+            includeoriginal,
         )
 
-        # Save plot directly to a file (temporarily)
-        # Matplotlib deals with RGB images by default and does not provide functionality to switch between RGB and BGR
-        # since sherloq primarily works with BGR, the conversion is made here using cv2 to read to image to a numpy array, BGR format, for further use
-        temp_filename = "temp_ghostplot.png"
-        plt.savefig(temp_filename, dpi=200)  # increase quality plot
-
-        # Load the saved image in a numpy array, BGR format
-        numpy_ghostplot = cv2.imread(temp_filename, cv2.IMREAD_COLOR)
-
         # save plot in memory so no recalculations are needed if user wants to revistit plot
         self.ghostmaps[shift_x + shift_y * 8] = [
             numpy_ghostplot,
@@ -307,11 +250,6 @@ class GhostmapWidget(ToolWidget):
             grayscale,
         ]
 
-        # Remove the temporary file
-        os.remove(temp_filename)
-
         # update viewer with plot:
         self.viewer.update_processed(numpy_ghostplot)
-
-        self.plt.close()  # matplot figures are kept in memory unless closed
         self.process_button.setEnabled(True)  # allow new process to start
@@ -0,0 +1,213 @@
+import os
+import sys
+from time import time
+
+try:
+    import rawpy
+    RAWPY_AVAILABLE = True
+except ImportError:
+    RAWPY_AVAILABLE = False
+
+import cv2 as cv
+import numpy as np
+
+RAW_EXTENSIONS = [
+    "nef", "raf", "cr2", "dng", "arw", "dcr", "mrw", "pef", "crw", "sr2", "orf", "rw2", "raw"
+]
+IMAGE_EXTENSIONS = [
+    "jpg", "jpeg", "jpe", "png", "tif", "tiff", "gif", "bmp", "webp", "ppm", "pgm", "pbm"
+] + RAW_EXTENSIONS
+
+
+def decode_image(filename):
+    """Decode an image file to BGR, returning (image, warnings) or raising ValueError."""
+    warnings = []
+    ext = os.path.splitext(filename)[1][1:].lower()
+    if ext in RAW_EXTENSIONS and RAWPY_AVAILABLE:
+        with rawpy.imread(filename) as raw:
+            image = cv.cvtColor(
+                raw.postprocess(
+                    no_auto_bright=True,
+                    use_camera_wb=True,
+                ),
+                cv.COLOR_RGB2BGR,
+            )
+    elif ext in RAW_EXTENSIONS:
+        raise ValueError(
+            "RAW image support not available. Please install rawpy or convert to JPEG/PNG first."
+        )
+    elif ext == "gif":
+        capture = cv.VideoCapture(filename)
+        frames = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+        if frames > 1:
+            warnings.append("Animated GIF: importing first frame")
+        result, image = capture.read()
+        if not result:
+            raise ValueError("Unable to decode GIF!")
+        if len(image.shape) == 2:
+            image = cv.cvtColor(image, cv.COLOR_GRAY2BGR)
+    else:
+        image = cv.imread(filename, cv.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Unable to load image!")
+    if image.shape[2] > 3:
+        warnings.append("Alpha channel discarded")
+        image = cv.cvtColor(image, cv.COLOR_BGRA2BGR)
+    return image, warnings
+
+
+def pad_image(image, bsize, reflect=False):
+    rows, cols = image.shape[:2]
+    top = left = 0
+    bottom = bsize - rows % bsize
+    right = bsize - cols % bsize
+    border = cv.BORDER_CONSTANT if not reflect else cv.BORDER_REFLECT_101
+    padded = cv.copyMakeBorder(image, top, bottom, left, right, border)
+    return padded
+
+
+def thumbnail(image, size):
+    """Downscale so that the longest side is at most size pixels."""
+    scale = size / max(image.shape[:2])
+    if scale >= 1:
+        return image
+    return cv.resize(image, None, None, scale, scale, cv.INTER_AREA)
+
+
+def shift_image(image, bsize):
+    rows, cols = image.shape[:2]
+    shifted = np.zeros_like(image)
+    shifted[: rows - bsize, : cols - bsize] = image[bsize:, bsize:]
+    return shifted
+
+
+def human_size(total, binary=False, suffix="B"):
+    units = ["", "K", "M", "G", "T", "P", "E", "Z", "Y"]
+    if binary:
+        units = [unit + "i" for unit in units]
+        factor = 1024.0
+    else:
+        factor = 1000.0
+    for unit in units:
+        if abs(total) < factor:
+            return f"{total:3.1f} {unit}{suffix}"
+        total /= factor
+    return f"{total:.1f} {units[-1]}{suffix}"
+
+
+def create_lut(low, high):
+    if low >= 0:
+        p1 = (+low, 0)
+    else:
+        p1 = (0, -low)
+    if high >= 0:
+        p2 = (255 - high, 255)
+    else:
+        p2 = (255, 255 + high)
+    if p1[0] == p2[0]:
+        return np.full(256, 255, np.uint8)
+    lut = [
+        (x * (p1[1] - p2[1]) + p1[0] * p2[1] - p1[1] * p2[0]) / (p1[0] - p2[0])
+        for x in range(256)
+    ]
+    return np.clip(np.array(lut), 0, 255).astype(np.uint8)
+
+
+def compute_hist(image, normalize=False):
+    hist = np.array(
+        [h[0] for h in cv.calcHist([image], [0], None, [256], [0, 256])], int
+    )
+    return hist / image.size if normalize else hist
+
+
+def auto_lut(image, centile):
+    hist = compute_hist(image, normalize=True)
+    if centile == 0:
+        nonzero = np.nonzero(hist)[0]
+        low = nonzero[0]
+        high = nonzero[-1]
+    else:
+        low_sum = high_sum = 0
+        low = 0
+        high = 255
+        for i, h in enumerate(hist):
+            low_sum += h
+            if low_sum >= centile:
+                low = i
+                break
+        for i, h in enumerate(np.flip(hist)):
+            high_sum += h
+            if high_sum >= centile:
+                high = i
+                break
+    return create_lut(low, high)
+
+
+def elapsed_time(start, ms=True):
+    elapsed = time() - start
+    if ms:
+        return f"{int(np.round(elapsed * 1000))} ms"
+    return f"{elapsed:.2f} sec"
+
+
+def signed_value(value):
+    return f"{'+' if value > 0 else ''}{value}"
+
+
+def equalize_img(image):
+    return cv.merge([cv.equalizeHist(c) for c in cv.split(image)])
+
+
+def norm_img(image):
+    return cv.merge([norm_mat(c) for c in cv.split(image)])
+
+
+def clip_value(value, minv=None, maxv=None):
+    if minv is not None:
+        value = max(value, minv)
+    if maxv is not None:
+        value = min(value, maxv)
+    return value
+
+
+def bgr_to_gray3(image):
+    return cv.cvtColor(cv.cvtColor(image, cv.COLOR_BGR2GRAY), cv.COLOR_GRAY2BGR)
+
+
+def gray_to_bgr(image):
+    return cv.cvtColor(image, cv.COLOR_GRAY2BGR)
+
+
+def desaturate(image):
+    return cv.cvtColor(cv.cvtColor(image, cv.COLOR_BGR2GRAY), cv.COLOR_GRAY2BGR)
+
+
+def norm_mat(matrix, to_bgr=False):
+    norm = cv.normalize(matrix, None, 0, 255, cv.NORM_MINMAX).astype(np.uint8)
+    if not to_bgr:
+        return norm
+    return cv.cvtColor(norm, cv.COLOR_GRAY2BGR)
+
+
+def exiftool_exe():
+    if sys.platform.startswith("linux"):
+        return "pyexiftool/exiftool/linux/exiftool"
+    if sys.platform.startswith("win32"):
+        return "pyexiftool/exiftool/windows/exiftool(-k).exe"
+    return None
+
+
+def butter_exe():
+    if sys.platform.startswith("linux"):
+        return "butteraugli/linux/butteraugli"
+    if sys.platform.startswith("win32"):
+        return None
+    return None
+
+
+def ssimul_exe():
+    if sys.platform.startswith("linux"):
+        return "ssimulacra/linux/ssimulacra"
+    if sys.platform.startswith("win32"):
+        return None
+    return None
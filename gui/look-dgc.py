@@ -283,6 +283,8 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'batch_widget') and hasattr(self.batch_widget, 'thread_pool'):
             self.batch_widget.thread_pool.clear()
             self.batch_widget.thread_pool.waitForDone(5000)  # Wait up to 5 seconds
+        # tool widgets stop their own workers when closed
+        self.mdi_area.closeAllSubWindows()
 
         settings = QSettings()
         settings.beginGroup("main_window")
@@ -1,20 +1,18 @@
 from time import time
 
-import cv2 as cv
-import numpy as np
-from PySide6.QtCore import Qt
 from PySide6.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QComboBox,
     QSpinBox,
     QPushButton,
-    QProgressDialog,
     QLabel,
 )
 
+from analysis.context import ImageContext
+from analysis.minmax import minmax_deviation, render, select_channel
 from tools import ToolWidget
-from utility import elapsed_time, norm_mat
+from utility import elapsed_time
 from viewer import ImageViewer
 
 
@@ -54,9 +52,10 @@ class MinMaxWidget(ToolWidget):
         self.filter_spin.setSpecialValueText(self.tr("Off"))
 
         self.image = image
+        # conversions are reused each time a setting changes
+        self.context = ImageContext(image)
         self.viewer = ImageViewer(self.image, self.image)
         self.low = self.high = None
-        self.stopped = False
         self.change()
 
         self.process_button.clicked.connect(self.preprocess)
@@ -81,30 +80,6 @@ class MinMaxWidget(ToolWidget):
         main_layout.addWidget(self.viewer)
         self.setLayout(main_layout)
 
-    @staticmethod
-    def minmax_dev(patch, mask):
-        c = patch[1, 1]
-        minimum, maximum, _, _ = cv.minMaxLoc(patch, mask)
-        if c < minimum:
-            return -1
-        if c > maximum:
-            return +1
-        return 0
-
-    @staticmethod
-    def blk_filter(img, radius):
-        result = np.zeros_like(img, np.float32)
-        rows, cols = result.shape
-        block = 2 * radius + 1
-        for i in range(radius, rows, block):
-            for j in range(radius, cols, block):
-                result[
-                    i - radius : i + radius + 1, j - radius : j + radius + 1
-                ] = np.std(
-                    img[i - radius : i + radius + 1, j - radius : j + radius + 1]
-                )
-        return cv.normalize(result, None, 0, 127, cv.NORM_MINMAX, cv.CV_8UC1)
-
     def change(self):
         self.min_combo.setEnabled(False)
         self.max_combo.setEnabled(False)
@@ -114,44 +89,8 @@ class MinMaxWidget(ToolWidget):
 
     def preprocess(self):
         start = time()
-        channel = self.chan_combo.currentIndex()
-        if channel == 0:
-            img = cv.cvtColor(self.image, cv.COLOR_BGR2GRAY)
-        elif channel == 4:
-            b, g, r = cv.split(self.image.astype(np.float64))
-            img = cv.sqrt(cv.pow(b, 2) + cv.pow(g, 2) + cv.pow(r, 2))
-        else:
-            img = self.image[:, :, 3 - channel]
-        kernel = 3
-        border = kernel // 2
-        shape = (img.shape[0] - kernel + 1, img.shape[1] - kernel + 1, kernel, kernel)
-        strides = 2 * img.strides
-        patches = np.lib.stride_tricks.as_strided(img, shape=shape, strides=strides)
-        patches = patches.reshape((-1, kernel, kernel))
-        mask = np.full((kernel, kernel), 255, dtype=np.uint8)
-        mask[border, border] = 0
-        progress = QProgressDialog(
-            self.tr("Computing deviation..."),
-            self.tr("Cancel"),
-            0,
-            shape[0] * shape[1] - 1,
-            self,
-        )
-        progress.canceled.connect(self.cancel)
-        progress.setWindowModality(Qt.WindowModal)
-        blocks = [0] * shape[0] * shape[1]
-        for i, patch in enumerate(patches):
-            blocks[i] = self.minmax_dev(patch, mask)
-            progress.setValue(i)
-            if self.stopped:
-                self.stopped = False
-                return
-        output = np.array(blocks).reshape(shape[:-2])
-        output = cv.copyMakeBorder(
-            output, border, border, border, border, cv.BORDER_CONSTANT
-        )
-        self.low = output == -1
-        self.high = output == +1
+        img = select_channel(self.context, self.chan_combo.currentIndex())
+        self.low, self.high = minmax_deviation(img)
         self.min_combo.setEnabled(True)
         self.max_combo.setEnabled(True)
         self.filter_spin.setEnabled(True)
@@ -159,46 +98,17 @@ class MinMaxWidget(ToolWidget):
         self.process()
         self.info_message.emit(self.tr(f"Min/Max Deviation = {elapsed_time(start)}"))
 
-    def cancel(self):
-        self.stopped = True
-
     def process(self):
-        minmax = np.zeros_like(self.image)
-        minimum = self.min_combo.currentIndex()
-        maximum = self.max_combo.currentIndex()
+        start = time()
         radius = self.filter_spin.value()
+        minmax = render(
+            self.image,
+            self.low,
+            self.high,
+            self.min_combo.currentIndex(),
+            self.max_combo.currentIndex(),
+            radius,
+        )
         if radius > 0:
-            start = time()
-            radius += 3
-            if minimum < 4:
-                low = self.blk_filter(self.low, radius)
-                if minimum <= 2:
-                    minmax[:, :, 2 - minimum] = low
-                else:
-                    minmax = np.repeat(low[:, :, np.newaxis], 3, axis=2)
-            if maximum < 4:
-                high = self.blk_filter(self.high, radius)
-                if maximum <= 2:
-                    minmax[:, :, 2 - maximum] += high
-                else:
-                    minmax += np.repeat(high[:, :, np.newaxis], 3, axis=2)
-            minmax = norm_mat(minmax)
             self.info_message.emit(self.tr(f"Min/Max Filter = {elapsed_time(start)}"))
-        else:
-            if minimum == 0:
-                minmax[self.low] = [0, 0, 255]
-            elif minimum == 1:
-                minmax[self.low] = [0, 255, 0]
-            elif minimum == 2:
-                minmax[self.low] = [255, 0, 0]
-            elif minimum == 3:
-                minmax[self.low] = [255, 255, 255]
-            if maximum == 0:
-                minmax[self.high] = [0, 0, 255]
-            elif maximum == 1:
-                minmax[self.high] = [0, 255, 0]
-            elif maximum == 2:
-                minmax[self.high] = [255, 0, 0]
-            elif maximum == 3:
-                minmax[self.high] = [255, 255, 255]
         self.viewer.update_processed(minmax)
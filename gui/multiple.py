@@ -4,7 +4,7 @@ from PySide6.QtCore import Qt
 from PySide6.QtGui import QPainter
 from PySide6.QtWidgets import QVBoxLayout, QProgressDialog
 
-from jpeg import compress_jpg
+from analysis.multiple import MAX_Q, compression_loss
 from tools import ToolWidget
 
 
@@ -12,18 +12,15 @@ class MultipleWidget(ToolWidget):
     def __init__(self, image, parent=None):
         super(ToolWidget, self).__init__(parent)
 
-        max_q = 101
         progress = QProgressDialog(
-            self.tr("Computing residuals..."), None, 0, max_q, self
+            self.tr("Computing residuals..."), None, 0, MAX_Q, self
         )
         progress.setWindowModality(Qt.WindowModal)
         loss_series = QLineSeries()
         gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
-        for q in range(max_q):
-            loss = cv.mean(cv.absdiff(compress_jpg(gray, q, color=False), gray))
-            loss_series.append(q, loss[0])
-            progress.setValue(q)
-        progress.setValue(max_q)
+        for q, loss in enumerate(compression_loss(gray, progress.setValue)):
+            loss_series.append(q, loss)
+        progress.setValue(MAX_Q)
 
         loss_chart = QChart()
         loss_chart.legend().hide()
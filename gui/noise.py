@@ -1,6 +1,5 @@
 from time import time
 
-import cv2 as cv
 from PySide6.QtWidgets import (
     QComboBox,
     QHBoxLayout,
@@ -10,8 +9,10 @@ from PySide6.QtWidgets import (
     QSpinBox,
 )
 
+from analysis.context import ImageContext
+from analysis.noise import separate
 from tools import ToolWidget
-from utility import create_lut, elapsed_time, equalize_img
+from utility import elapsed_time
 from viewer import ImageViewer
 
 
@@ -48,6 +49,8 @@ class NoiseWidget(ToolWidget):
         self.denoised_check = QCheckBox(self.tr("Denoised"))
 
         self.image = image
+        # conversions are reused each time a setting changes
+        self.context = ImageContext(image)
         self.viewer = ImageViewer(self.image, self.image)
         self.process()
 
@@ -78,53 +81,19 @@ class NoiseWidget(ToolWidget):
 
     def process(self):
         start = time()
-        grayscale = self.gray_check.isChecked()
-        if grayscale:
-            original = cv.cvtColor(self.image, cv.COLOR_BGR2GRAY)
-        else:
-            original = self.image
-        radius = self.radius_spin.value()
-        kernel = radius * 2 + 1
-        sigma = self.sigma_spin.value()
-        choice = self.mode_combo.currentText()
-        if choice == self.tr("Median"):
-            self.sigma_spin.setEnabled(False)
-            denoised = cv.medianBlur(original, kernel)
-        elif choice == self.tr("Gaussian"):
-            self.sigma_spin.setEnabled(False)
-            denoised = cv.GaussianBlur(original, (kernel, kernel), 0)
-        elif choice == self.tr("BoxBlur"):
-            self.sigma_spin.setEnabled(False)
-            denoised = cv.blur(original, (kernel, kernel))
-        elif choice == self.tr("Bilateral"):
-            self.sigma_spin.setEnabled(True)
-            denoised = cv.bilateralFilter(original, kernel, sigma, sigma)
-        elif choice == self.tr("NonLocal"):
-            if grayscale:
-                denoised = cv.fastNlMeansDenoising(original, None, kernel)
-            else:
-                denoised = cv.fastNlMeansDenoisingColored(
-                    original, None, kernel, kernel
-                )
-        else:
-            denoised = None
-
-        if self.denoised_check.isChecked():
-            self.levels_spin.setEnabled(False)
-            result = denoised
-        else:
-            self.levels_spin.setEnabled(True)
-            noise = cv.absdiff(original, denoised)
-            levels = self.levels_spin.value()
-            if levels == 0:
-                if grayscale:
-                    result = cv.equalizeHist(noise)
-                else:
-                    result = equalize_img(noise)
-            else:
-                result = cv.LUT(noise, create_lut(0, 255 - levels))
-        if grayscale:
-            result = cv.cvtColor(result, cv.COLOR_GRAY2BGR)
+        mode = self.mode_combo.currentIndex()
+        self.sigma_spin.setEnabled(mode == 3)
+        denoised = self.denoised_check.isChecked()
+        self.levels_spin.setEnabled(not denoised)
+        result = separate(
+            self.context,
+            mode,
+            self.radius_spin.value(),
+            self.sigma_spin.value(),
+            self.levels_spin.value(),
+            self.gray_check.isChecked(),
+            denoised,
+        )
         self.viewer.update_processed(result)
         self.info_message.emit(self.tr(f"Noise estimation = {elapsed_time(start)}"))
 
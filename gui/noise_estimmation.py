@@ -9,12 +9,10 @@ noise in the image was the one added by the researchers for testing purposes.
 """
 
 from PySide6.QtWidgets import QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, QPushButton
+from analysis.blocking import noise_map
 from tools import ToolWidget
 from viewer import ImageViewer
 
-#algorithm necessary imports
-import numpy as np
-import pywt
 import cv2
 
 class NoiseWaveletBlockingWidget(ToolWidget):
@@ -59,30 +57,7 @@ class NoiseWaveletBlockingWidget(ToolWidget):
         blocksize = self.blocksize_spin.value()
 
         im = cv2.imread(self.filename, cv2.IMREAD_GRAYSCALE)
-
-        y = np.double(im)
-        #3.1 wavelet transform
-        cA1, (cH, cV, cD) = pywt.dwt2(y, 'db8')
-
-        cD = cD[:cD.shape[0] // blocksize * blocksize, :cD.shape[1] // blocksize * blocksize]
-
-        #3.2 non overlapping blocks
-        block = np.zeros((cD.shape[0] // blocksize, cD.shape[1] // blocksize, blocksize ** 2))
-
-        for ii in range(0, cD.shape[0] - blocksize + 1, blocksize):
-            for jj in range(0, cD.shape[1] - blocksize + 1, blocksize):
-                block_elements = cD[ii:ii+blocksize, jj:jj+blocksize]
-                block[ii // blocksize, jj // blocksize, :] = block_elements.flatten()
-
-        #3.3 noise level estimation
-        noise_map = np.median(np.abs(block), axis=2) / 0.6745
-        #3.4 blocks merging - 
-        #not included, merging results for real images were dissatisfactory, merging works better in lab conditions
-
-        #convert to viewer expectations and update viewer
-        noise_map_8u = cv2.normalize(noise_map, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-        resized_noise_map = cv2.resize(noise_map_8u, (self.image.shape[1], self.image.shape[0]), interpolation=cv2.INTER_NEAREST )
-        noise_map_BGR = cv2.cvtColor(resized_noise_map, cv2.COLOR_GRAY2BGR)
+        noise_map_BGR, _ = noise_map(im, blocksize, self.image.shape)
 
         self.viewer.update_processed(noise_map_BGR)
 
@@ -17,6 +17,7 @@ import tensorflow.compat.v1 as tf
 
 tf.disable_v2_behavior()
 import os.path
+from analysis.models import cached_model
 from .network import FullConvNet
 
 slide = 1024  # 3072
@@ -34,51 +35,56 @@ configSess.gpu_options.allow_growth = True
 # configSess = tf.ConfigProto(gpu_options=tf.GPUOptions(per_process_gpu_memory_fraction=0.95))
 
 
+def load_session(chkpt_fname):
+    sess = tf.Session(config=configSess)
+    saver.restore(sess, chkpt_fname)
+    return sess
+
+
 def genNoiseprint(img, QF=101, model_name="net"):
     if QF > 100:
         QF = 101
     chkpt_fname = chkpt_folder % (model_name, QF)
 
-    with tf.Session(config=configSess) as sess:
-        saver.restore(sess, chkpt_fname)
-
-        if img.shape[0] * img.shape[1] > largeLimit:
-            # print(' %dx%d large %3d' % (img.shape[0], img.shape[1], QF))
-            # for large image the network is executed windows with partial overlapping
-            res = np.zeros((img.shape[0], img.shape[1]), np.float32)
-            for index0 in range(0, img.shape[0], slide):
-                index0start = index0 - overlap
-                index0end = index0 + slide + overlap
+    # one session per checkpoint is restored once and kept by the model registry
+    sess = cached_model(f"noiseprint_{model_name}_jpg{QF}", lambda: load_session(chkpt_fname))
+    if img.shape[0] * img.shape[1] > largeLimit:
+        # print(' %dx%d large %3d' % (img.shape[0], img.shape[1], QF))
+        # for large image the network is executed windows with partial overlapping
+        res = np.zeros((img.shape[0], img.shape[1]), np.float32)
+        for index0 in range(0, img.shape[0], slide):
+            index0start = index0 - overlap
+            index0end = index0 + slide + overlap
 
-                for index1 in range(0, img.shape[1], slide):
-                    index1start = index1 - overlap
-                    index1end = index1 + slide + overlap
-                    clip = img[
-                        max(index0start, 0) : min(index0end, img.shape[0]),
-                        max(index1start, 0) : min(index1end, img.shape[1]),
-                    ]
-                    resB = sess.run(
-                        net.output,
-                        feed_dict={x_data: clip[np.newaxis, :, :, np.newaxis]},
-                    )
-                    resB = np.squeeze(resB)
+            for index1 in range(0, img.shape[1], slide):
+                index1start = index1 - overlap
+                index1end = index1 + slide + overlap
+                clip = img[
+                    max(index0start, 0) : min(index0end, img.shape[0]),
+                    max(index1start, 0) : min(index1end, img.shape[1]),
+                ]
+                resB = sess.run(
+                    net.output,
+                    feed_dict={x_data: clip[np.newaxis, :, :, np.newaxis]},
+                )
+                resB = np.squeeze(resB)
 
-                    if index0 > 0:
-                        resB = resB[overlap:, :]
-                    if index1 > 0:
-                        resB = resB[:, overlap:]
-                    resB = resB[
-                        : min(slide, resB.shape[0]), : min(slide, resB.shape[1])
-                    ]
+                if index0 > 0:
+                    resB = resB[overlap:, :]
+                if index1 > 0:
+                    resB = resB[:, overlap:]
+                resB = resB[
+                    : min(slide, resB.shape[0]), : min(slide, resB.shape[1])
+                ]
 
-                    res[
-                        index0 : min(index0 + slide, res.shape[0]),
-                        index1 : min(index1 + slide, res.shape[1]),
-                    ] = resB
-        else:
-            # print(' %dx%d small %3d' % (img.shape[0], img.shape[1], QF))
-            res = sess.run(
-                net.output, feed_dict={x_data: img[np.newaxis, :, :, np.newaxis]}
-            )
-            res = np.squeeze(res)
+                res[
+                    index0 : min(index0 + slide, res.shape[0]),
+                    index1 : min(index1 + slide, res.shape[1]),
+                ] = resB
+    else:
+        # print(' %dx%d small %3d' % (img.shape[0], img.shape[1], QF))
+        res = sess.run(
+            net.output, feed_dict={x_data: img[np.newaxis, :, :, np.newaxis]}
+        )
+        res = np.squeeze(res)
     return res
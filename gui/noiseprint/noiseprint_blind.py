@@ -13,7 +13,6 @@
 """
 
 import numpy as np
-from .noiseprint import genNoiseprint
 from .post_em import EMgu_img, getSpamFromNoiseprint
 from .utility.utilityRead import resizeMapWithPadding
 from .utility.utilityRead import imread2f
@@ -40,6 +39,9 @@ def noiseprint_blind_file(filename, model_name="net"):
 
 
 def noiseprint_blind(img, QF, model_name="net"):
+    # imported here, the post-processing below does not need TensorFlow
+    from .noiseprint import genNoiseprint
+
     res = genNoiseprint(img, QF, model_name)
     assert img.shape == res.shape
     return noiseprint_blind_post(res, img)
@@ -1,11 +1,7 @@
-import subprocess
-from shutil import copyfile
-
 import cv2 as cv
 import numpy as np
-from PySide6.QtCore import QTemporaryFile, Qt
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QColor, QBrush
-from joblib import load
 from PySide6.QtWidgets import (
     QLabel,
     QVBoxLayout,
@@ -18,9 +14,11 @@ from PySide6.QtWidgets import (
 from matplotlib.backends.backend_qtagg import FigureCanvas
 from matplotlib.figure import Figure
 
-from jpeg import TABLE_SIZE, ZIG_ZAG, DCT_SIZE, get_tables, loss_curve
+from analysis.models import model_path
+from analysis.quality import curve_minimum, lossless_quality, read_tables, table_quality
+from jpeg import DCT_SIZE, loss_curve
 from tools import ToolWidget
-from utility import modify_font, exiftool_exe, clip_value
+from utility import modify_font, clip_value
 
 
 class QualityWidget(ToolWidget):
@@ -29,10 +27,7 @@ class QualityWidget(ToolWidget):
 
         x = np.arange(1, 101)
         y = loss_curve(image)
-        tail = 5
-        qm = np.argmin(y[:-tail]) + 1
-        if qm == 100 - tail:
-            qm = 100
+        qm = curve_minimum(y)
 
         figure = Figure()
         canvas = FigureCanvas(figure)
@@ -55,89 +50,13 @@ class QualityWidget(ToolWidget):
         main_layout = QVBoxLayout()
         main_layout.addWidget(canvas)
 
-        MRK = b"\xFF"
-        SOI = b"\xD8"
-        DQT = b"\xDB"
-        # DHT = b'\xC4'
-        MSK = b"\x0F"
-        PAD = b"\x00"
-
-        MAX_TABLES = 2
-        LEN_OFFSET = 2
-        LUMA_IDX = 0
-        CHROMA_IDX = 1
-
-        luma = np.zeros((DCT_SIZE, DCT_SIZE), dtype=int)
-        chroma = np.zeros((DCT_SIZE, DCT_SIZE), dtype=int)
-        temp_file = QTemporaryFile()
         try:
-            if temp_file.open():
-                copyfile(filename, temp_file.fileName())
-                exiftool_path = exiftool_exe()
-                if exiftool_path and os.path.exists(exiftool_path):
-                    subprocess.run(
-                        [
-                            exiftool_path,
-                            "-all=",
-                            "-overwrite_original",
-                            temp_file.fileName(),
-                        ],
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL,
-                    )
-                found = False
-                with open(temp_file.fileName(), "rb") as file:
-                    first = file.read(1)
-                    if first not in [MRK, SOI]:
-                        raise ValueError(self.tr("File is not a JPEG image!"))
-                    while True:
-                        if not self.find_next(file, [MRK, DQT, PAD]):
-                            break
-                        length = file.read(1)[0] - LEN_OFFSET
-                        if length <= 0 or length % (TABLE_SIZE + 1) != 0:
-                            continue
-                        while length > 0:
-                            mode = file.read(1)
-                            if not mode:
-                                break
-                            index = mode[0] & MSK[0]
-                            if index >= MAX_TABLES:
-                                break
-                            length -= 1
-                            for k in range(TABLE_SIZE):
-                                b = file.read(1)[0]
-                                if not b:
-                                    break
-                                length -= 1
-                                i, j = ZIG_ZAG[k]
-                                if index == LUMA_IDX:
-                                    luma[i, j] = b
-                                elif index == CHROMA_IDX:
-                                    chroma[i, j] = b
-                            else:
-                                found = True
-            if not found:
-                raise ValueError(self.tr("Unable to find JPEG tables!"))
-
-            levels = [
-                (1 - (np.mean(t.ravel()[1:]) - 1) / 254) * 100 for t in [luma, chroma]
-            ]
-            distance = np.zeros(101)
-            for qm in range(101):
-                lu, ch = cv.split(get_tables(qm))
-                lu_diff = np.mean(cv.absdiff(luma, lu))
-                ch_diff = np.mean(cv.absdiff(chroma, ch))
-                distance[qm] = (lu_diff + 2 * ch_diff) / 3
-            closest = np.argmin(distance)
-            deviation = distance[closest]
+            luma, chroma = read_tables(filename)
+            quality, deviation, levels = table_quality(luma, chroma)
             if deviation == 0:
-                quality = closest
                 message = "(standard tables)"
             else:
-                quality = int(np.round(closest - deviation))
                 message = f"(deviation from standard tables --> {deviation:.4f})"
-            if quality == 0:
-                quality = 1
             quality_label = QLabel(
                 self.tr(f"[JPEG FORMAT] Last saved quality: {quality}% {message}")
             )
@@ -168,17 +87,11 @@ class QualityWidget(ToolWidget):
             main_layout.addLayout(table_layout)
 
         except ValueError:
-            modelfile = "models/jpeg_qf.mdl"
+            modelfile = model_path("jpeg_qf.mdl")
             try:
-                model = load(modelfile)
-                limit = (
-                    model.best_ntree_limit
-                    if hasattr(model, "best_ntree_limit")
-                    else None
-                )
+                qp = lossless_quality(y)
                 # f = self.get_features(image)
                 # p = model.predict_proba(f, ntree_limit=limit)[0, 0]
-                qp = model.predict(np.reshape(y, (1, len(y))), ntree_limit=limit)[0]
                 # if p > 0.5:
                 #     p = 2 * (p - 0.5) * 100
                 #     output = self.tr('Uncompressed image (p = {:.2f}%)'.format(p))
@@ -217,18 +130,6 @@ class QualityWidget(ToolWidget):
         c = loss_curve(image, q)
         return np.reshape(c, (1, len(q)))
 
-    @staticmethod
-    def find_next(file, markers):
-        while True:
-            for m in markers:
-                b = file.read(1)
-                if not b:
-                    return False
-                if b != m:
-                    break
-            else:
-                return True
-
     @staticmethod
     def create_table(matrix):
         table_widget = QTableWidget(DCT_SIZE, DCT_SIZE)
@@ -11,6 +11,8 @@ import numpy as np
 from PIL import Image as PILImage
 import io
 
+from imaging import decode_image, thumbnail
+
 class PDFReportGenerator:
     def __init__(self, filename, image_path, image_data):
         self.filename = filename
@@ -214,10 +216,10 @@ def generate_batch_pdf_report(title, images_data, batch_results, output_path):
     for basename, image in images_data:
         story.append(Paragraph(f"Image: {basename}", heading_style))
         # Add thumbnail
-        if isinstance(image, np.ndarray):
-            pil_img = PILImage.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        else:
-            pil_img = PILImage.open(basename)
+        if not isinstance(image, np.ndarray):
+            # batch runs pass filenames, decode one image at a time
+            image = thumbnail(decode_image(image)[0], 200)
+        pil_img = PILImage.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
         pil_img.thumbnail((200, 200), PILImage.LANCZOS)
         img_buffer = io.BytesIO()
         pil_img.save(img_buffer, format='PNG')
@@ -2,9 +2,14 @@
 # "Exposing Digital Forgeries by Detecting Traces of Re-sampling" by Hany Farid & Alin C. Popescu
 # The book "Photo Forensics" by Hany Farid gives a more detailed explanation of the technique for those interested
 
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import get_context
+
 from PySide6.QtWidgets import (
     QWidget,
     QDoubleSpinBox,
+    QHBoxLayout,
+    QSpinBox,
     QVBoxLayout,
     QSlider,
     QLabel,
@@ -14,7 +19,15 @@ from PySide6.QtWidgets import (
     QSizePolicy,
     QScrollArea,
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QThread, Signal
+from analysis.executor import default_jobs
+from analysis.resampling import (
+    FIXED,
+    fourier_map,
+    normalize_gray,
+    probability_map,
+    tile_regions,
+)
 from tools import ToolWidget
 
 # resampling necessary imports
@@ -31,6 +44,56 @@ from matplotlib.backend_bases import MouseButton
 from matplotlib.figure import Figure
 from utility import modify_font
 
+# memory for probability and fourier maps kept for reuse
+MAP_CACHE_BYTES = 512 * 2 ** 20
+
+
+def remember(cache, key, value):
+    """Store value in cache, dropping the least recently stored maps beyond the size limit."""
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > 1 and sum(v.nbytes for v in cache.values()) > MAP_CACHE_BYTES:
+        del cache[next(iter(cache))]
+
+
+class RegionWorker(QThread):
+    """Apply function to (index, arguments) jobs in a pool, reporting each result as it finishes."""
+
+    done = Signal(int, object)
+    error = Signal(str)
+
+    def __init__(self, function, jobs, processes=True):
+        super().__init__()
+        self.function = function
+        self.jobs = jobs
+        self.processes = processes
+        self.cancelled = False
+        self.joined = False
+
+    def cancel(self, join=False):
+        """Stop handing out regions, with join the regions already running are awaited too."""
+        self.joined = join
+        self.cancelled = True
+
+    def run(self):
+        workers = min(default_jobs(), len(self.jobs))
+        if self.processes:
+            # spawn avoids forking a process that is running Qt threads
+            pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+        else:
+            pool = ThreadPoolExecutor(workers)
+        futures = {pool.submit(self.function, *args): i for i, args in self.jobs}
+        pending = set(futures)
+        while pending and not self.cancelled:
+            finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    self.done.emit(futures[future], future.result())
+                except Exception as e:
+                    self.error.emit(str(e))
+        # regions already running finish in the background unless joined, their results are dropped
+        pool.shutdown(wait=self.joined or not self.cancelled, cancel_futures=True)
+
 
 class ResamplingWidget(ToolWidget):
     # tool layout
@@ -50,8 +113,7 @@ class ResamplingWidget(ToolWidget):
             main_layout.addWidget(error_label)
             self.setLayout(main_layout)
             return
-        self.imagegray = self.imagegray - self.imagegray.min()
-        self.imagegray = self.imagegray / self.imagegray.max()
+        self.imagegray = normalize_gray(self.imagegray)
 
         self.imagegray_nomalized_copy = self.imagegray.copy()
         self.imagegray_copy_for_probabilitymaps = self.imagegray.copy()
@@ -60,7 +122,14 @@ class ResamplingWidget(ToolWidget):
         self.selected_points_probability = []
         self.selected_points_fourier = []
         self.probability_maps = []
+        self.probability_regions = []
+        self.probability_keys = []
         self.fourier_maps = []
+        self.fourier_keys = []
+        # computed maps by region and predictor, spectra by map and fourier options
+        self.probability_cache = {}
+        self.fourier_cache = {}
+        self.worker = None
         self.original_sizes_widgets = {}
 
         # prepare user interface
@@ -74,14 +143,28 @@ class ResamplingWidget(ToolWidget):
         self.filter_3x3_Check.setChecked(True)
         self.filter_5x5_Check = QCheckBox(self.tr("5x5 probability filter"))
         self.filter_5x5_Check.setChecked(False)
+        # fixed linear predictor, a quick screening without expectation maximization
+        self.filter_fixed_Check = QCheckBox(self.tr("Fixed predictor (fast)"))
+        self.filter_fixed_Check.setChecked(False)
 
         # bind toggle
-        self.filter_3x3_Check.clicked.connect(
-            lambda: self.filter_5x5_Check.setChecked(False)
-        )
-        self.filter_5x5_Check.clicked.connect(
-            lambda: self.filter_3x3_Check.setChecked(False)
-        )
+        for check in self.filter_checks():
+            check.clicked.connect(lambda _, check=check: self.select_filter(check))
+
+        # whole image split into tiles, each with its own probability map
+        self.tile_check = QCheckBox(self.tr("Tile whole image"))
+        self.tile_check.setChecked(False)
+        self.tile_spin = QSpinBox()
+        self.tile_spin.setRange(64, 4096)
+        self.tile_spin.setSingleStep(64)
+        self.tile_spin.setValue(512)
+        self.tile_spin.setSuffix(self.tr(" px"))
+
+        # regions are processed in the background and can be stopped
+        self.cancel_button = QPushButton(self.tr("Cancel"))
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel)
+        self.status_label = QLabel()
 
         # pointpicker probability
         self.probability_check = QCheckBox(self.tr("Probability Windows"))
@@ -96,8 +179,7 @@ class ResamplingWidget(ToolWidget):
         top_layout.addWidget(
             QLabel(
                 self.tr(
-                    "A resampling analysis is computationally expensive and for a\n"
-                    + "high resoluion image (1280x720 pixels), it can take a few minutes to process.\n"
+                    "A resampling analysis of a whole high resolution image can take several seconds.\n"
                     + "It is more efficient and more effective to calculate the probability map for only the suspected area.\n"
                     + "This is because a small resampled area is more readily "
                     + "detected when the larger image is not considered by the algorithm."
@@ -111,6 +193,7 @@ class ResamplingWidget(ToolWidget):
             QLabel(
                 self.tr(
                     "A 5x5 probability filter might be able to uncover more complex interpolation algorithms, but the computing time for the probability maps increases significantly.\n"
+                    + "The fixed predictor computes a map in a single pass, use it to screen images and the filters to examine suspicious areas.\n"
                     + "Left mouse button: choose location to construct area of interest\n"
                     + "Right mouse button: delete last location."
                 )
@@ -122,7 +205,8 @@ class ResamplingWidget(ToolWidget):
         top_layout.addWidget(
             QLabel(
                 self.tr(
-                    "If no area of interest is chosen for probability, the probability map for the entire image will be calculated.\n"
+                    "If no area of interest is chosen for probability, the probability map for the entire image will be calculated,\n"
+                    + "or one map for each tile when 'Tile whole image' is checked. Areas are processed in parallel.\n"
                     + "Fourier maps will automatically be calculated for each area of interest by the probability map + for smaller sub windows applied when 'Fourier Windows' is checked.\n"
                     "Please make sure areas do not overlap for probability maps!"
                 )
@@ -137,10 +221,18 @@ class ResamplingWidget(ToolWidget):
         checkbox_layout = QVBoxLayout()
         checkbox_layout.addWidget(self.filter_3x3_Check)
         checkbox_layout.addWidget(self.filter_5x5_Check)
+        checkbox_layout.addWidget(self.filter_fixed_Check)
         top_layout.addLayout(checkbox_layout, 1, 1)
 
+        tile_layout = QHBoxLayout()
+        tile_layout.addWidget(self.tile_check)
+        tile_layout.addWidget(self.tile_spin)
+        top_layout.addLayout(tile_layout, 1, 2)
+
         top_layout.addWidget(self.calculate_probability_button, 2, 1)
         top_layout.addWidget(self.calculate_fourier_button, 2, 2)
+        top_layout.addWidget(self.cancel_button, 3, 1)
+        top_layout.addWidget(self.status_label, 3, 2)
 
         # fourier maps construction parameters
         four_parameters_layout = QGridLayout()
@@ -185,6 +277,19 @@ class ResamplingWidget(ToolWidget):
         self.rescale_check = QCheckBox(self.tr("Rescale Spectrum"))
         self.rescale_check.setChecked(True)
 
+        # fourier maps already shown are updated when an option changes
+        for check in [
+            self.hanning_check,
+            self.rotationally_invariant_window_check,
+            self.upsample_check,
+            self.center_four_check,
+            self.simple_highpass_check,
+            self.complex_highpass_check,
+            self.rescale_check,
+        ]:
+            check.clicked.connect(self.update_fourier_maps)
+        self.gamma_spin.valueChanged.connect(self.update_fourier_maps)
+
         # assemble four parameters
         four_parameters_layout.addWidget(self.hanning_check, 0, 0)
         four_parameters_layout.addWidget(self.rotationally_invariant_window_check, 1, 0)
@@ -284,134 +389,91 @@ class ResamplingWidget(ToolWidget):
                 new_height = original_size.height() * zoom_factor
                 child_widget.setFixedSize(new_width, new_height)
 
+    def filter_checks(self):
+        return [self.filter_3x3_Check, self.filter_5x5_Check, self.filter_fixed_Check]
+
+    def select_filter(self, selected):
+        for check in self.filter_checks():
+            if check is not selected:
+                check.setChecked(False)
+
     def calculate_probability_maps(self):
-        # to do, if probability maps already calculated, do not calculate again;
-        # until then, make fourier maps empty before calculating again:
-        self.probability_maps = []
         self.imagegray_copy_for_probabilitymaps = self.imagegray_nomalized_copy.copy()
-        self.calculate_probability_button.setEnabled(False)  # wait for processing
-
-        if len(self.selected_points_probability) == 0:
-            if self.filter_5x5_Check.isChecked():
-                processed_part = self.calculate_probability_map_5x5(
-                    self.imagegray_nomalized_copy
-                )
+        points = self.selected_points_probability
+        if points:
+            self.probability_regions = [
+                self.sorted_region(points[i], points[i + 1])
+                for i in range(0, len(points) - 1, 2)
+            ]
+        elif self.tile_check.isChecked():
+            self.probability_regions = tile_regions(
+                self.imagegray_nomalized_copy.shape, self.tile_spin.value()
+            )
+        else:
+            # None stands for the entire image
+            self.probability_regions = [None]
+        if self.filter_fixed_Check.isChecked():
+            predictor = FIXED
+        else:
+            predictor = 5 if self.filter_5x5_Check.isChecked() else 3
+        self.probability_keys = [(region, predictor) for region in self.probability_regions]
+        self.probability_maps = [None] * len(self.probability_regions)
+        jobs = []
+        for i, (region, _) in enumerate(self.probability_keys):
+            if (region, predictor) in self.probability_cache:
+                self.probability_done(i, self.probability_cache[region, predictor])
             else:
-                processed_part = self.calculate_probability_map_3x3(
-                    self.imagegray_nomalized_copy
-                )
-
-            self.probability_maps.append(processed_part)
+                crop = self.region_crop(self.imagegray_nomalized_copy, region)
+                jobs.append((i, (crop, predictor)))
+        self.start_worker(probability_map, jobs, self.probability_done)
+
+    def probability_done(self, index, processed_part):
+        self.probability_maps[index] = processed_part
+        remember(self.probability_cache, self.probability_keys[index], processed_part)
+        region = self.probability_regions[index]
+        if region is None:
             self.imagegray_copy_for_probabilitymaps = processed_part
         else:
-            for i in range(0, len(self.selected_points_probability), 2):
-                if i + 1 < len(self.selected_points_probability):
-                    (x1, y1) = self.selected_points_probability[i]
-                    (x2, y2) = self.selected_points_probability[i + 1]
-                    if self.filter_5x5_Check.isChecked():
-                        processed_part = self.calculate_probability_map_5x5(
-                            self.imagegray_nomalized_copy[
-                                min(y1, y2) : max(y1, y2) + 1,
-                                min(x1, x2) : max(x1, x2) + 1,
-                            ]
-                        )
-                        self.probability_maps.append(processed_part)
-                        self.imagegray_copy_for_probabilitymaps[
-                            min(y1, y2) + 2 : max(y1, y2) - 1,
-                            min(x1, x2) + 2 : max(x1, x2) - 1,
-                        ] = processed_part
-                    else:
-                        processed_part = self.calculate_probability_map_3x3(
-                            self.imagegray_nomalized_copy[
-                                min(y1, y2) : max(y1, y2) + 1,
-                                min(x1, x2) : max(x1, x2) + 1,
-                            ]
-                        )
-                        self.probability_maps.append(processed_part)
-                        self.imagegray_copy_for_probabilitymaps[
-                            min(y1, y2) + 1 : max(y1, y2), min(x1, x2) + 1 : max(x1, x2)
-                        ] = processed_part
+            # the map lacks a border as wide as the predictor radius
+            x1, y1, x2, y2 = region
+            border = (y2 + 1 - y1 - processed_part.shape[0]) // 2
+            self.imagegray_copy_for_probabilitymaps[
+                y1 + border : y2 + 1 - border, x1 + border : x2 + 1 - border
+            ] = processed_part
 
         # update content instead of using imshow again
         self.probability_image_canvas_object.set_data(
             self.imagegray_copy_for_probabilitymaps
         )
-        self.axes.figure.canvas.draw()
-        self.calculate_probability_button.setEnabled(True)
-
-    def calculate_probability_map_3x3(self, process_part):
-        a = np.random.rand(8)
-        a = a / a.sum()
-        s = 0.005
-        d = 0.1
-        F, f = self.build_matrices_for_processing_3x3(process_part)
-        c = 0
-        w = np.zeros(F.shape[0])
-
-        while c < 100:
-            s2 = 0
-            k = 0
-
-            for y in range(1, process_part.shape[0] - 1):
-                for x in range(1, process_part.shape[1] - 1):
-                    r = self.compute_residual_3x3(a, process_part, x, y)
-                    g = np.exp(-(r ** 2) / s)
-                    w[k] = g / (g + d)
-                    s2 = s2 + w[k] * r ** 2
-                    k = k + 1
-
-            s = s2 / w.sum()
-            a2 = np.linalg.inv(F.T * w * w @ F) @ F.T * w * w @ f
-
-            if np.linalg.norm(a - a2) < 0.01:
-                break
-            else:
-                a = a2
-                c = c + 1
-
-        return w.reshape(process_part.shape[0] - 2, process_part.shape[1] - 2)
-
-    def calculate_probability_map_5x5(self, process_part):
-        a = np.random.rand(24)
-        a = a / a.sum()
-        s = 0.005
-        d = 0.1
-        F, f = self.build_matrices_for_processing_5x5(process_part)
-        c = 0
-        w = np.zeros(F.shape[0])
-
-        while c < 100:
-            s2 = 0
-            k = 0
-
-            for y in range(2, process_part.shape[0] - 2):
-                for x in range(2, process_part.shape[1] - 2):
-                    r = self.compute_residual_5x5(a, process_part, x, y)
-                    g = np.exp(-(r ** 2) / s)
-                    w[k] = g / (g + d)
-                    s2 = s2 + w[k] * r ** 2
-                    k = k + 1
-
-            s = s2 / w.sum()
-            a2 = np.linalg.inv(F.T * w * w @ F) @ F.T * w * w @ f
-
-            if np.linalg.norm(a - a2) < 0.01:
-                break
-            else:
-                a = a2
-                c = c + 1
-
-        return w.reshape(process_part.shape[0] - 4, process_part.shape[1] - 4)
+        self.axes.figure.canvas.draw_idle()
 
     def calculate_fourier_maps(self):
-        # to do, if fouriermap already calculated, do not calculate again
-        # until then, make fourier maps empty before calculating again:
-        self.fourier_maps = []
-        self.calculate_fourier_button.setEnabled(False)  # wait for processing
+        options = self.fourier_options()
+        if options is None:
+            return
 
-        num_plots = int(len(self.selected_points_fourier) / 2) + len(
-            self.probability_maps
-        )
+        # left column of the plot, map to transform and its key for each row
+        plots = []
+        for key, prob_map in zip(self.probability_keys, self.probability_maps):
+            region = key[0]
+            if region is None:
+                plots.append((prob_map, prob_map, key))
+            else:
+                plots.append((self.outlined(region), prob_map, key))
+        points = self.selected_points_fourier
+        # windows are cut from the image showing the current probability maps
+        shown = tuple(self.probability_keys)
+        for j in range(0, len(points) - 1, 2):
+            region = self.sorted_region(points[j], points[j + 1])
+            plots.append(
+                (
+                    self.outlined(region),
+                    self.region_crop(self.imagegray_copy_for_probabilitymaps, region),
+                    ("window", region, shown),
+                )
+            )
+
+        num_plots = len(plots)
         self.canvas_fourier_maps.figure.clf()
         if num_plots > 1:
             self.axes_fourier_maps = self.canvas_fourier_maps.figure.subplots(
@@ -426,254 +488,134 @@ class ResamplingWidget(ToolWidget):
                     ]
                 ]
             )
-
-        i = 0
-        counter_selected_prob_points = 0
-        for prob_map in self.probability_maps:
-            if (
-                len(self.probability_maps) == 1
-                and len(self.selected_points_probability) == 0
-            ):
-                self.fourier_maps.append(self.calculate_fourier_map(prob_map))
-                self.axes_fourier_maps[i, 0].imshow(
-                    prob_map, cmap="gray", vmin=0, vmax=1
-                )
-                self.axes_fourier_maps[i, 0].axis("off")
-                self.axes_fourier_maps[i, 1].imshow(
-                    self.fourier_maps[i], cmap="gray", vmin=0, vmax=1
-                )
-                self.axes_fourier_maps[i, 1].axis("off")
-                i = i + 1
-            else:
-                (x1, y1) = self.selected_points_probability[
-                    counter_selected_prob_points
-                ]
-                (x2, y2) = self.selected_points_probability[
-                    counter_selected_prob_points + 1
-                ]
-                self.fourier_maps.append(self.calculate_fourier_map(prob_map))
-                self.userfourplot = self.imagegray_copy_for_probabilitymaps.copy()
-                self.userfourplot[
-                    min(y1, y2) : max(y1, y2) + 1,
-                    [
-                        x1,
-                        (x1 + 1),
-                        (x1 - 1),
-                        (x1 - 2),
-                        (x1 + 2),
-                        x2,
-                        (x2 + 1),
-                        (x2 - 1),
-                        (x2 - 2),
-                        (x2 + 2),
-                    ],
-                ] = 0  # y-stripes
-                self.userfourplot[
-                    [
-                        y1,
-                        (y1 - 1),
-                        (y1 + 1),
-                        (y1 - 2),
-                        (y1 + 2),
-                        y2,
-                        (y2 - 1),
-                        (y2 + 1),
-                        (y2 - 2),
-                        (y2 + 2),
-                    ],
-                    min(x1, x2) : max(x1, x2) + 1,
-                ] = 0  # x-stripes
-                self.axes_fourier_maps[i, 0].imshow(
-                    self.userfourplot, cmap="gray", vmin=0, vmax=1
-                )
-                self.axes_fourier_maps[i, 0].axis("off")
-                self.axes_fourier_maps[i, 1].imshow(
-                    self.fourier_maps[i], cmap="gray", vmin=0, vmax=1
-                )
-                self.axes_fourier_maps[i, 1].axis("off")
-                i = i + 1
-                counter_selected_prob_points = counter_selected_prob_points + 2
-        for j in range(0, len(self.selected_points_fourier), 2):
-            if j + 1 < len(self.selected_points_fourier):
-                (x1, y1) = self.selected_points_fourier[j]
-                (x2, y2) = self.selected_points_fourier[j + 1]
-
-                processed_part = self.calculate_fourier_map(
-                    self.imagegray_copy_for_probabilitymaps[
-                        min(y1, y2) : max(y1, y2) + 1, min(x1, x2) : max(x1, x2) + 1
-                    ]
-                )
-                self.fourier_maps.append(processed_part)
-                self.userfourplot = self.imagegray_copy_for_probabilitymaps.copy()
-                self.userfourplot[
-                    min(y1, y2) : max(y1, y2) + 1,
-                    [
-                        x1,
-                        (x1 + 1),
-                        (x1 - 1),
-                        (x1 - 2),
-                        (x1 + 2),
-                        x2,
-                        (x2 + 1),
-                        (x2 - 1),
-                        (x2 - 2),
-                        (x2 + 2),
-                    ],
-                ] = 0  # y-stripes
-                self.userfourplot[
-                    [
-                        y1,
-                        (y1 - 1),
-                        (y1 + 1),
-                        (y1 - 2),
-                        (y1 + 2),
-                        y2,
-                        (y2 - 1),
-                        (y2 + 1),
-                        (y2 - 2),
-                        (y2 + 2),
-                    ],
-                    min(x1, x2) : max(x1, x2) + 1,
-                ] = 0  # x-stripes
-                self.axes_fourier_maps[i, 0].imshow(
-                    self.userfourplot, cmap="gray", vmin=0, vmax=1
-                )
-                self.axes_fourier_maps[i, 0].axis("off")
-                self.axes_fourier_maps[i, 1].imshow(
-                    self.fourier_maps[i], cmap="gray", vmin=0, vmax=1
-                )
-                self.axes_fourier_maps[i, 1].axis("off")
-                i = i + 1
+        for i, (image, _, _) in enumerate(plots):
+            self.axes_fourier_maps[i, 0].imshow(image, cmap="gray", vmin=0, vmax=1)
+            self.axes_fourier_maps[i, 0].axis("off")
+            self.axes_fourier_maps[i, 1].axis("off")
 
         self.figure_four.subplots_adjust(
             left=0.05, right=0.95, top=0.95, bottom=0.05, wspace=0.05, hspace=0.05
         )
-
         self.canvas_fourier_maps.figure.canvas.draw()
-        self.calculate_fourier_button.setEnabled(True)
 
-    def make_rotational_invariant_window(self, shape):
-        rows, cols = shape
-        W = np.zeros((rows, cols))
-        center_x, center_y = rows // 2, cols // 2
-        max_radius = np.sqrt(center_x ** 2 + center_y ** 2)
-        for i in range(rows):
-            for j in range(cols):
-                r = (
-                    np.sqrt((i - center_x) ** 2 + (j - center_y) ** 2)
-                    / max_radius
-                    * np.sqrt(2)
-                )
-                if r < 3 / 4:
-                    W[i, j] = 1
-                elif r <= np.sqrt(2):
-                    W[i, j] = 0.5 + 0.5 * np.cos(
-                        np.pi * (r - 3 / 4) / (np.sqrt(2) - 3 / 4)
-                    )
-
-        return W
-
-    def make_high_pass_filter(self, shape):
-        rows, cols = shape
-        H = np.zeros((rows, cols))
-        center_x, center_y = rows // 2, cols // 2
-        max_radius = np.sqrt(center_x ** 2 + center_y ** 2)
-        for i in range(rows):
-            for j in range(cols):
-                r = (
-                    np.sqrt((i - center_x) ** 2 + (j - center_y) ** 2)
-                    / max_radius
-                    * np.sqrt(2)
-                )
-                if r <= np.sqrt(2):
-                    H[i, j] = 0.5 - 0.5 * np.cos(np.pi * r / np.sqrt(2))
-
-        return H
-
-    def calculate_fourier_map(self, process_prob_map):
-        # take center square portion of probability map, this will make analysis easier and more consistent
-        x, y = process_prob_map.shape
-        size = min(x, y)
-        half_size = size // 2
-        center_x, center_y = x // 2, y // 2
-        square_prob_map = process_prob_map[
-            center_x - half_size : center_x + half_size,
-            center_y - half_size : center_y + half_size,
-        ]
-
-        # apply pre-processing window
+        self.fourier_keys = [(key, options) for _, _, key in plots]
+        self.fourier_maps = [None] * num_plots
+        jobs = []
+        for i, (_, prob_map, _) in enumerate(plots):
+            if self.fourier_keys[i] in self.fourier_cache:
+                self.fourier_done(i, self.fourier_cache[self.fourier_keys[i]])
+            else:
+                jobs.append((i, (prob_map, *options)))
+        # spectra are quick, threads avoid starting processes and share the cached masks
+        self.start_worker(fourier_map, jobs, self.fourier_done, processes=False)
+
+    def fourier_done(self, index, spectrum):
+        self.fourier_maps[index] = spectrum
+        remember(self.fourier_cache, self.fourier_keys[index], spectrum)
+        self.axes_fourier_maps[index, 1].imshow(spectrum, cmap="gray", vmin=0, vmax=1)
+        self.canvas_fourier_maps.figure.canvas.draw_idle()
+
+    def fourier_options(self):
         if self.hanning_check.isChecked():
-            # Apply Hanning window
-            hanning_window = np.hanning(square_prob_map.shape[0])[:, None] * np.hanning(
-                square_prob_map.shape[1]
-            )
-            windowed_prob_map = square_prob_map * hanning_window
+            window = "hanning"
         elif self.rotationally_invariant_window_check.isChecked():
-            # apply rot. invariant window
-            W = self.make_rotational_invariant_window(square_prob_map.shape)
-            windowed_prob_map = square_prob_map * W
-        else:
-            # if none is checked, return
-            return
-
-        if self.upsample_check.isChecked():
-            upsampled = cv2.pyrUp(windowed_prob_map)
+            window = "riw"
         else:
-            upsampled = windowed_prob_map
-
-        # fourier transform
-        dft = np.fft.fft2(upsampled)
-        fourier = np.fft.fftshift(dft)
-
-        # take center?
-        if self.center_four_check.isChecked():
-            height, width = fourier.shape
-            center_x, center_y = width // 2, height // 2
-            half_size = width // 4
-            fourier_center = fourier[
-                center_y - half_size : center_y + half_size,
-                center_x - half_size : center_x + half_size,
-            ]
-        else:
-            fourier_center = fourier
-
-        # filter option
+            return None
         if self.simple_highpass_check.isChecked():
-            # create circular mask:
-            rows, cols = fourier_center.shape
-            center = (int(cols / 2), int(rows / 2))
-            radius = int(0.1 * (min(rows, cols) / 2))
-            if radius == 0:
-                radius = 1  # radius should at least be = 1
-
-            Y, X = np.ogrid[:rows, :cols]
-            dist_from_center = np.sqrt((X - center[0]) ** 2 + (Y - center[1]) ** 2)
-
-            mask = dist_from_center <= radius
-            filtered_spectrum = fourier_center.copy()
-            filtered_spectrum[mask] = 0
-
+            highpass = 1
         elif self.complex_highpass_check.isChecked():
-            H = self.make_high_pass_filter(fourier_center.shape)
-            filtered_spectrum = fourier_center * H
+            highpass = 2
         else:
-            return
-
-        # scale and gamma correct
-        magnitude_spectrum = np.abs(filtered_spectrum)
-        scaled_spectrum = (magnitude_spectrum - magnitude_spectrum.min()) / (
-            magnitude_spectrum.max() - magnitude_spectrum.min()
+            return None
+        return (
+            window,
+            self.upsample_check.isChecked(),
+            self.center_four_check.isChecked(),
+            highpass,
+            self.gamma_spin.value(),
+            self.rescale_check.isChecked(),
         )
 
-        gamma_corrected_spectrum = np.power(scaled_spectrum, self.gamma_spin.value())
+    def update_fourier_maps(self):
+        # fourier maps already shown follow option changes
+        if any(m is not None for m in self.fourier_maps) and not (
+            self.worker is not None and self.worker.isRunning()
+        ):
+            self.calculate_fourier_maps()
 
-        # rescale if checked
-        if self.rescale_check.isChecked():
-            rescaled_spectrum = gamma_corrected_spectrum * magnitude_spectrum.max()
-        else:
-            rescaled_spectrum = gamma_corrected_spectrum
+    def start_worker(self, function, jobs, on_done, processes=True):
+        if not jobs:
+            self.status_label.setText(self.tr("Done"))
+            return
+        self.calculate_probability_button.setEnabled(False)  # wait for processing
+        self.calculate_fourier_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.completed = 0
+        self.status_label.setText(self.tr("Processing {} areas...").format(len(jobs)))
+        self.worker = RegionWorker(function, jobs, processes)
+        self.worker.done.connect(on_done)
+        self.worker.done.connect(self.region_done)
+        self.worker.error.connect(self.region_error)
+        self.worker.finished.connect(self.worker_finished)
+        self.worker.start()
+
+    def region_done(self, index, result):
+        self.completed += 1
+        self.status_label.setText(
+            self.tr("Processed {} of {} areas").format(self.completed, len(self.worker.jobs))
+        )
 
-        return rescaled_spectrum
+    def region_error(self, message):
+        self.status_label.setText(self.tr("Error: {}").format(message))
+
+    def cancel(self):
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+        self.cancel_button.setEnabled(False)
+
+    def closeEvent(self, event):
+        # a running QThread must not be destroyed with the widget, nor leave pool processes behind
+        worker = getattr(self, "worker", None)  # raw images never create one
+        if worker is not None and worker.isRunning():
+            worker.cancel(join=True)
+            worker.wait()
+        super(ResamplingWidget, self).closeEvent(event)
+
+    def worker_finished(self):
+        if self.worker.cancelled:
+            self.status_label.setText(self.tr("Cancelled"))
+        # areas left out by a cancel are not used for fourier maps
+        kept = [i for i, m in enumerate(self.probability_maps) if m is not None]
+        self.probability_maps = [self.probability_maps[i] for i in kept]
+        self.probability_regions = [self.probability_regions[i] for i in kept]
+        self.probability_keys = [self.probability_keys[i] for i in kept]
+        self.calculate_probability_button.setEnabled(True)
+        self.calculate_fourier_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    @staticmethod
+    def sorted_region(p1, p2):
+        (x1, y1), (x2, y2) = p1, p2
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+    @staticmethod
+    def region_crop(image, region):
+        if region is None:
+            return image
+        x1, y1, x2, y2 = region
+        return image[y1 : y2 + 1, x1 : x2 + 1]
+
+    def outlined(self, region):
+        """Probability image with a thick outline around region."""
+        x1, y1, x2, y2 = region
+        image = self.imagegray_copy_for_probabilitymaps.copy()
+        height, width = image.shape
+        xs = np.clip([x + d for x in (x1, x2) for d in range(-2, 3)], 0, width - 1)
+        ys = np.clip([y + d for y in (y1, y2) for d in range(-2, 3)], 0, height - 1)
+        image[y1 : y2 + 1, xs] = 0  # y-stripes
+        image[ys, x1 : x2 + 1] = 0  # x-stripes
+        return image
 
     def click_on_canvas(self, event):
         if self.toolbar_four.mode == "" and self.toolbar_prob.mode == "":
@@ -758,107 +700,3 @@ class ResamplingWidget(ToolWidget):
                 [y1, (y1 - 1), (y1 + 1), y2, (y2 - 1), (y2 + 1)],
                 min(x1, x2) : max(x1, x2) + 1,
             ] = 0  # x-stripes
-
-    def build_matrices_for_processing_3x3(self, I):
-        k = 0
-        F = np.zeros(
-            ((I.shape[0] - 2) * (I.shape[1] - 2), 8)
-        )  # the i^th row of the matrix F corresponds to the pixel neighbors of the i^th element of f
-        f = np.zeros(
-            (I.shape[0] - 2) * (I.shape[1] - 2)
-        )  # the vector f is the image strung out in row-order
-        for y in range(1, I.shape[0] - 1):
-            for x in range(1, I.shape[1] - 1):
-                F[k, 0] = I[y - 1, x - 1]
-                F[k, 1] = I[y - 1, x]
-                F[k, 2] = I[y - 1, x + 1]
-                F[k, 3] = I[y, x - 1]
-                # skip I(x; y) corresponding to a(3; 3) which is 0
-                F[k, 4] = I[y, x + 1]
-                F[k, 5] = I[y + 1, x - 1]
-                F[k, 6] = I[y + 1, x]
-                F[k, 7] = I[y + 1, x + 1]
-                f[k] = I[y, x]
-                k = k + 1
-        return F, f
-
-    def build_matrices_for_processing_5x5(self, I):
-        k = 0
-        F = np.zeros(
-            ((I.shape[0] - 4) * (I.shape[1] - 4), 24)
-        )  # the i^th row of the matrix F corresponds to the pixel neighbors of the i^th element of f
-        f = np.zeros(
-            (I.shape[0] - 4) * (I.shape[1] - 4)
-        )  # the vector f is the image strung out in row-order
-        for y in range(2, I.shape[0] - 2):
-            for x in range(2, I.shape[1] - 2):
-                F[k, 0] = I[y - 2, x - 2]
-                F[k, 1] = I[y - 2, x - 1]
-                F[k, 2] = I[y - 2, x]
-                F[k, 3] = I[y - 2, x + 1]
-                F[k, 4] = I[y - 2, x + 2]
-                F[k, 5] = I[y - 1, x - 2]
-                F[k, 6] = I[y - 1, x - 1]
-                F[k, 7] = I[y - 1, x]
-                F[k, 8] = I[y - 1, x + 1]
-                F[k, 9] = I[y - 1, x + 2]
-                F[k, 10] = I[y, x - 2]
-                F[k, 11] = I[y, x - 1]
-                # skip I(x; y) corresponding to a(3; 3) which is 0
-                F[k, 12] = I[y, x + 1]
-                F[k, 13] = I[y, x + 2]
-                F[k, 14] = I[y + 1, x - 2]
-                F[k, 15] = I[y + 1, x - 1]
-                F[k, 16] = I[y + 1, x]
-                F[k, 17] = I[y + 1, x + 1]
-                F[k, 18] = I[y + 1, x + 2]
-                F[k, 19] = I[y + 2, x - 2]
-                F[k, 20] = I[y + 2, x - 1]
-                F[k, 21] = I[y + 2, x]
-                F[k, 22] = I[y + 2, x + 1]
-                F[k, 23] = I[y + 2, x + 2]
-                f[k] = I[y, x]
-                k = k + 1
-        return F, f
-
-    def compute_residual_3x3(self, a, I, x, y):
-        r = I[y, x] - (
-            a[0] * I[y - 1, x - 1]
-            + a[1] * I[y - 1, x]
-            + a[2] * I[y - 1, x + 1]
-            + a[3] * I[y, x - 1]
-            + a[4] * I[y, x + 1]
-            + a[5] * I[y + 1, x - 1]
-            + a[6] * I[y + 1, x]
-            + a[7] * I[y + 1, x + 1]
-        )
-        return r
-
-    def compute_residual_5x5(self, a, I, x, y):
-        r = I[y, x] - (
-            a[0] * I[y - 2, x - 2]
-            + a[1] * I[y - 2, x - 1]
-            + a[2] * I[y - 2, x]
-            + a[3] * I[y - 2, x + 1]
-            + a[4] * I[y - 2, x + 2]
-            + a[5] * I[y - 1, x - 2]
-            + a[6] * I[y - 1, x - 1]
-            + a[7] * I[y - 1, x]
-            + a[8] * I[y - 1, x + 1]
-            + a[9] * I[y - 1, x + 2]
-            + a[10] * I[y, x - 2]
-            + a[11] * I[y, x - 1]
-            + a[12] * I[y, x + 1]
-            + a[13] * I[y, x + 2]
-            + a[14] * I[y + 1, x - 2]
-            + a[15] * I[y + 1, x - 1]
-            + a[16] * I[y + 1, x]
-            + a[17] * I[y + 1, x + 1]
-            + a[18] * I[y + 1, x + 2]
-            + a[19] * I[y + 2, x - 2]
-            + a[20] * I[y + 2, x - 1]
-            + a[21] * I[y + 2, x]
-            + a[22] * I[y + 2, x + 1]
-            + a[23] * I[y + 2, x + 2]
-        )
-        return r
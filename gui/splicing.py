@@ -1,4 +1,3 @@
-import os
 from time import time
 
 import cv2 as cv
@@ -6,12 +5,8 @@ import numpy as np
 from PySide6.QtCore import QCoreApplication
 from PySide6.QtWidgets import QPushButton, QGridLayout, QMessageBox
 
-from jpeg import estimate_qf
-
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-from noiseprint.noiseprint import genNoiseprint
-from noiseprint.noiseprint_blind import genMappUint8
-from noiseprint.noiseprint_blind import noiseprint_blind_post
+from analysis.cache import default_cache, source_hash
+from analysis.splicing import VERSION, compute_heatmap, estimate_noise
 from tools import ToolWidget
 from utility import modify_font, norm_mat
 from viewer import ImageViewer
@@ -61,8 +56,13 @@ class SplicingWidget(ToolWidget):
             modify_font(self.noise_button, bold=False, italic=True)
             QCoreApplication.processEvents()
 
-            qf = estimate_qf(self.image)
-            self.noise = genNoiseprint(self.image0, qf, model_name="net")
+            self.noise = default_cache().memoize(
+                source_hash(image=self.image),
+                "splicing.noise",
+                VERSION,
+                {},
+                lambda: {"noise": estimate_noise(self.image, self.image0)},
+            )["noise"]
             vmin, vmax, _, _ = cv.minMaxLoc(self.noise[34:-34, 34:-34])
             self.noise_viewer.update_processed(
                 norm_mat(self.noise.clip(vmin, vmax), to_bgr=True)
@@ -82,17 +82,11 @@ class SplicingWidget(ToolWidget):
             modify_font(self.map_button, bold=False, italic=True)
             QCoreApplication.processEvents()
 
-            mapp, valid, range0, range1, imgsize, other = noiseprint_blind_post(
-                self.noise, self.image0
-            )
-            if mapp is None:
-                QMessageBox.critical(
-                    self, self.tr("Error"), self.tr("Too many invalid blocks!")
-                )
+            try:
+                self.map = compute_heatmap(self.noise, self.image0)
+            except ValueError as error:
+                QMessageBox.critical(self, self.tr("Error"), self.tr(str(error)))
                 return
-            self.map = cv.applyColorMap(
-                genMappUint8(mapp, valid, range0, range1, imgsize), cv.COLORMAP_JET
-            )
             self.map_viewer.update_processed(self.map)
             elapsed = time() - start
 
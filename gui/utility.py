@@ -1,15 +1,5 @@
 import os
-import sys
-from time import time
 
-try:
-    import rawpy
-    RAWPY_AVAILABLE = True
-except ImportError:
-    RAWPY_AVAILABLE = False
-
-import cv2 as cv
-import numpy as np
 from PySide6.QtCore import QSettings, QFileInfo, Signal, Qt, QMimeDatabase
 from PySide6.QtGui import QImage, QFontDatabase, QColor, QBrush
 from PySide6.QtWidgets import (
@@ -23,6 +13,30 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
 )
 
+# Qt-free helpers live in imaging.py so headless analysis can use them
+from imaging import (
+    RAWPY_AVAILABLE,
+    decode_image,
+    pad_image,
+    shift_image,
+    human_size,
+    create_lut,
+    compute_hist,
+    auto_lut,
+    elapsed_time,
+    signed_value,
+    equalize_img,
+    norm_img,
+    clip_value,
+    bgr_to_gray3,
+    gray_to_bgr,
+    desaturate,
+    norm_mat,
+    exiftool_exe,
+    butter_exe,
+    ssimul_exe,
+)
+
 
 def mat2img(cvmat):
     height, width, channels = cvmat.shape
@@ -60,355 +74,94 @@ def modify_font(obj, bold=False, italic=False, underline=False, mono=False):
         obj.setFont(font)
 
 
-def pad_image(image, bsize, reflect=False):
-    rows, cols = image.shape[:2]
-    top = left = 0
-    bottom = bsize - rows % bsize
-    right = bsize - cols % bsize
-    border = cv.BORDER_CONSTANT if not reflect else cv.BORDER_REFLECT_101
-    padded = cv.copyMakeBorder(image, top, bottom, left, right, border)
-    return padded
-
-
-def shift_image(image, bsize):
-    rows, cols = image.shape[:2]
-    shifted = np.zeros_like(image)
-    shifted[: rows - bsize, : cols - bsize] = image[bsize:, bsize:]
-    return shifted
-
-
-def human_size(total, binary=False, suffix="B"):
-    units = ["", "K", "M", "G", "T", "P", "E", "Z", "Y"]
-    if binary:
-        units = [unit + "i" for unit in units]
-        factor = 1024.0
-    else:
-        factor = 1000.0
-    for unit in units:
-        if abs(total) < factor:
-            return f"{total:3.1f} {unit}{suffix}"
-        total /= factor
-    return f"{total:.1f} {units[-1]}{suffix}"
-
-
-def create_lut(low, high):
-    if low >= 0:
-        p1 = (+low, 0)
-    else:
-        p1 = (0, -low)
-    if high >= 0:
-        p2 = (255 - high, 255)
-    else:
-        p2 = (255, 255 + high)
-    if p1[0] == p2[0]:
-        return np.full(256, 255, np.uint8)
-    lut = [
-        (x * (p1[1] - p2[1]) + p1[0] * p2[1] - p1[1] * p2[0]) / (p1[0] - p2[0])
-        for x in range(256)
+MIME_FILTERS = [
+    "image/jpeg",
+    "image/png",
+    "image/tiff",
+    "image/gif",
+    "image/bmp",
+    "image/webp",
+    "image/x-portable-pixmap",
+    "image/x-portable-graymap",
+    "image/x-portable-bitmap",
+    "image/x-nikon-nef",
+    "image/x-fuji-raf",
+    "image/x-canon-cr2",
+    "image/x-adobe-dng",
+    "image/x-sony-arw",
+    "image/x-kodak-dcr",
+    "image/x-minolta-mrw",
+    "image/x-pentax-pef",
+    "image/x-canon-crw",
+    "image/x-sony-sr2",
+    "image/x-olympus-orf",
+    "image/x-panasonic-raw",
+]
+
+
+def image_dialog(parent, title, multiple=False):
+    settings = QSettings()
+    mime_db = QMimeDatabase()
+    mime_patterns = [
+        mime_db.mimeTypeForName(mime).globPatterns() for mime in MIME_FILTERS
     ]
-    return np.clip(np.array(lut), 0, 255).astype(np.uint8)
-
-
-def compute_hist(image, normalize=False):
-    hist = np.array(
-        [h[0] for h in cv.calcHist([image], [0], None, [256], [0, 256])], int
-    )
-    return hist / image.size if normalize else hist
-
-
-def auto_lut(image, centile):
-    hist = compute_hist(image, normalize=True)
-    if centile == 0:
-        nonzero = np.nonzero(hist)[0]
-        low = nonzero[0]
-        high = nonzero[-1]
-    else:
-        low_sum = high_sum = 0
-        low = 0
-        high = 255
-        for i, h in enumerate(hist):
-            low_sum += h
-            if low_sum >= centile:
-                low = i
-                break
-        for i, h in enumerate(np.flip(hist)):
-            high_sum += h
-            if high_sum >= centile:
-                high = i
-                break
-    return create_lut(low, high)
-
-
-def elapsed_time(start, ms=True):
-    elapsed = time() - start
-    if ms:
-        return f"{int(np.round(elapsed * 1000))} ms"
-    return f"{elapsed:.2f} sec"
-
-
-def signed_value(value):
-    return f"{'+' if value > 0 else ''}{value}"
-
-
-def equalize_img(image):
-    return cv.merge([cv.equalizeHist(c) for c in cv.split(image)])
-
-
-def norm_img(image):
-    return cv.merge([norm_mat(c) for c in cv.split(image)])
-
-
-def clip_value(value, minv=None, maxv=None):
-    if minv is not None:
-        value = max(value, minv)
-    if maxv is not None:
-        value = min(value, maxv)
-    return value
+    all_formats = f"Supported formats ({' '.join([item for sub in mime_patterns for item in sub])})"
+    dialog = QFileDialog(parent, title, settings.value("load_folder"))
+    dialog.setOption(QFileDialog.DontUseNativeDialog, True)
+    dialog.setFileMode(QFileDialog.ExistingFiles if multiple else QFileDialog.ExistingFile)
+    dialog.setViewMode(QFileDialog.Detail)
+    dialog.setMimeTypeFilters(MIME_FILTERS)
+    name_filters = dialog.nameFilters()
+    dialog.setNameFilters(name_filters + [all_formats])
+    dialog.selectNameFilter(all_formats)
+    if dialog.exec_():
+        return dialog.selectedFiles()
+    return []
 
 
-def bgr_to_gray3(image):
-    return cv.cvtColor(cv.cvtColor(image, cv.COLOR_BGR2GRAY), cv.COLOR_GRAY2BGR)
+def select_images(parent):
+    """Choose multiple image files without decoding them."""
+    filenames = image_dialog(parent, parent.tr("Load images"), multiple=True)
+    if filenames:
+        QSettings().setValue("load_folder", QFileInfo(filenames[0]).absolutePath())
+    return filenames
 
 
-def gray_to_bgr(image):
-    return cv.cvtColor(image, cv.COLOR_GRAY2BGR)
+def decode_with_messages(parent, filename):
+    try:
+        image, warnings = decode_image(filename)
+    except ValueError as error:
+        QMessageBox.critical(parent, parent.tr("Error"), parent.tr(str(error)))
+        return None
+    for warning in warnings:
+        QMessageBox.warning(parent, parent.tr("Warning"), parent.tr(warning))
+    return image
 
 
 def load_image(parent, filename=None):
     nothing = [None] * 3
-    settings = QSettings()
-    mime_filters = [
-        "image/jpeg",
-        "image/png",
-        "image/tiff",
-        "image/gif",
-        "image/bmp",
-        "image/webp",
-        "image/x-portable-pixmap",
-        "image/x-portable-graymap",
-        "image/x-portable-bitmap",
-        "image/x-nikon-nef",
-        "image/x-fuji-raf",
-        "image/x-canon-cr2",
-        "image/x-adobe-dng",
-        "image/x-sony-arw",
-        "image/x-kodak-dcr",
-        "image/x-minolta-mrw",
-        "image/x-pentax-pef",
-        "image/x-canon-crw",
-        "image/x-sony-sr2",
-        "image/x-olympus-orf",
-        "image/x-panasonic-raw",
-    ]
-    mime_db = QMimeDatabase()
-    mime_patterns = [
-        mime_db.mimeTypeForName(mime).globPatterns() for mime in mime_filters
-    ]
-    all_formats = f"Supported formats ({' '.join([item for sub in mime_patterns for item in sub])})"
-    raw_exts = [p[-3:] for p in mime_patterns][-12:]
     if filename is None:
-        dialog = QFileDialog(
-            parent, parent.tr("Load image"), settings.value("load_folder")
-        )
-        dialog.setOption(QFileDialog.DontUseNativeDialog, True)
-        dialog.setFileMode(QFileDialog.ExistingFile)
-        dialog.setViewMode(QFileDialog.Detail)
-        dialog.setMimeTypeFilters(mime_filters)
-        name_filters = dialog.nameFilters()
-        dialog.setNameFilters(name_filters + [all_formats])
-        dialog.selectNameFilter(all_formats)
-        if dialog.exec_():
-            filename = dialog.selectedFiles()[0]
-        else:
-            return nothing
-    ext = os.path.splitext(filename)[1][1:].lower()
-    if ext in raw_exts:
-        if RAWPY_AVAILABLE:
-            with rawpy.imread(filename) as raw:
-                image = cv.cvtColor(
-                    raw.postprocess(
-                        no_auto_bright=True,
-                        use_camera_wb=True,
-                    ),
-                    cv.COLOR_RGB2BGR,
-                )
-        else:
-            QMessageBox.warning(
-                parent,
-                parent.tr("Warning"),
-                parent.tr("RAW image support not available. Please install rawpy or convert to JPEG/PNG first."),
-            )
-            return nothing
-    elif ext == "gif":
-        capture = cv.VideoCapture(filename)
-        frames = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
-        if frames > 1:
-            QMessageBox.warning(
-                parent,
-                parent.tr("Warning"),
-                parent.tr("Animated GIF: importing first frame"),
-            )
-        result, image = capture.read()
-        if not result:
-            QMessageBox.critical(
-                parent, parent.tr("Error"), parent.tr("Unable to decode GIF!")
-            )
+        filenames = image_dialog(parent, parent.tr("Load image"))
+        if not filenames:
             return nothing
-        if len(image.shape) == 2:
-            image = cv.cvtColor(image, cv.COLOR_GRAY2BGR)
-    else:
-        image = cv.imread(filename, cv.IMREAD_COLOR)
+        filename = filenames[0]
+    image = decode_with_messages(parent, filename)
     if image is None:
-        QMessageBox.critical(
-            parent, parent.tr("Error"), parent.tr("Unable to load image!")
-        )
         return nothing
-    if image.shape[2] > 3:
-        QMessageBox.warning(
-            parent, parent.tr("Warning"), parent.tr("Alpha channel discarded")
-        )
-        image = cv.cvtColor(image, cv.COLOR_BGRA2BGR)
-    settings.setValue("load_folder", QFileInfo(filename).absolutePath())
+    QSettings().setValue("load_folder", QFileInfo(filename).absolutePath())
     return filename, os.path.basename(filename), image
 
 
 def load_images(parent):
     """Load multiple images and return a list of (filename, basename, image) tuples."""
-    settings = QSettings()
-    mime_filters = [
-        "image/jpeg",
-        "image/png",
-        "image/tiff",
-        "image/gif",
-        "image/bmp",
-        "image/webp",
-        "image/x-portable-pixmap",
-        "image/x-portable-graymap",
-        "image/x-portable-bitmap",
-        "image/x-nikon-nef",
-        "image/x-fuji-raf",
-        "image/x-canon-cr2",
-        "image/x-adobe-dng",
-        "image/x-sony-arw",
-        "image/x-kodak-dcr",
-        "image/x-minolta-mrw",
-        "image/x-pentax-pef",
-        "image/x-canon-crw",
-        "image/x-sony-sr2",
-        "image/x-olympus-orf",
-        "image/x-panasonic-raw",
-    ]
-    mime_db = QMimeDatabase()
-    mime_patterns = [
-        mime_db.mimeTypeForName(mime).globPatterns() for mime in mime_filters
-    ]
-    all_formats = f"Supported formats ({' '.join([item for sub in mime_patterns for item in sub])})"
-    raw_exts = [p[-3:] for p in mime_patterns][-12:]
-    dialog = QFileDialog(
-        parent, parent.tr("Load images"), settings.value("load_folder")
-    )
-    dialog.setOption(QFileDialog.DontUseNativeDialog, True)
-    dialog.setFileMode(QFileDialog.ExistingFiles)  # Allow multiple selection
-    dialog.setViewMode(QFileDialog.Detail)
-    dialog.setMimeTypeFilters(mime_filters)
-    name_filters = dialog.nameFilters()
-    dialog.setNameFilters(name_filters + [all_formats])
-    dialog.selectNameFilter(all_formats)
-    if dialog.exec_():
-        filenames = dialog.selectedFiles()
-    else:
-        return []
-
     images = []
-    for filename in filenames:
-        ext = os.path.splitext(filename)[1][1:].lower()
-        if ext in raw_exts:
-            if RAWPY_AVAILABLE:
-                with rawpy.imread(filename) as raw:
-                    image = cv.cvtColor(
-                        raw.postprocess(
-                            no_auto_bright=True,
-                            use_camera_wb=True,
-                        ),
-                        cv.COLOR_RGB2BGR,
-                    )
-            else:
-                QMessageBox.warning(
-                    parent,
-                    parent.tr("Warning"),
-                    parent.tr("RAW image support not available. Please install rawpy or convert to JPEG/PNG first."),
-                )
-                continue
-        elif ext == "gif":
-            capture = cv.VideoCapture(filename)
-            frames = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
-            if frames > 1:
-                QMessageBox.warning(
-                    parent,
-                    parent.tr("Warning"),
-                    parent.tr("Animated GIF: importing first frame"),
-                )
-            result, image = capture.read()
-            if not result:
-                QMessageBox.critical(
-                    parent, parent.tr("Error"), parent.tr("Unable to decode GIF!")
-                )
-                continue
-            if len(image.shape) == 2:
-                image = cv.cvtColor(image, cv.COLOR_GRAY2BGR)
-        else:
-            image = cv.imread(filename, cv.IMREAD_COLOR)
-        if image is None:
-            QMessageBox.critical(
-                parent, parent.tr("Error"), parent.tr("Unable to load image!")
-            )
-            continue
-        if image.shape[2] > 3:
-            QMessageBox.warning(
-                parent, parent.tr("Warning"), parent.tr("Alpha channel discarded")
-            )
-            image = cv.cvtColor(image, cv.COLOR_BGRA2BGR)
-        images.append((filename, os.path.basename(filename), image))
-    if images:
-        settings.setValue("load_folder", QFileInfo(filenames[0]).absolutePath())
+    for filename in select_images(parent):
+        image = decode_with_messages(parent, filename)
+        if image is not None:
+            images.append((filename, os.path.basename(filename), image))
     return images
 
 
-def desaturate(image):
-    return cv.cvtColor(cv.cvtColor(image, cv.COLOR_BGR2GRAY), cv.COLOR_GRAY2BGR)
-
-
-def norm_mat(matrix, to_bgr=False):
-    norm = cv.normalize(matrix, None, 0, 255, cv.NORM_MINMAX).astype(np.uint8)
-    if not to_bgr:
-        return norm
-    return cv.cvtColor(norm, cv.COLOR_GRAY2BGR)
-
-
-def exiftool_exe():
-    if sys.platform.startswith("linux"):
-        return "pyexiftool/exiftool/linux/exiftool"
-    if sys.platform.startswith("win32"):
-        return "pyexiftool/exiftool/windows/exiftool(-k).exe"
-    return None
-
-
-def butter_exe():
-    if sys.platform.startswith("linux"):
-        return "butteraugli/linux/butteraugli"
-    if sys.platform.startswith("win32"):
-        return None
-    return None
-
-
-def ssimul_exe():
-    if sys.platform.startswith("linux"):
-        return "ssimulacra/linux/ssimulacra"
-    if sys.platform.startswith("win32"):
-        return None
-    return None
-
-
 class ParamSlider(QWidget):
     valueChanged = Signal(int)
 
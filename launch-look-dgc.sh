@@ -1,5 +1,10 @@
 #!/bin/bash
 
+# headless commands skip the banner, e.g. ./launch-look-dgc.sh analyze images/ --out results.jsonl
+if [ $# -gt 0 ]; then
+    exec python3 "$(dirname "$0")/launch_look_dgc.py" "$@"
+fi
+
 echo "================================================"
 echo "  LOOK-DGC - Digital Image Forensics Toolkit"
 echo "  Developed by: Gopichand"
@@ -152,5 +152,13 @@ def main():
         print(f"Error launching LOOK-DGC: {e}")
         input("Press Enter to exit...")
 
+def run_cli(argv):
+    """Run a headless command such as 'analyze' without the GUI checks"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gui'))
+    import cli
+    return cli.main(argv)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     main()
\ No newline at end of file
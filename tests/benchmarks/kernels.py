@@ -0,0 +1,139 @@
+"""
+Compute kernels of the forensic tools, as driven by the benchmark suite.
+
+Each case receives a synthetic BGR image, prepares its inputs outside of the
+measured region and returns the callable that is timed.
+"""
+import math
+import os
+import sys
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "gui"))
+
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def synthetic_image(megapixels, seed=0):
+    """Textured 4:3 image with a duplicated region, deterministic for a seed."""
+    height = max(int(round(math.sqrt(megapixels * 1e6 * 3 / 4))), 16)
+    width = max(int(round(megapixels * 1e6 / height)), 16)
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), np.uint8)
+    # built per channel to keep the float buffers small at 50 MP; features have
+    # fixed sizes in pixels, so larger images hold more detail like photos do
+    for c in range(3):
+        channel = np.zeros((height, width), np.float32)
+        for cell in (256, 32, 4):
+            small = rng.random((max(height // cell, 2), max(width // cell, 2)), np.float32)
+            channel += cv.resize(small, (width, height), interpolation=cv.INTER_CUBIC)
+        channel *= 255 / 3
+        channel += rng.standard_normal((height, width), np.float32) * 3
+        image[:, :, c] = np.clip(channel, 0, 255)
+    # a copied patch gives the copy-move detectors something to find
+    h, w = height // 8, width // 8
+    image[height // 2 : height // 2 + h, width // 2 : width // 2 + w] = image[h : 2 * h, w : 2 * w]
+    return image
+
+
+def analyzer_case(name, params=None):
+    def setup(image):
+        from analysis import get_analyzer
+
+        analyzer = get_analyzer(name)
+        return lambda: analyzer.analyze(image, None, params)
+
+    return setup
+
+
+for _name in ("ela", "minmax", "contrast", "ghostmaps", "resampling", "cloning", "blocking"):
+    case(_name)(analyzer_case(_name))
+case("resampling_fixed")(analyzer_case("resampling", {"predictor": "fixed"}))
+case("cloning_blocks")(analyzer_case("cloning", {"detector": 3}))
+case("cloning_tiled")(analyzer_case("cloning", {"tiled": True}))
+
+
+@case("ghostmaps_sweep")
+def ghostmaps_sweep_case(image):
+    from analysis.ghostmaps import ghost_maps
+
+    # every quality from 50 to 100, the maps without the plot
+    return lambda: ghost_maps(image, 50, 100, 1)
+
+
+@case("median")
+def median_case(image):
+    from analysis import median
+
+    gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+    if not os.path.exists(median.model_path(f"median_b{median.BLOCK}.json")):
+        # without the model only the block features are measured, the bulk of detection
+        from imaging import pad_image
+
+        padded = pad_image(gray, median.BLOCK)
+        levels, windows = median.MODEL_SHAPES[128]
+        return lambda: median.block_features(padded, median.BLOCK, levels, windows)
+    booster = median.load_booster()
+    return lambda: median.detect(gray, booster)
+
+
+@case("noiseprint")
+def noiseprint_case(image):
+    from analysis.splicing import compute_heatmap
+
+    gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY).astype(np.float32) / 255
+    # the network residual is replaced by noise of similar strength, only the
+    # post-processing (SPAM features and EM clustering) is measured
+    noise = np.random.default_rng(0).standard_normal(gray.shape, np.float32) * 0.5
+    return lambda: compute_heatmap(noise, gray)
+
+
+@case("comparison")
+def comparison_case(image):
+    from comparison import ComparisonWidget
+    from jpeg import compress_jpg
+
+    reference = compress_jpg(image, 75)
+    img1 = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+    img2 = cv.cvtColor(reference, cv.COLOR_BGR2GRAY)
+    x = img1.astype(np.float64)
+    y = img2.astype(np.float64)
+    try:
+        import sewar
+    except ImportError:
+        sewar = None
+
+    def metrics():
+        ComparisonWidget.rmse(x, y)
+        ComparisonWidget.mb(x, y)
+        ComparisonWidget.pfe(x, y)
+        ComparisonWidget.psnr(x, y)
+        ComparisonWidget.ssim(x, y)
+        if sewar is not None:
+            for metric in (sewar.sam, sewar.ergas, sewar.msssim, sewar.rase, sewar.scc, sewar.uqi, sewar.vifp):
+                metric(img1, img2)
+        sizes = [256, 256, 256]
+        ranges = [0, 256] * 3
+        hist1 = cv.calcHist([image], [0, 1, 2], None, sizes, ranges)
+        hist2 = cv.calcHist([reference], [0, 1, 2], None, sizes, ranges)
+        for method in (
+            cv.HISTCMP_CORREL,
+            cv.HISTCMP_CHISQR,
+            cv.HISTCMP_CHISQR_ALT,
+            cv.HISTCMP_INTERSECT,
+            cv.HISTCMP_HELLINGER,
+            cv.HISTCMP_KL_DIV,
+        ):
+            cv.compareHist(hist1, hist2, method)
+
+    return metrics
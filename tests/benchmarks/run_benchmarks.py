@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark runner for the compute kernels of LOOK-DGC tools.
+
+Every case and image size runs in a fresh process, so that the peak memory
+reported (the rise of the peak resident set over what the inputs already
+needed) belongs to that kernel alone. Results are compared with the
+baselines stored next to this script and slowdowns beyond the tolerance are
+reported as regressions; --save records the current run as the new baseline.
+
+Examples:
+    python tests/benchmarks/run_benchmarks.py --sizes 1,12
+    python tests/benchmarks/run_benchmarks.py --cases ela,minmax --save
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from kernels import CASES, synthetic_image
+
+SIZES = (1, 12, 24, 50)
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+# memory differences below this are noise from the allocator
+MEMORY_SLACK = 32
+
+
+def measure(name, path, repeat, connection):
+    """Child process: time one case on the image stored at path."""
+    from analysis.telemetry import peak_rss
+
+    try:
+        run = CASES[name](np.load(path))
+        before = peak_rss()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        after = peak_rss()
+        result = {"seconds": statistics.median(times), "min": min(times)}
+        if before is not None:
+            result["peak_mb"] = (after - before) / 2 ** 20
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    connection.send(result)
+
+
+def run_case(name, path, repeat, timeout):
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=measure, args=(name, path, repeat, sender))
+    process.start()
+    sender.close()
+    if receiver.poll(timeout):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+    else:
+        process.terminate()
+        result = {"error": f"timeout after {timeout:.0f} s"}
+    process.join()
+    if result is None and process.exitcode < 0:
+        # SIGKILL usually comes from the kernel running out of memory
+        result = {"error": f"killed by signal {-process.exitcode}"}
+    elif result is None:
+        result = {"error": f"process died with exit code {process.exitcode}"}
+    return result
+
+
+def machine():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def load_baselines(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"machine": None, "results": {}}
+
+
+def compare(result, baseline, tolerance):
+    """Return a description of the regression of result, or None."""
+    if baseline is None or "seconds" not in baseline or "seconds" not in result:
+        return None
+    problems = []
+    ratio = result["seconds"] / baseline["seconds"]
+    if ratio > 1 + tolerance:
+        problems.append(f"{ratio:.2f}x slower")
+    if "peak_mb" in result and "peak_mb" in baseline:
+        if result["peak_mb"] > baseline["peak_mb"] * (1 + tolerance) + MEMORY_SLACK:
+            problems.append(f"{result['peak_mb']:.0f} MB peak vs {baseline['peak_mb']:.0f} MB")
+    return ", ".join(problems) or None
+
+
+def format_result(result, baseline):
+    if "error" in result:
+        return result["error"]
+    text = f"{result['seconds']:9.3f} s"
+    if "peak_mb" in result:
+        text += f" {result['peak_mb']:8.1f} MB"
+    if baseline is not None and "seconds" in baseline:
+        text += f"  ({result['seconds'] / baseline['seconds']:.2f}x baseline)"
+    return text
+
+
+def parse_list(text, cast=str):
+    return [cast(item) for item in text.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LOOK-DGC compute kernels")
+    parser.add_argument("--cases", "-c", default=",".join(CASES), help="comma separated cases")
+    parser.add_argument("--sizes", "-s", default=",".join(map(str, SIZES)), help="image sizes in megapixels")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="runs per case (median is reported)")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds before a case is abandoned")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    parser.add_argument("--baselines", default=BASELINES, help="baseline file to compare with")
+    parser.add_argument("--save", action="store_true", help="store the results as baselines")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    cases = parse_list(args.cases)
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)} (available: {', '.join(CASES)})")
+    sizes = parse_list(args.sizes, float)
+    baselines = load_baselines(args.baselines)
+    if baselines["machine"] is not None and baselines["machine"] != machine():
+        print("Warning: baselines were recorded on a different machine", file=sys.stderr)
+
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as temp:
+        for size in sizes:
+            # the image is generated once per size and loaded by every case
+            path = os.path.join(temp, f"{size:g}mp.npy")
+            np.save(path, synthetic_image(size))
+            for name in cases:
+                key = f"{name}@{size:g}mp"
+                result = run_case(name, path, args.repeat, args.timeout)
+                results[key] = result
+                baseline = baselines["results"].get(key)
+                print(f"{key:24} {format_result(result, baseline)}", flush=True)
+                regression = compare(result, baseline, args.tolerance)
+                if regression is not None:
+                    regressions.append(f"{key}: {regression}")
+            os.remove(path)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"machine": machine(), "results": results}, file, indent=4)
+    if args.save:
+        baselines["machine"] = machine()
+        baselines["results"].update(results)
+        with open(args.baselines, "w") as file:
+            json.dump(baselines, file, indent=4, sort_keys=True)
+            file.write("\n")
+        return 0
+    if regressions:
+        print("\nRegressions:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -60,6 +60,11 @@ def run_all_tests(verbose=False, coverage=False):
         cmd += " --cov=../gui --cov-report=html --cov-report=term"
     return run_command(cmd, cwd="tests")
 
+def run_benchmarks(sizes):
+    """Run the compute kernel benchmarks and compare them with the baselines"""
+    print("Running benchmarks...")
+    return run_command(f"python benchmarks/run_benchmarks.py --sizes {sizes}", cwd="tests")
+
 def main():
     parser = argparse.ArgumentParser(description="LOOK-DGC Test Runner")
     parser.add_argument("--install", action="store_true", 
@@ -74,6 +79,8 @@ def main():
                        help="Verbose output")
     parser.add_argument("--coverage", "-c", action="store_true", 
                        help="Generate coverage report")
+    parser.add_argument("--benchmarks", nargs="?", const="1,12,24,50", metavar="SIZES",
+                       help="Run the benchmarks at the given megapixel sizes")
     parser.add_argument("--setup", action="store_true",
                        help="Install dependencies and run all tests")
     
@@ -85,7 +92,7 @@ def main():
     os.chdir(project_root)
     
     # If no specific test type requested, run all
-    if not any([args.unit, args.integration, args.all]):
+    if not any([args.unit, args.integration, args.all, args.benchmarks]):
         args.all = True
     
     success = True
@@ -113,6 +120,10 @@ def main():
         if not run_all_tests(args.verbose, args.coverage):
             success = False
     
+    if args.benchmarks:
+        if not run_benchmarks(args.benchmarks):
+            success = False
+    
     if success:
         print("\n✅ All tests passed!")
         if args.coverage:
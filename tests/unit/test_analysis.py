@@ -0,0 +1,57 @@
+"""
+Unit tests for the headless analysis layer
+"""
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import analysis
+from analysis import ela, minmax, noise
+
+
+def test_registry_lookup_by_name_and_title():
+    """Analyzers can be found by short name or by tool title"""
+    assert analysis.get_analyzer("ela") is ela
+    assert analysis.get_analyzer("Error Level Analysis") is ela
+    assert analysis.get_analyzer("Hex Editor") is None
+    with pytest.raises(KeyError):
+        analysis.analyze("Hex Editor", None, None)
+
+
+def test_analysis_does_not_import_qt():
+    """The compute layer must stay usable without Qt"""
+    code = "import sys, analysis; sys.exit('PySide6' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=analysis.__path__[0] + "/..")
+    assert result.returncode == 0
+
+
+@pytest.mark.parametrize("name", ["ela", "noise", "minmax", "contrast", "blocking"])
+def test_analyze_returns_report(name, sample_image, sample_image_path):
+    """Image analyzers return a text summary and a map of the input size"""
+    result = analysis.analyze(name, sample_image, sample_image_path)
+    assert isinstance(result["text"], str)
+    assert result["image"].shape == sample_image.shape
+    assert result["image"].dtype == np.uint8
+
+
+def test_minmax_deviation_matches_reference(sample_image):
+    """Vectorized min/max deviation matches the per-pixel definition"""
+    image = np.random.default_rng(0).integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    for channel in range(len(minmax.CHANNELS)):
+        img = minmax.select_channel(image, channel)
+        low, high = minmax.minmax_deviation(img)
+        h, w = img.shape
+        for i in range(1, h - 1):
+            for j in range(1, w - 1):
+                patch = img[i - 1 : i + 2, j - 1 : j + 2].ravel()
+                neighbors = np.delete(patch, 4)
+                assert low[i, j] == (img[i, j] < neighbors.min())
+                assert high[i, j] == (img[i, j] > neighbors.max())
+
+
+def test_noise_and_ela_defaults(sample_image):
+    """Default parameters produce images without errors"""
+    assert noise.analyze(sample_image, None)["image"].shape == sample_image.shape
+    assert ela.analyze(sample_image, None)["values"]["mean_error"] >= 0
@@ -0,0 +1,24 @@
+"""
+Unit tests for the batch analysis runnable
+"""
+import logging
+
+import numpy as np
+
+from analysis.journal import Journal
+from batch import AnalysisRunnable, BatchAnalysisWidget
+
+
+def test_results_keep_maps_in_the_journal_only(tmp_path):
+    """Results in memory hold text and values, reports load the maps back from the journal"""
+    image = np.random.default_rng(0).integers(0, 255, (8, 8, 3), np.uint8)
+    journal = Journal(str(tmp_path / "run.jsonl"), str(tmp_path / "maps"))
+    runnable = AnalysisRunnable(["/a/x.png"], [], logging.getLogger("test"), journal=journal)
+    runnable.results = {"x.png": {}}
+    runnable.completed_tasks = 0
+    runnable.add_result("/a/x.png", "Error Level Analysis", {"text": "ok", "image": image})
+    journal.close()
+    data = runnable.snapshot()["x.png"]["Error Level Analysis"]
+    assert "image" not in data and data["text"] == "ok"
+    report = BatchAnalysisWidget.with_maps(runnable.snapshot())
+    assert np.array_equal(report["x.png"]["Error Level Analysis"]["image"], image)
@@ -0,0 +1,33 @@
+"""
+Unit tests for the benchmark suite
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from kernels import CASES, synthetic_image  # noqa: E402
+from run_benchmarks import compare  # noqa: E402
+
+
+def test_synthetic_image_size_and_determinism():
+    image = synthetic_image(0.03)
+    assert image.shape[2] == 3 and abs(image.shape[0] * image.shape[1] - 30000) < 300
+    assert (synthetic_image(0.03) == image).all()
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_case_runs(name):
+    """Every kernel still accepts the inputs the benchmarks give it"""
+    CASES[name](synthetic_image(0.03))()
+
+
+def test_compare_flags_slowdowns_and_memory():
+    baseline = {"seconds": 1.0, "peak_mb": 100.0}
+    assert compare({"seconds": 1.2, "peak_mb": 110.0}, baseline, 0.25) is None
+    assert compare({"seconds": 1.5, "peak_mb": 100.0}, baseline, 0.25) == "1.50x slower"
+    assert "MB peak" in compare({"seconds": 1.0, "peak_mb": 400.0}, baseline, 0.25)
+    assert compare({"error": "timeout"}, baseline, 0.25) is None
+    assert compare({"seconds": 9.0}, None, 0.25) is None
@@ -0,0 +1,112 @@
+"""
+Unit tests for the persistent result cache
+"""
+import pickle
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import analysis
+from analysis import ela
+from analysis.cache import ResultCache, source_hash
+from analysis.executor import BatchExecutor
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def image_file(tmp_path, sample_image):
+    filename = str(tmp_path / "evidence.png")
+    cv.imwrite(filename, sample_image)
+    return filename
+
+
+def test_store_load_roundtrip(cache):
+    """Arrays and plain values come back unchanged"""
+    result = {"text": "ok", "image": np.arange(12, dtype=np.uint8).reshape(3, 4), "values": {"a": 1.5}}
+    cache.store("ab" * 32, result)
+    loaded = cache.load("ab" * 32)
+    assert loaded["text"] == "ok" and loaded["values"] == {"a": 1.5}
+    assert np.array_equal(loaded["image"], result["image"])
+    assert cache.load("cd" * 32) is None
+
+
+def test_key_depends_on_content_params_and_version(cache, image_file, monkeypatch):
+    """Changing the file, a parameter or the tool version misses the cache"""
+    source = source_hash(image_file)
+    key = cache.result_key(source, "ela")
+    assert key == cache.result_key(source, "Error Level Analysis", dict(ela.DEFAULTS))
+    assert key != cache.result_key(source, "ela", {"quality": 50})
+    monkeypatch.setattr(ela, "VERSION", ela.VERSION + 1)
+    assert key != cache.result_key(source, "ela")
+    with open(image_file, "ab") as file:
+        file.write(b"\0")
+    assert source_hash(image_file) != source
+
+
+def test_analyze_reuses_results(cache, image_file, sample_image, monkeypatch):
+    """The second analysis of the same file is served from disk"""
+    first = cache.analyze("ela", sample_image, image_file)
+    monkeypatch.setattr(ela, "analyze", lambda *args: pytest.fail("analyzer called"))
+    second = cache.analyze("ela", sample_image, image_file)
+    assert np.array_equal(first["image"], second["image"])
+
+
+def test_evicts_least_recently_used(tmp_path):
+    """The cache stays under its size limit, dropping the oldest entries"""
+    rng = np.random.default_rng(0)
+    cache = ResultCache(str(tmp_path), max_bytes=30000)
+    keys = [f"{i:02d}" * 32 for i in range(6)]
+    for key in keys:
+        cache.store(key, {"image": rng.integers(0, 255, 10000, np.uint8)})
+    assert sum(size for _, size, _ in cache.entries()) <= 30000
+    assert cache.load(keys[0]) is None
+    assert cache.load(keys[-1]) is not None
+
+
+def test_worker_copies_leave_the_limit_to_the_owner(tmp_path):
+    """Copies sent to worker processes only write entries, the owner counts them and evicts"""
+    rng = np.random.default_rng(0)
+    cache = ResultCache(str(tmp_path), max_bytes=30000)
+    cache.evict()
+    for i in range(6):
+        worker = pickle.loads(pickle.dumps(cache))
+        worker.entries = lambda: pytest.fail("worker scanned the cache")
+        worker.store(f"{i:02d}" * 32, {"image": rng.integers(0, 255, 10000, np.uint8)})
+        cache.add(worker.stored)
+    assert sum(size for _, size, _ in cache.entries()) == cache.total <= 30000
+    assert cache.load("00" * 32) is None
+
+
+def test_memoize_skips_failed_stages(cache):
+    """Stages returning None, such as canceled ones, are not stored"""
+    calls = []
+    compute = lambda: calls.append(1) or None
+    assert cache.memoize("source", "stage", 1, {}, compute) is None
+    assert cache.memoize("source", "stage", 1, {}, compute) is None
+    assert len(calls) == 2
+    value = cache.memoize("source", "stage", 1, {}, lambda: {"x": np.ones(3)})
+    assert np.array_equal(value["x"], np.ones(3))
+
+
+def test_executor_fills_cache(cache, image_file, sample_image):
+    """Batch workers store their results for later runs"""
+    with BatchExecutor(["ela"], jobs=1, processes=False, cache=cache) as executor:
+        _, _, data = next(executor.run([(image_file, "evidence.png", sample_image)]))
+    cached = cache.load(cache.result_key(source_hash(image_file), "ela"))
+    expected = analysis.analyze("ela", sample_image, image_file)
+    assert np.array_equal(cached["image"], data["image"])
+    assert np.array_equal(cached["image"], expected["image"])
+
+
+def test_executor_accounts_for_worker_entries(cache, image_file, sample_image):
+    """Entries written by worker processes count towards the limit of the cache"""
+    cache.evict()
+    with BatchExecutor(["ela"], jobs=1, cache=cache) as executor:
+        _, _, data = next(executor.run([(image_file, "evidence.png", sample_image)]))
+    assert "stored" not in data
+    assert cache.total == sum(size for _, size, _ in cache.entries()) > 0
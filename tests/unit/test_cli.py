@@ -0,0 +1,119 @@
+"""
+Unit tests for the headless command line interface
+"""
+import json
+import os
+import subprocess
+import sys
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import cli
+
+GUI_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "gui")
+
+
+@pytest.fixture
+def evidence(tmp_path, sample_image):
+    folder = tmp_path / "evidence"
+    folder.mkdir()
+    cv.imwrite(str(folder / "a.png"), sample_image)
+    cv.imwrite(str(folder / "b.png"), sample_image[::-1])
+    (folder / "broken.jpg").write_bytes(b"not a jpeg")
+    return folder
+
+
+def read_records(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_analyze_writes_records_and_maps(evidence, tmp_path):
+    """One record per image and tool, with maps in the sidecar folder"""
+    out = tmp_path / "results.jsonl"
+    code = cli.main(
+        ["analyze", str(evidence), "-t", "ela,minmax", "-j", "2", "--threads", "--no-cache", "-o", str(out)]
+    )
+    records = read_records(out)
+    assert code == 1  # the broken file is reported
+    errors = [r for r in records if "error" in r]
+    assert sorted(r["tool"] for r in errors) == ["ela", "minmax"]
+    results = [r for r in records if "error" not in r]
+    assert sorted((os.path.basename(r["file"]), r["tool"]) for r in results) == [
+        ("a.png", "ela"), ("a.png", "minmax"), ("b.png", "ela"), ("b.png", "minmax"),
+    ]
+    for record in results:
+        assert cv.imread(str(tmp_path / "results.maps" / record["map"])) is not None
+
+
+def test_analyze_parameters_and_cache(evidence, tmp_path, monkeypatch):
+    """Parameter overrides reach the analyzers and repeated runs hit the cache"""
+    monkeypatch.setenv("LOOK_DGC_CACHE", str(tmp_path / "cache"))
+    image = str(evidence / "a.png")
+    outputs = []
+    for run in range(2):
+        out = tmp_path / f"run{run}.jsonl"
+        assert cli.main(["analyze", image, "-t", "ela", "-p", "ela.quality=50", "--threads", "-o", str(out)]) == 0
+        outputs.append(read_records(out)[0])
+    assert "Quality: 50%" in outputs[0]["text"]
+    assert outputs[0]["values"] == outputs[1]["values"]
+    first = cv.imread(str(tmp_path / "run0.maps" / outputs[0]["map"]))
+    second = cv.imread(str(tmp_path / "run1.maps" / outputs[1]["map"]))
+    assert np.array_equal(first, second)
+
+
+def test_unknown_tool_is_rejected(evidence):
+    with pytest.raises(SystemExit):
+        cli.main(["analyze", str(evidence), "-t", "nonexistent"])
+
+
+def test_cli_does_not_import_qt():
+    """The headless entry point stays importable on machines without a display"""
+    code = "import sys, cli; cli.build_parser(); print(any(m.startswith('PySide6') for m in sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=GUI_DIR, capture_output=True, text=True, check=True
+    )
+    assert output.stdout.strip() == "False"
+
+
+def test_resume_skips_finished_tasks(evidence, tmp_path, monkeypatch):
+    """Interrupted runs continue from the records already in the output"""
+    out = tmp_path / "results.jsonl"
+    image = str(evidence / "a.png")
+    args = ["analyze", image, "-t", "ela,minmax", "--threads", "--no-cache", "-o", str(out)]
+    assert cli.main(args) == 0
+    first = read_records(out)
+    out.write_text(json.dumps(first[0]) + "\n")
+    submit = cli.BatchExecutor.submit
+    submitted = []
+
+    def record(self, filename, image, tool, *args):
+        submitted.append(tool)
+        return submit(self, filename, image, tool, *args)
+
+    monkeypatch.setattr(cli.BatchExecutor, "submit", record)
+    assert cli.main(args + ["--resume"]) == 0
+    records = read_records(out)
+    assert sorted(r["tool"] for r in records) == ["ela", "minmax"]
+    assert records[0] == first[0]
+    assert submitted == [first[1]["tool"]]
+
+
+def test_inflight_images_reach_the_executor(evidence, tmp_path, monkeypatch):
+    """The number of images held at once is configurable and must be positive"""
+    inflight = []
+    executor = cli.BatchExecutor
+
+    def recorded(*args, **kwargs):
+        inflight.append(kwargs["inflight"])
+        return executor(*args, **kwargs)
+
+    monkeypatch.setattr(cli, "BatchExecutor", recorded)
+    out = str(tmp_path / "results.jsonl")
+    args = ["analyze", str(evidence / "a.png"), "-t", "ela", "--threads", "--no-cache", "-o", out]
+    cli.main(args + ["--inflight", "1"])
+    assert inflight == [1]
+    with pytest.raises(SystemExit):
+        cli.main(["analyze", str(evidence), "--inflight", "0"])
@@ -0,0 +1,195 @@
+"""
+Unit tests for copy-move detection
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from analysis import cloning, executor
+from analysis.executor import thread_budget
+
+
+def pairwise_clusters(kpts, matches, min_dist, cluster):
+    """Clusters by comparing every pair of matches, the definition of cluster_matches"""
+    pts = np.array([k.pt for k in kpts])
+    groups = []
+    for i, m0 in enumerate(matches):
+        a0, b0 = pts[m0.queryIdx], pts[m0.trainIdx]
+        group = [m0]
+        for m1 in matches[i + 1 :]:
+            a1, b1 = pts[m1.queryIdx], pts[m1.trainIdx]
+            if (m1.queryIdx, m1.trainIdx) == (m0.trainIdx, m0.queryIdx):
+                continue
+            if abs(np.linalg.norm(a0 - b0) - np.linalg.norm(a1 - b1)) > min_dist:
+                continue
+            aa, bb = np.linalg.norm(a0 - a1), np.linalg.norm(b0 - b1)
+            ab, ba = np.linalg.norm(a0 - b1), np.linalg.norm(b0 - a1)
+            if not (0 < aa < min_dist and 0 < bb < min_dist or 0 < ab < min_dist and 0 < ba < min_dist):
+                continue
+            if any((g.queryIdx, g.trainIdx) == (m1.trainIdx, m1.queryIdx) for g in group):
+                continue
+            group.append(m1)
+        if len(group) >= cluster:
+            groups.append(group)
+    return groups
+
+
+@pytest.fixture
+def cloned_matches():
+    """Keypoints of a region copied elsewhere, matched both ways, mixed with random matches"""
+    rng = np.random.default_rng(0)
+    n = 60
+    src = rng.random((n, 2)) * 100 + 50
+    dst = src + [300, 200] + rng.standard_normal((n, 2))
+    pts = np.vstack([src, dst, rng.random((2 * n, 2)) * 500])
+    kpts = [cv.KeyPoint(float(x), float(y), 5) for x, y in pts]
+    matches = [cv.DMatch(i, n + i, 1.0) for i in range(n)]
+    matches += [cv.DMatch(n + i, i, 1.0) for i in range(0, n, 2)]
+    matches += [cv.DMatch(2 * n + i, 3 * n + i // 2, 2.0) for i in range(0, n, 2)]
+    matches += [cv.DMatch(0, 1, 0.5)]
+    order = rng.permutation(len(matches))
+    return kpts, [matches[i] for i in order]
+
+
+@pytest.mark.parametrize("cluster", [1, 5])
+def test_cluster_matches_equals_pairwise_definition(cloned_matches, cluster):
+    kpts, matches = cloned_matches
+    kept, clusters = cloning.cluster_matches(kpts, matches, (500, 500), 10, cluster)
+    min_dist = 10 / 100 * 500 / 2
+    pts = np.array([k.pt for k in kpts])
+    assert kept == [m for m in matches if np.linalg.norm(pts[m.queryIdx] - pts[m.trainIdx]) > min_dist]
+    expected = pairwise_clusters(kpts, kept, min_dist, cluster)
+    key = lambda groups: [[(m.queryIdx, m.trainIdx) for m in g] for g in groups]  # noqa: E731
+    assert clusters and key(clusters) == key(expected)
+
+
+def test_cluster_matches_can_be_cancelled(cloned_matches):
+    kpts, matches = cloned_matches
+    assert cloning.cluster_matches(kpts, matches, (500, 500), 10, 5, lambda i: i < 3)[1] is None
+
+
+@pytest.fixture
+def descriptors():
+    """Binary descriptors, a part of them repeated with a few bits flipped"""
+    rng = np.random.default_rng(0)
+    desc = rng.integers(0, 256, (3000, 64), dtype=np.uint8)
+    noise = rng.integers(0, 256, (1000, 64), dtype=np.uint8) & rng.integers(0, 256, (1000, 64), dtype=np.uint8)
+    desc[2000:] = desc[:1000] ^ (noise & (noise >> 1) & (noise >> 2) & (noise >> 3))
+    return desc
+
+
+def test_exact_matching_in_blocks(descriptors, monkeypatch):
+    matcher = cv.BFMatcher_create(cv.NORM_HAMMING, True)
+    whole = [(m.queryIdx, m.trainIdx, m.distance) for row in matcher.radiusMatch(descriptors, descriptors, 40) for m in row]
+    monkeypatch.setattr(cloning, "MATCH_MEMORY", 4 * len(descriptors) * 700)
+    blocks = [(m.queryIdx, m.trainIdx, m.distance) for m in cloning.exact_matches(descriptors, 40)]
+    assert blocks == whole
+
+
+def test_approximate_matching_finds_exact_pairs(descriptors):
+    pairs = lambda matches: {(m.queryIdx, m.trainIdx) for m in matches}  # noqa: E731
+    exact = pairs(cloning.match_keypoints(descriptors, 20, matcher=1))
+    approximate = pairs(cloning.match_keypoints(descriptors, 20, matcher=2))
+    assert len(exact) >= 1800 and approximate <= exact
+    assert len(approximate) > 0.95 * len(exact)
+
+
+def test_keypoints_beyond_memory_budget(monkeypatch):
+    gray = np.random.default_rng(0).integers(0, 256, (200, 200), dtype=np.uint8)
+    kpts, desc = cloning.detect_keypoints(gray, 0, 100)[1:]
+    assert len(desc) == len(kpts) > 100
+    monkeypatch.setattr(cloning, "MATCH_MEMORY", cloning.KEYPOINT_MEMORY * (len(kpts) - 1))
+    assert cloning.detect_keypoints(gray, 0, 100)[2] is None
+
+
+def test_block_keys_quantize_block_dct():
+    gray = np.random.default_rng(0).integers(0, 256, (20, 24), dtype=np.uint8)
+    step = 8
+    keys, cols = cloning.block_keys(gray, step)
+    size = cloning.BLOCK_SIZE
+    assert cols == 24 - size + 1 and len(keys) == (20 - size + 1) * cols
+    assert np.array_equal(keys & np.uint64(2 ** cloning.INDEX_BITS - 1), np.arange(len(keys)))
+    for index in (0, 5, cols + 3, len(keys) - 1):
+        y, x = divmod(index, cols)
+        dct = cv.dct(gray[y : y + size, x : x + size].astype(np.float32))
+        key = int(keys[index]) >> cloning.INDEX_BITS
+        for (u, v), bits in zip(cloning.BLOCK_FEATURES[::-1], cloning.FEATURE_BITS[::-1]):
+            level = key & (2 ** bits - 1)
+            key >>= bits
+            expected = dct[u, v] / step if u == v == 0 else np.rint(dct[u, v] / step) + 2 ** (bits - 1)
+            assert abs(level - np.clip(expected, 0, 2 ** bits - 1)) <= 1
+
+
+def test_block_keys_tell_bright_blocks_apart_at_fine_steps():
+    """The DC levels span the whole intensity range whatever the step"""
+    texture = np.tile(np.arange(8, dtype=np.uint8), (8, 14))
+    gray = np.repeat(np.arange(140, 248, 8, dtype=np.uint8), 8)[np.newaxis] + texture
+    keys, cols = cloning.block_keys(gray, 0.4)
+    dc = (keys[::8] >> np.uint64(cloning.INDEX_BITS + sum(cloning.FEATURE_BITS[1:]))).astype(int)
+    assert len(np.unique(dc)) == len(dc) and np.all(np.diff(dc) > 0)
+
+
+def test_block_matching_needs_positive_matching():
+    with pytest.raises(ValueError):
+        cloning.match_blocks(np.zeros((32, 32), np.uint8), 0, 15, 5)
+
+
+def test_block_matching_finds_copied_region():
+    rng = np.random.default_rng(0)
+    gray = cv.GaussianBlur(rng.integers(0, 256, (240, 320)).astype(np.uint8), (5, 5), 0)
+    total, kpts, matches, clusters = cloning.match_blocks(gray, 20, 15, 5)
+    assert total == 233 * 313 and not clusters
+    gray[150:214, 200:280] = gray[20:84, 30:110]
+    total, kpts, matches, clusters = cloning.match_blocks(gray, 20, 15, 5)
+    assert len(clusters) == 1 and len(matches) == len(clusters[0])
+    for m in matches:
+        a, b = np.array(kpts[m.queryIdx].pt), np.array(kpts[m.trainIdx].pt)
+        assert np.array_equal(b - a, [170, 130])
+
+
+@pytest.mark.parametrize("algorithm, coincident", [(0, 0.9), (1, 0.6), (2, 0.98)])
+def test_tiled_detection_matches_whole_image(algorithm, coincident, monkeypatch):
+    """Tiles keep each keypoint once, as many as the whole image and mostly at its positions
+
+    Texture covers a third of the image only, so the tiles on the flat part find nothing.
+    """
+    rng = np.random.default_rng(0)
+    gray = np.full((512, 768), 128, np.uint8)
+    gray[:, :256] = cv.GaussianBlur(rng.integers(0, 256, (512, 256)).astype(np.uint8), (3, 3), 0)
+    whole = cloning.detect_keypoints(gray, algorithm, 100)[1]
+    monkeypatch.setattr(cloning, "DETECT_TILE", 256)
+    total, kpts, desc = cloning.detect_keypoints(gray, algorithm, 100, tiled=True)
+    assert len(desc) == len(kpts) and abs(len(kpts) - len(whole)) <= 0.05 * len(whole)
+    assert algorithm != 1 or len(kpts) <= cloning.ORB_FEATURES
+    # detectors may find a position at several scales and octaves
+    assert len({(k.pt, k.size, k.octave) for k in kpts}) == len(kpts)
+    points = np.array([k.pt for k in kpts])
+    distances = np.linalg.norm(points[:, None] - np.array([k.pt for k in whole])[None], axis=2)
+    assert np.mean(distances.min(axis=1) < 1) > coincident
+
+
+def test_orb_level_features_share_the_budget():
+    quotas = cloning.orb_level_features(cv.ORB_create(cloning.ORB_FEATURES))
+    assert len(quotas) == 8 and sum(quotas) == cloning.ORB_FEATURES
+    assert quotas == sorted(quotas, reverse=True)
+
+
+def test_tiled_analysis_uses_the_task_thread_budget(monkeypatch):
+    workers = []
+
+    class Pool(ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            workers.append(max_workers)
+            super().__init__(max_workers)
+
+    monkeypatch.setattr(cloning, "ThreadPoolExecutor", Pool)
+    monkeypatch.setattr(cloning, "DETECT_TILE", 128)
+    monkeypatch.setattr(executor, "default_jobs", lambda: 8)
+    rng = np.random.default_rng(0)
+    image = cv.GaussianBlur(rng.integers(0, 256, (256, 384, 3)).astype(np.uint8), (3, 3), 0)
+    with thread_budget(1):
+        cloning.analyze(image, None, {"tiled": True})
+    cloning.analyze(image, None, {"tiled": True})
+    assert workers == [1, 6]
@@ -0,0 +1,60 @@
+"""
+Unit tests for the shared image context
+"""
+import threading
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+import analysis
+from analysis.context import ImageContext
+from imaging import pad_image
+
+
+def test_derivatives_are_computed_once(sample_image, monkeypatch):
+    """Repeated requests return the same read-only array"""
+    context = ImageContext(sample_image)
+    gray = context.gray()
+    assert gray is context.gray()
+    assert np.array_equal(gray, cv.cvtColor(sample_image, cv.COLOR_BGR2GRAY))
+    with pytest.raises(ValueError):
+        gray[0, 0] = 0
+    assert context.as_float(normalize=True).dtype == np.float32
+    assert np.allclose(context.as_float(np.float64, gray=True), gray)
+
+
+def test_concurrent_requests_compute_once(sample_image, monkeypatch):
+    """Threads asking for the same derivative wait for a single computation"""
+    calls = []
+    convert = cv.cvtColor
+    monkeypatch.setattr(cv, "cvtColor", lambda *args: calls.append(1) or convert(*args))
+    context = ImageContext(sample_image)
+    threads = [threading.Thread(target=context.gray) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_padded(sample_image):
+    """Padding matches its direct computation"""
+    context = ImageContext(sample_image)
+    assert np.array_equal(context.padded(16), pad_image(sample_image, 16))
+    assert np.array_equal(
+        context.padded(16, gray=True), cv.cvtColor(pad_image(sample_image, 16), cv.COLOR_BGR2GRAY)
+    )
+
+
+@pytest.mark.parametrize("tool", ["ela", "minmax", "contrast", "histogram", "blocking"])
+def test_analyzers_share_context(tool, sample_image):
+    """Results are the same whether tools get an array or a shared context"""
+    context = ImageContext(sample_image)
+    for other in ["ela", "minmax", "contrast"]:
+        analysis.analyze(other, context, None)
+    shared = analysis.analyze(tool, context, None)
+    direct = analysis.analyze(tool, sample_image.copy(), None)
+    assert shared["text"] == direct["text"]
+    if "image" in direct:
+        assert np.array_equal(shared["image"], direct["image"])
@@ -0,0 +1,129 @@
+"""
+Unit tests for the batch executor
+"""
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+import analysis
+from analysis import executor as executor_module
+from analysis.executor import BatchExecutor, SharedImage, default_jobs, run_task, task_threads
+from analysis.scheduler import CostModel
+
+
+def test_shared_image_roundtrip(sample_image):
+    """Workers see the same pixels through shared memory"""
+    shared = SharedImage(sample_image)
+    try:
+        handle = pickle.loads(pickle.dumps(shared))
+        memory, view = handle.attach()
+        assert np.array_equal(view, sample_image)
+        del view
+        memory.close()
+    finally:
+        shared.release()
+
+
+def test_workers_drop_contexts_of_finished_images(sample_image):
+    """A worker keeps one image attached, and none once its last task is done"""
+    images = [SharedImage(sample_image), SharedImage(sample_image[::-1].copy())]
+    try:
+        handles = [pickle.loads(pickle.dumps(image)) for image in images]
+        run_task("ela", "a.png", handles[0])
+        assert list(executor_module._attached) == [images[0].name]
+        run_task("minmax", "b.png", handles[1])
+        assert list(executor_module._attached) == [images[1].name]
+        run_task("ela", "b.png", handles[1], keep=False)
+        assert not executor_module._attached
+    finally:
+        for name in list(executor_module._attached):
+            executor_module.detach_context(name)
+        for image in images:
+            image.release()
+
+
+def test_run_task_reports_errors():
+    """Analyzer failures become error reports instead of exceptions"""
+    result = run_task("ela", None, np.zeros((4, 4), np.uint8))
+    assert result["text"].startswith("Error:")
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_executor_matches_direct_analysis(processes, sample_image):
+    """Pooled results equal running the analyzers in-process"""
+    images = [("a.png", "a.png", sample_image), ("b.png", "b.png", sample_image[::-1].copy())]
+    tools = ["Error Level Analysis", "Min/Max Deviation", "Hex Editor"]
+    with BatchExecutor(tools, jobs=2, processes=processes) as executor:
+        results = list(executor.run(images))
+    assert len(results) == 4
+    for basename, tool, data in results:
+        image = dict((b, i) for _, b, i in images)[basename]
+        expected = analysis.analyze(tool, image, basename)
+        assert np.array_equal(data["image"], expected["image"])
+
+
+def test_scheduler_runs_costly_tasks_first(sample_image):
+    """With one worker, tasks start in order of rate times image size"""
+    costs = CostModel({"ela": 1.0, "minmax": 5.0, "noise": 3.0})
+    images = [("a.png", "a.png", sample_image), ("b.png", "b.png", sample_image[:50].copy())]
+    with BatchExecutor(["ela", "minmax", "noise"], jobs=1, processes=False, costs=costs) as executor:
+        order = [(basename, tool) for basename, tool, _ in executor.run(images)]
+    assert order == [
+        ("a.png", "minmax"), ("a.png", "noise"), ("b.png", "minmax"),
+        ("b.png", "noise"), ("a.png", "ela"), ("b.png", "ela"),
+    ]
+    # the model learned from the observed timings
+    assert costs.rates["ela"] != 1.0
+
+
+def test_scheduler_respects_tool_limits(sample_image, monkeypatch):
+    """A limited tool never runs more tasks at once than allowed"""
+    running = {"ela": 0}
+    peak = []
+    analyze = executor_module.analyze
+
+    def tracked(tool, *args):
+        if tool == "ela":
+            running["ela"] += 1
+            peak.append(running["ela"])
+            time.sleep(0.02)
+            running["ela"] -= 1
+        return analyze(tool, *args)
+
+    monkeypatch.setattr(executor_module, "analyze", tracked)
+    images = [(f"{i}.png", f"{i}.png", sample_image) for i in range(6)]
+    with BatchExecutor(["ela", "minmax"], jobs=4, processes=False, limits={"ela": 1}) as executor:
+        results = list(executor.run(images))
+    assert len(results) == 12
+    assert max(peak) == 1
+
+
+def test_tasks_share_the_cores(sample_image, monkeypatch):
+    """Each task gets its share of the cores, interactive calls are not limited"""
+    budgets = []
+    analyze = executor_module.analyze
+
+    def tracked(*args):
+        budgets.append(task_threads())
+        return analyze(*args)
+
+    monkeypatch.setattr(executor_module, "analyze", tracked)
+    images = [("a.png", "a.png", sample_image)]
+    with BatchExecutor(["ela", "minmax"], jobs=2, processes=False) as executor:
+        list(executor.run(images))
+    assert budgets == [max(default_jobs() // 2, 1)] * 2
+    with BatchExecutor(["ela"], jobs=2, processes=False, threads=3) as executor:
+        list(executor.run(images))
+    assert budgets[-1] == 3 and task_threads() is None
+
+
+def test_cost_model_history(tmp_path):
+    """Learned rates survive between runs and fall back to the analyzer COST"""
+    path = str(tmp_path / "timings.json")
+    costs = CostModel.load(path)
+    assert costs.rate("resampling") == analysis.get_analyzer("resampling").COST
+    costs.update("Error Level Analysis", 2_000_000, 1.0)
+    costs.save()
+    assert CostModel.load(path).rate("ela") == 0.5
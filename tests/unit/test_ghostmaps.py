@@ -0,0 +1,100 @@
+"""
+Unit tests for JPEG ghost maps
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from analysis import executor, ghostmaps
+from analysis.executor import thread_budget
+
+
+def blockwise_maps(image, levels, block):
+    """Mean squared error of every block and quality, one block at a time in float64"""
+    rows, cols = image.shape[0] // block, image.shape[1] // block
+    maps = np.zeros((rows, cols, len(levels)))
+    for c, quality in enumerate(levels):
+        buffer = cv.imencode(".jpg", image, [int(cv.IMWRITE_JPEG_QUALITY), quality])[1]
+        error = np.square(np.double(image) - np.double(cv.imdecode(buffer, cv.IMREAD_ANYCOLOR)))
+        for y in range(rows):
+            for x in range(cols):
+                maps[y, x, c] = np.mean(error[y * block : (y + 1) * block, x * block : (x + 1) * block])
+    minval, maxval = maps.min(axis=2, keepdims=True), maps.max(axis=2, keepdims=True)
+    return (maps - minval) / (maxval - minval)
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return cv.GaussianBlur(rng.integers(0, 256, (96, 136, 3), dtype=np.uint8), (3, 3), 0)
+
+
+@pytest.mark.parametrize("shape", [(96, 136), (90, 130)])
+def test_ghost_maps_equal_blockwise_errors(image, shape, monkeypatch):
+    """Every block fully inside the image is averaged, also the last row and column"""
+    image = np.ascontiguousarray(image[: shape[0], : shape[1]])
+    monkeypatch.setattr(ghostmaps, "STRIP_PIXELS", 2 * 16 * 16 * 8)
+    maps = ghostmaps.ghost_maps(image, 50, 90, 10, 3, 5, jobs=2)
+    shifted = np.roll(image, (5, 3), axis=(0, 1))
+    expected = blockwise_maps(shifted, ghostmaps.qualities(50, 90, 10), 16)
+    assert maps.dtype == np.float32 and maps.shape == expected.shape
+    assert not np.isnan(maps).any()
+    assert np.allclose(maps, expected, atol=1e-5)
+
+
+def test_flat_blocks_are_undefined():
+    image = np.full((32, 48, 3), 128, np.uint8)
+    image[:16, :16] = np.random.default_rng(0).integers(0, 256, (16, 16, 3))
+    maps = ghostmaps.ghost_maps(image, 60, 80, 10)
+    assert not np.isnan(maps[0, 0]).any() and np.isnan(maps[1:, 2]).all()
+
+
+def jpeg(image, quality):
+    return cv.imdecode(cv.imencode(".jpg", image, [int(cv.IMWRITE_JPEG_QUALITY), quality])[1], cv.IMREAD_COLOR)
+
+
+def test_auto_align_finds_lattice_of_pasted_region():
+    """A region saved at low quality on a lattice shifted by (3, 5) ranks that offset first"""
+    rng = np.random.default_rng(0)
+    source = cv.GaussianBlur(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8), (5, 5), 0)
+    image = jpeg(source, 90)
+    region = np.roll(jpeg(np.roll(source, (5, 3), axis=(0, 1)), 60), (-5, -3), axis=(0, 1))
+    image[64:176, 80:240] = region[64:176, 80:240]
+    ranking = ghostmaps.align_offsets(image, 50, 90, 10, jobs=2)
+    assert sorted((x, y) for _, x, y in ranking) == [(x, y) for x in range(8) for y in range(8)]
+    assert [c for c, _, _ in ranking] == sorted((c for c, _, _ in ranking), reverse=True)
+    assert ranking[0][1:] == (3, 5)
+    values = ghostmaps.analyze(image, None, {"qmin": 50, "qmax": 90, "qstep": 10, "auto_align": True})["values"]
+    assert (values["offset_x"], values["offset_y"]) == (3, 5)
+
+
+def test_auto_align_needs_a_block():
+    with pytest.raises(ValueError):
+        ghostmaps.align_offsets(np.zeros((20, 40, 3), np.uint8), 50, 90, 10)
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Workers of every thread pool opened by ghostmaps, on eight cores"""
+    workers = []
+    monkeypatch.setattr(executor, "default_jobs", lambda: 8)
+
+    class Pool(ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            workers.append(max_workers)
+            super().__init__(max_workers)
+
+    monkeypatch.setattr(ghostmaps, "ThreadPoolExecutor", Pool)
+    return workers
+
+
+@pytest.mark.parametrize("auto_align", [False, True])
+def test_analysis_uses_the_task_thread_budget(image, pools, auto_align):
+    params = {"qmin": 50, "qmax": 90, "qstep": 10, "auto_align": auto_align}
+    with thread_budget(1):
+        ghostmaps.analyze(image, None, params)
+    assert pools == [1] * (1 + auto_align)
+    ghostmaps.analyze(image, None, params)
+    assert min(pools[len(pools) // 2 :]) > 1
@@ -0,0 +1,70 @@
+"""
+Unit tests for streaming image ingestion
+"""
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from analysis import ingest
+from analysis.executor import BatchExecutor
+
+
+@pytest.fixture
+def image_folder(tmp_path):
+    """A folder with a few images, a non-image file and a broken image"""
+    for i in range(5):
+        cv.imwrite(str(tmp_path / f"img{i}.png"), np.full((16, 16, 3), i * 40, np.uint8))
+    (tmp_path / "notes.txt").write_text("not an image")
+    (tmp_path / "broken.jpg").write_bytes(b"not a jpeg")
+    return tmp_path
+
+
+def test_list_images_directory_and_glob(image_folder):
+    """Directories and glob patterns expand to sorted image files"""
+    names = [os.path.basename(f) for f in ingest.list_images(str(image_folder))]
+    assert names == ["broken.jpg"] + [f"img{i}.png" for i in range(5)]
+    pattern = str(image_folder / "img*.png")
+    assert len(list(ingest.list_images(pattern))) == 5
+
+
+def test_stream_images_skips_broken_files(image_folder):
+    """Undecodable files are reported and skipped"""
+    errors = []
+    files = list(ingest.list_images(str(image_folder)))
+    images = list(ingest.stream_images(files, on_error=lambda f, m: errors.append(f)))
+    assert [b for _, b, _ in images] == [f"img{i}.png" for i in range(5)]
+    assert [os.path.basename(f) for f in errors] == ["broken.jpg"]
+
+
+def test_stream_images_prefetch_is_bounded(image_folder, monkeypatch):
+    """The reader never decodes more than prefetch images ahead of the consumer"""
+    decoded = []
+    decode = ingest.decode_image
+    monkeypatch.setattr(ingest, "decode_image", lambda f: decoded.append(f) or decode(f))
+    files = [str(image_folder / f"img{i}.png") for i in range(5)]
+    stream = ingest.stream_images(files, prefetch=1)
+    next(stream)
+    time.sleep(0.3)
+    # one consumed, one queued and one decoded while waiting for space
+    assert len(decoded) <= 3
+    stream.close()
+
+
+def test_executor_limits_images_in_flight(sample_image):
+    """The executor only pulls new images when earlier ones are finished"""
+    pulled = []
+    finished = []
+
+    def images():
+        for i in range(6):
+            pulled.append(i)
+            assert len(pulled) - len(finished) <= 2
+            yield f"{i}.png", f"{i}.png", sample_image
+
+    with BatchExecutor(["ela"], jobs=2, processes=False, inflight=2) as executor:
+        for basename, _, _ in executor.run(images()):
+            finished.append(basename)
+    assert len(finished) == 6
@@ -0,0 +1,51 @@
+"""
+Unit tests for the batch journal
+"""
+import numpy as np
+
+from analysis import journal
+from analysis.journal import Journal, read_records
+
+
+def test_records_roundtrip_with_maps(tmp_path):
+    """Results come back from the journal including their maps"""
+    image = np.random.default_rng(0).integers(0, 255, (8, 8, 3), np.uint8)
+    path = str(tmp_path / "run.jsonl")
+    with Journal(path, str(tmp_path / "maps")) as writer:
+        writer.write("/a/x.png", "ela", {"text": "ok", "values": {"v": 1}, "image": image})
+        writer.write("/b/x.png", "ela", {"text": "Error: broken"})
+    assert writer.errors == 1
+    with Journal(path, str(tmp_path / "maps"), resume=True) as resumed:
+        assert resumed.is_done("/a/x.png", "ela") and not resumed.is_done("/b/x.png", "ela")
+        data = resumed.load(resumed.completed[("/a/x.png", "ela")])
+    assert data["text"] == "ok" and data["values"] == {"v": 1}
+    assert np.array_equal(data["image"], image)
+    record = resumed.completed[("/a/x.png", "ela")]
+    assert "image" not in resumed.load(record, maps=False)
+    assert resumed.map_path(record) == str(tmp_path / "maps" / record["map"])
+
+
+def test_resume_after_crash(tmp_path):
+    """A half written last line is dropped and later records stay readable"""
+    path = tmp_path / "run.jsonl"
+    with Journal(str(path)) as writer:
+        for tool in ("ela", "noise"):
+            writer.write("a.png", tool, {"text": tool})
+    path.write_text(path.read_text()[:-10])
+    with Journal(str(path), resume=True) as resumed:
+        assert list(resumed.completed) == [("a.png", "ela")]
+        resumed.write("a.png", "noise", {"text": "noise"})
+    assert [r["tool"] for r in read_records(str(path))] == ["ela", "noise"]
+
+
+def test_last_batch(tmp_path, monkeypatch):
+    """Only the most recent GUI batches are kept"""
+    monkeypatch.setenv("LOOK_DGC_CACHE", str(tmp_path))
+    assert journal.last_batch() is None
+    names = iter(range(100))
+    monkeypatch.setattr(journal.time, "strftime", lambda _: f"{next(names):03d}")
+    for i in range(journal.KEEP_BATCHES + 2):
+        directory = journal.create_batch([f"{i}.png"], ["ela"])
+    last, manifest = journal.last_batch()
+    assert last == directory and manifest["filenames"] == [f"{i}.png"]
+    assert len(list((tmp_path / journal.BATCHES_DIR).iterdir())) == journal.KEEP_BATCHES
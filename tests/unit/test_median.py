@@ -0,0 +1,102 @@
+"""
+Unit tests for median filtering detection
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from analysis import median
+from analysis.executor import thread_budget
+from imaging import pad_image
+
+xgb = pytest.importorskip("xgboost")
+
+
+@pytest.fixture(scope="module")
+def booster():
+    """Small model with the 96 features layout, trained on random data"""
+    rng = np.random.default_rng(0)
+    features = rng.random((200, 96))
+    labels = features[:, 0] > 0.5
+    return xgb.train({"max_depth": 3}, xgb.DMatrix(features, label=labels), 5)
+
+
+@pytest.fixture
+def gray():
+    return np.random.default_rng(1).integers(0, 256, (150, 200), dtype=np.uint8)
+
+
+def test_batched_detection_matches_blockwise_prediction(booster, gray):
+    """One prediction over all blocks gives the probabilities of one call per block"""
+    block = 32
+    prob, var = median.detect(gray, booster, block, nthread=1)
+    levels, windows = median.model_shape(booster)
+    padded = pad_image(gray, block)
+    assert prob.shape == (padded.shape[0] // block + 1, padded.shape[1] // block + 1)
+    for i in range(0, padded.shape[0], block):
+        for j in range(0, padded.shape[1], block):
+            roi = padded[i : i + block, j : j + block]
+            row = median.get_features(roi, levels, windows)[np.newaxis]
+            assert prob[i // block, j // block] == booster.predict(xgb.DMatrix(row))[0]
+            assert var[i // block, j // block] == np.var(roi)
+    assert not prob[-1].any() and not prob[:, -1].any()
+
+
+@pytest.mark.parametrize("levels, windows", [(3, 4), (1, 1)])
+def test_block_features_equal_blockwise_features(levels, windows, monkeypatch):
+    """Filtering blocks side by side gives the features of each block filtered alone"""
+    rng = np.random.default_rng(3)
+    gray = np.zeros((100, 140), np.uint8)
+    gray[:, 70:] = 200
+    gray[50:] = rng.integers(0, 256, (50, 140))
+    monkeypatch.setattr(median, "STRIP_PIXELS", 3 * 32 * 32)
+    padded = pad_image(gray, 32)
+    features, var = median.block_features(padded, 32, levels, windows, jobs=2)
+    blocks = [padded[i : i + 32, j : j + 32] for i in range(0, 128, 32) for j in range(0, 160, 32)]
+    assert np.array_equal(features, [median.get_features(b, levels, windows) for b in blocks])
+    assert np.array_equal(var, [np.var(b) for b in blocks])
+
+
+def test_prediction_in_chunks(booster, monkeypatch):
+    features = np.random.default_rng(2).random((50, 96))
+    whole = median.predict(booster, features)
+    monkeypatch.setattr(median, "PREDICT_ROWS", 7)
+    assert np.array_equal(median.predict(booster, features), whole)
+
+
+def test_detection_can_be_cancelled(booster, gray):
+    assert median.detect(gray, booster, 32, lambda k: k < 3) == (None, None)
+
+
+def test_analysis_uses_the_task_thread_budget(booster, gray, monkeypatch):
+    """Inside a batch task, features and predictions run on the threads of the task only"""
+    workers, names = [], []
+
+    class Pool(ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            workers.append(max_workers)
+            super().__init__(max_workers)
+
+    def cached(name, loader):
+        names.append(name)
+        return booster
+
+    monkeypatch.setattr(median, "ThreadPoolExecutor", Pool)
+    monkeypatch.setattr(median, "cached_model", cached)
+    with thread_budget(1):
+        median.analyze(np.dstack([gray] * 3), None)
+    assert workers == [1] and names == ["median_nthread1"]
+
+
+def test_prediction_leaves_shared_booster_unchanged(booster):
+    booster = booster.copy()
+    config = booster.save_config()
+    median.predict(booster, np.random.default_rng(2).random((10, 96)), nthread=3)
+    assert booster.save_config() == config
+
+
+def test_boosters_are_loaded_with_their_threads(booster, tmp_path):
+    modelfile = str(tmp_path / "median.json")
+    booster.save_model(modelfile)
+    assert '"nthread":"1"' in median.load_booster(modelfile, nthread=1).save_config().replace(" ", "")
@@ -0,0 +1,88 @@
+"""
+Unit tests for the model registry
+"""
+import threading
+import time
+
+import pytest
+
+from analysis import models
+from analysis.models import ModelRegistry
+
+
+@pytest.fixture
+def resident(monkeypatch):
+    """Fake resident memory, raised by the loaders below"""
+    memory = [0]
+    monkeypatch.setattr(models, "current_rss", lambda: memory[0])
+    return memory
+
+
+def loader(resident, name, size=0, loads=None):
+    def load():
+        resident[0] += size
+        if loads is not None:
+            loads.append(name)
+        return {"name": name}
+
+    return load
+
+
+def test_models_are_loaded_once(resident):
+    registry = ModelRegistry()
+    loads = []
+    first = registry.get("a", loader(resident, "a", 10, loads))
+    assert registry.get("a", loader(resident, "a", 10, loads)) is first
+    assert loads == ["a"]
+    (usage,) = registry.usage()
+    assert usage["name"] == "a" and usage["memory"] == 10 and usage["hits"] == 1
+
+
+def test_concurrent_calls_load_once(resident):
+    registry = ModelRegistry()
+    loads = []
+
+    def slow():
+        time.sleep(0.05)
+        return loader(resident, "a", loads=loads)()
+
+    threads = [threading.Thread(target=registry.get, args=("a", slow)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["a"]
+
+
+def test_failed_loads_are_not_kept(resident):
+    registry = ModelRegistry()
+
+    def fail():
+        raise OSError("missing model")
+
+    with pytest.raises(OSError):
+        registry.get("a", fail)
+    assert "a" not in registry
+    assert registry.get("a", loader(resident, "a")) == {"name": "a"}
+
+
+def test_budget_evicts_least_recently_used(resident):
+    registry = ModelRegistry(max_bytes=25)
+    registry.get("a", loader(resident, "a", 10))
+    registry.get("b", loader(resident, "b", 10))
+    registry.get("a", loader(resident, "a", 10))
+    registry.get("c", loader(resident, "c", 10))
+    assert [usage["name"] for usage in registry.usage()] == ["a", "c"]
+    assert registry.memory() == 20
+    # a model beyond the budget alone is still kept while in use
+    registry.get("d", loader(resident, "d", 40))
+    assert [usage["name"] for usage in registry.usage()] == ["d"]
+
+
+def test_idle_models_are_evicted(resident):
+    registry = ModelRegistry()
+    registry.get("a", loader(resident, "a"))
+    registry.get("b", loader(resident, "b"))
+    registry.entries["a"]["used"] -= 60
+    assert registry.evict(idle=30) == ["a"]
+    assert registry.evict("b") == ["b"] and registry.usage() == []
@@ -0,0 +1,112 @@
+"""
+Unit tests for resampling detection
+"""
+import numpy as np
+import pytest
+
+from analysis import resampling
+
+
+@pytest.fixture
+def gray():
+    # the gradient of sample_image is predicted exactly, leaving F rank deficient
+    return resampling.normalize_gray(np.random.default_rng(0).random((37, 29)))
+
+
+@pytest.mark.parametrize("size", [3, 5])
+def test_design_matrices_match_pixelwise_construction(gray, size):
+    """Each row of F lists the neighbours of the pixel in f, in row order"""
+    radius = size // 2
+    rows = []
+    values = []
+    for y in range(radius, gray.shape[0] - radius):
+        for x in range(radius, gray.shape[1] - radius):
+            window = gray[y - radius : y + radius + 1, x - radius : x + radius + 1].ravel()
+            rows.append(np.delete(window, size * size // 2))
+            values.append(gray[y, x])
+    F, f = resampling.build_matrices(gray, size)
+    assert np.array_equal(F, np.array(rows))
+    assert np.array_equal(f, np.array(values))
+
+
+@pytest.mark.parametrize("size", [3, 5])
+def test_residuals_are_one_correlation(gray, size):
+    a = np.random.default_rng(0).random(size * size - 1)
+    F, f = resampling.build_matrices(gray, size)
+    assert np.allclose(resampling.compute_residuals(a, gray, size), f - F @ a, atol=1e-12)
+
+
+@pytest.mark.parametrize("tile", [1, 100, 10 ** 6])
+def test_tiled_normal_equations_match_full_matrix(gray, tile):
+    """Accumulating over row tiles gives the weighted least squares of the whole F"""
+    F, f = resampling.build_matrices(gray, 5)
+    weights = np.random.default_rng(1).random(len(f))
+    A, b = resampling.normal_equations(gray, 5, weights, tile)
+    assert np.allclose(A, F.T * weights @ F) and np.allclose(b, F.T * weights @ f)
+    expected = np.linalg.inv(F.T * weights @ F) @ F.T * weights @ f
+    assert np.allclose(resampling.solve_normal(A, b), expected)
+
+
+def test_probability_map_shape_and_range(gray):
+    np.random.seed(0)
+    prob = resampling.calculate_probability_map_5x5(gray)
+    assert prob.shape == (gray.shape[0] - 4, gray.shape[1] - 4)
+    assert np.all((prob >= 0) & (prob <= 1))
+
+
+def test_fourier_map_options(gray):
+    for highpass in (1, 2):
+        spectrum = resampling.fourier_map(gray, "riw", True, True, highpass, 2.0, False)
+        assert spectrum.shape == (28, 28)
+        assert spectrum.min() == 0 and np.isclose(spectrum.max(), 1)
+    assert resampling.fourier_map(gray, highpass=3) is None
+
+
+def test_tile_regions_cover_image_once():
+    regions = resampling.tile_regions((300, 410), 128)
+    assert len(regions) == 3 * 4
+    covered = np.zeros((300, 410), int)
+    for x1, y1, x2, y2 in regions:
+        assert 100 <= x2 + 1 - x1 <= 128 and 100 <= y2 + 1 - y1 <= 128
+        covered[y1 : y2 + 1, x1 : x2 + 1] += 1
+    assert np.all(covered == 1)
+    assert resampling.tile_regions((50, 60), 512) == [(0, 0, 59, 49)]
+
+
+def test_masks_are_cached_per_shape():
+    window = resampling.make_rotational_invariant_window((40, 40))
+    assert resampling.make_rotational_invariant_window((40, 40)) is window
+    assert not window.flags.writeable
+    assert resampling.make_high_pass_filter((40, 30)).shape == (40, 30)
+
+
+def test_fixed_predictor_map():
+    """The fixed predictor residue is exact on planes, giving probability one"""
+    y, x = np.mgrid[0:20, 0:30]
+    plane = resampling.normalize_gray(2.0 * x + 3.0 * y)
+    prob = resampling.probability_map(plane, resampling.FIXED)
+    assert prob.shape == (18, 28) and np.allclose(prob, 1)
+    prob = resampling.probability_map(np.random.default_rng(0).random((20, 30)), resampling.FIXED)
+    assert prob.shape == (18, 28) and np.all((prob >= 0) & (prob <= 1)) and prob.min() < 0.5
+
+
+def test_joined_cancel_waits_for_running_regions():
+    """A worker cancelled on close returns only once its running regions are done"""
+    import threading
+    import time
+
+    from resampling import RegionWorker
+
+    started, ended = threading.Event(), []
+
+    def region(i):
+        started.set()
+        time.sleep(0.3)
+        ended.append(i)
+
+    worker = RegionWorker(region, [(i, (i,)) for i in range(8)], processes=False)
+    worker.start()
+    assert started.wait(5)
+    worker.cancel(join=True)
+    assert worker.wait(5000)
+    assert ended and len(ended) < 8
@@ -0,0 +1,65 @@
+"""
+Unit tests for batch telemetry
+"""
+import time
+
+import cv2 as cv
+import numpy as np
+
+from analysis.executor import BatchExecutor, run_task
+from analysis.ingest import stream_images
+from analysis.telemetry import TaskTimer, Telemetry
+
+
+def test_task_timer_measures_wall_cpu_and_wait():
+    """A busy task reports CPU time close to its wall time and its queue wait"""
+    timer = TaskTimer(time.time() - 0.5)
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+    timing = timer.stop()
+    assert timing["wall"] >= 0.05
+    assert 0.02 < timing["cpu"] <= timing["wall"] + 0.01
+    assert 0.4 < timing["queue_wait"] < 1
+
+
+def test_summary_statistics():
+    """Per-tool percentiles, cached counts and time shares"""
+    telemetry = Telemetry()
+    for i in range(1, 101):
+        telemetry.add_task(f"{i}.png", "slow", {"wall": i / 100, "cpu": i / 200})
+        telemetry.add_task(f"{i}.png", "fast", {"wall": 0.001, "cpu": 0.001})
+    telemetry.add_cached("101.png", "fast")
+    telemetry.stop()
+    summary = telemetry.summary()
+    slow = summary["tools"]["slow"]
+    assert summary["images"] == 101
+    assert slow["tasks"] == 100 and slow["queue_wait"] is None
+    assert np.isclose(slow["wall"]["p50"], 0.505) and np.isclose(slow["wall"]["max"], 1.0)
+    assert np.isclose(slow["wall"]["p95"], np.percentile(np.arange(1, 101) / 100, 95))
+    assert summary["tools"]["fast"]["cached"] == 1
+    assert slow["share"] > 0.99
+    assert telemetry.format().splitlines()[1].startswith("slow: 100 tasks")
+
+
+def test_run_task_reports_timing(sample_image):
+    assert set(run_task("ela", None, sample_image, submitted=time.time())["timing"]) >= {
+        "wall", "cpu", "queue_wait"
+    }
+
+
+def test_batch_collects_decode_and_task_timings(tmp_path, sample_image):
+    """Streaming and the executor feed one telemetry instance"""
+    files = []
+    for i in range(3):
+        files.append(str(tmp_path / f"{i}.png"))
+        cv.imwrite(files[-1], sample_image)
+    telemetry = Telemetry()
+    images = stream_images(files, on_decode=telemetry.add_decode)
+    with BatchExecutor(["ela", "minmax"], jobs=2, processes=False, telemetry=telemetry) as executor:
+        results = list(executor.run(images))
+    assert all("timing" in data for _, _, data in results)
+    summary = telemetry.summary()
+    assert sorted(telemetry.decode) == sorted(files)
+    assert summary["images"] == 3
+    assert {tool: record["tasks"] for tool, record in summary["tools"].items()} == {"ela": 3, "minmax": 3}